@@ -1,5 +1,10 @@
+from django import forms
 from django.contrib import admin
+from django.core.exceptions import ValidationError
 
+from .conflicts import validate_schedule
+from .seats import deferred_seat_release
+from .timetable import deferred_timetable_change
 from .models import (
     Crew,
     TrainType,
@@ -8,24 +13,67 @@ from .models import (
     Ticket,
     Station,
     Route,
-    Journey
+    Journey,
+    TimetableTemplate,
 )
 
 
+class DeferredChangeAdmin(admin.ModelAdmin):
+    """Deletes cascading to tickets and journeys release the seats
+    and bump the timetable version once, as in the API"""
+
+    def delete_model(self, request, obj):
+        with deferred_seat_release(), deferred_timetable_change():
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with deferred_seat_release(), deferred_timetable_change():
+            super().delete_queryset(request, queryset)
+
+
 class TicketInLine(admin.TabularInline):
     model = Ticket
     extra = 1
+    readonly_fields = ("price",)
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(DeferredChangeAdmin):
     inlines = (TicketInLine,)
+    readonly_fields = ("total_price",)
 
 
 admin.site.register(Crew)
-admin.site.register(TrainType)
-admin.site.register(Ticket)
-admin.site.register(Train)
-admin.site.register(Station)
-admin.site.register(Route)
-admin.site.register(Journey)
+admin.site.register(TrainType, DeferredChangeAdmin)
+admin.site.register(Ticket, DeferredChangeAdmin)
+admin.site.register(Train, DeferredChangeAdmin)
+admin.site.register(Station, DeferredChangeAdmin)
+admin.site.register(Route, DeferredChangeAdmin)
+
+
+class JourneyAdminForm(forms.ModelForm):
+    class Meta:
+        model = Journey
+        fields = "__all__"
+
+    def clean(self):
+        cleaned_data = super().clean()
+        validate_schedule(
+            cleaned_data.get("departure_time"),
+            cleaned_data.get("arrival_time"),
+            cleaned_data.get("train"),
+            cleaned_data.get("crew", []),
+            self.instance.pk,
+            ValidationError,
+        )
+        return cleaned_data
+
+
+@admin.register(Journey)
+class JourneyAdmin(DeferredChangeAdmin):
+    form = JourneyAdminForm
+
+
+@admin.register(TimetableTemplate)
+class TimetableTemplateAdmin(admin.ModelAdmin):
+    filter_horizontal = ("crew",)
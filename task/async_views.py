@@ -0,0 +1,220 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404
+from django.utils.translation import gettext_lazy as _
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from task.models import Order, Station
+from task.permissions import IsAdminOrIfAuthenticatedReadOnly
+from task.serializers import (
+    JourneyDetailSerializer,
+    JourneyListValuesSerializer,
+    OrderListValuesSerializer,
+    StationListSerializer,
+)
+from task.views import JourneyPagination, JourneyViewSet, OrderPagination
+from user.authentication import (
+    CachedJWTAuthentication,
+    token_user_id,
+    user_cache,
+)
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    """CachedJWTAuthentication reading the user with the async ORM"""
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = token_user_id(validated_token)
+        user = user_cache.get(user_id)
+        if user is not None:
+            return user
+
+        generation = user_cache.generation
+        try:
+            user = await self.user_model.objects.aget(
+                **{jwt_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(
+                _("User not found"), code="user_not_found"
+            )
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _("User is inactive"), code="user_inactive"
+            )
+        user_cache.set(user_id, user, generation)
+        return user
+
+
+class AsyncAPIView(View):
+    """Read-only async view with the authentication, permissions,
+    throttling and error responses of the DRF views.
+    Handlers are coroutines returning a Response"""
+    http_method_names = ["get"]
+    permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    authenticator = AsyncJWTAuthentication()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Requests carry JWT like those of the DRF views, exempt as well.
+        # csrf_exempt would wrap the coroutine into a sync function
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.request = Request(request)
+        try:
+            await self.initial(self.request)
+            handler = getattr(self, request.method.lower(), None)
+            if (
+                request.method.lower() not in self.http_method_names
+                or handler is None
+            ):
+                raise exceptions.MethodNotAllowed(request.method)
+            response = await handler(self.request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        return self.finalize_response(response)
+
+    async def initial(self, request):
+        user_auth = await self.authenticator.aauthenticate(request)
+        if user_auth is None:
+            user_auth = AnonymousUser(), None
+        request.user, request.auth = user_auth
+        self.check_permissions(request)
+        # Throttles may keep their history in the database
+        await sync_to_async(self.check_throttles)(request)
+
+    def check_permissions(self, request):
+        for permission_class in self.permission_classes:
+            permission = permission_class()
+            if permission.has_permission(request, self):
+                continue
+            if not request.user.is_authenticated:
+                raise exceptions.NotAuthenticated()
+            raise exceptions.PermissionDenied(
+                getattr(permission, "message", None)
+            )
+
+    def check_throttles(self, request):
+        durations = [
+            throttle.wait()
+            for throttle in (
+                throttle_class() for throttle_class in self.throttle_classes
+            )
+            if not throttle.allow_request(request, self)
+        ]
+        if durations:
+            durations = [
+                duration for duration in durations if duration is not None
+            ]
+            raise exceptions.Throttled(max(durations, default=None))
+
+    def handle_exception(self, exc):
+        if isinstance(
+            exc,
+            (exceptions.NotAuthenticated, exceptions.AuthenticationFailed),
+        ):
+            exc.auth_header = self.authenticator.authenticate_header(
+                self.request
+            )
+        response = exception_handler(
+            exc, {"view": self, "request": self.request}
+        )
+        if response is None:
+            raise exc
+        return response
+
+    def finalize_response(self, response):
+        response.accepted_renderer = JSONRenderer()
+        response.accepted_media_type = response.accepted_renderer.media_type
+        response.renderer_context = {
+            "view": self,
+            "request": self.request,
+            "response": response,
+        }
+        return response
+
+
+class JourneyListView(AsyncAPIView):
+    """Async version of the journey list with the same filters"""
+    pagination_class = JourneyPagination
+
+    async def get(self, request):
+        search = JourneyViewSet(request=request, action="list")
+        station_ids = search.source_station_ids()
+        if station_ids is not None:
+            station_ids = [pk async for pk in station_ids]
+        queryset = JourneyListValuesSerializer.queryset(
+            search.filter_list(search.queryset.with_price_trip(), station_ids)
+        )
+
+        paginator = self.pagination_class()
+        # The viewset declares the ordering fields
+        rows = await paginator.apaginate_queryset(queryset, request, search)
+        return paginator.get_paginated_response(
+            JourneyListValuesSerializer(rows).data
+        )
+
+
+class JourneyDetailView(AsyncAPIView):
+    """Async version of the journey detail"""
+
+    async def get(self, request, pk):
+        queryset = JourneyViewSet(
+            request=request, action="retrieve"
+        ).get_queryset()
+        try:
+            journey = await queryset.aget(pk=pk)
+        except queryset.model.DoesNotExist:
+            raise Http404
+        return Response(JourneyDetailSerializer(journey).data)
+
+
+class StationListView(AsyncAPIView):
+    """Async version of the station list"""
+
+    async def get(self, request):
+        stations = [station async for station in Station.objects.all()]
+        return Response(StationListSerializer(stations, many=True).data)
+
+
+class OrderListView(AsyncAPIView):
+    """Async version of the order list of the current user"""
+    permission_classes = (IsAuthenticated,)
+    pagination_class = OrderPagination
+
+    async def get(self, request):
+        queryset = OrderListValuesSerializer.queryset(
+            Order.objects.filter(user=request.user)
+        )
+        paginator = self.pagination_class()
+        rows = await paginator.apaginate_queryset(queryset, request, self)
+        serializer = OrderListValuesSerializer(rows)
+        serializer.add_tickets(
+            [ticket async for ticket in serializer.tickets_queryset(rows)]
+        )
+        return paginator.get_paginated_response(serializer.data)
@@ -0,0 +1,630 @@
+import asyncio
+import itertools
+import math
+import statistics
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.db.models import Max
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from task.models import (
+    Crew,
+    Journey,
+    Order,
+    Route,
+    Station,
+    Ticket,
+    Train,
+    TrainType,
+)
+from task.seats import SeatMap, hold_seats
+from task.throttling import throttle_keys, throttle_store
+
+
+PASSWORD = "benchmark-password"
+
+
+def percentile(values, share) -> float:
+    """Nearest rank percentile of the values"""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+class Endpoint:
+    """One request of the suite. prepare(iteration) is called untimed
+    before every request and returns the path and the payload"""
+
+    def __init__(self, name, method, prepare, role="user", data_format="json"):
+        self.name = name
+        self.method = method
+        self.prepare = prepare
+        self.role = role
+        self.data_format = data_format
+
+
+class EndpointBenchmark:
+    """Times every task and user endpoint through the test client
+    with JWT authentication, on the data already in the database.
+    Writes are not undone, run it inside a transaction that is rolled back.
+    Crew image upload is left out because it writes media files"""
+
+    def __init__(self, repeat=20):
+        self.repeat = repeat
+        tag = uuid.uuid4().hex[:8]
+        self.user = get_user_model().objects.create_user(
+            f"benchmark.{tag}@example.com", PASSWORD
+        )
+        self.admin = get_user_model().objects.create_user(
+            f"benchmark.admin.{tag}@example.com", PASSWORD, is_staff=True
+        )
+        self.clients = {
+            "anonymous": APIClient(),
+            "user": self._client(self.user),
+            "admin": self._client(self.admin),
+        }
+        self.names = itertools.count()
+        self.slots = itertools.count()
+        self.free_seats = self._free_seats()
+
+        self.station = Station.objects.first()
+        self.route = Route.objects.first()
+        self.train = Train.objects.first()
+        self.train_type = TrainType.objects.first()
+        self.crew = Crew.objects.first()
+        self.journey = Journey.objects.filter(
+            departure_time__gte=timezone.now()
+        ).order_by("departure_time").first() or Journey.objects.first()
+        destination = Route.objects.filter(
+            source=self.journey.route.destination
+        ).first()
+        self.destination = destination.destination if destination else (
+            self.journey.route.destination
+        )
+        self.order = self._order()
+        # Created journeys must not overlap those of the train and crew
+        self.free_from = Journey.objects.aggregate(
+            free_from=Max("arrival_time")
+        )["free_from"]
+
+    @staticmethod
+    def _client(user):
+        client = APIClient()
+        token = RefreshToken.for_user(user).access_token
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return client
+
+    def _free_seats(self):
+        journeys = Journey.objects.select_related("train").filter(
+            departure_time__gte=timezone.now()
+        ).order_by("departure_time")
+        for journey in journeys:
+            seat_map = SeatMap.for_journey(journey)
+            for cargo in seat_map.cargos():
+                for place_in_cargo in cargo["free_places"]:
+                    yield journey, (cargo["cargo_num"], place_in_cargo)
+
+    def _order(self) -> Order:
+        journey, (cargo_num, place_in_cargo) = next(self.free_seats)
+        order = Order.objects.create(user=self.user)
+        Ticket.objects.create(
+            order=order,
+            journey=journey,
+            cargo_num=cargo_num,
+            place_in_cargo=place_in_cargo,
+        )
+        return order
+
+    def _hold(self):
+        journey, seat = next(self.free_seats)
+        return hold_seats(self.user, journey, [seat], minutes=10)
+
+    def _order_payload(self):
+        journey, (cargo_num, place_in_cargo) = next(self.free_seats)
+        return {
+            "tickets": [
+                {
+                    "journey": journey.id,
+                    "cargo_num": cargo_num,
+                    "place_in_cargo": place_in_cargo,
+                }
+            ]
+        }
+
+    def _hold_payload(self):
+        journey, (cargo_num, place_in_cargo) = next(self.free_seats)
+        return {
+            "journey": journey.id,
+            "seats": [
+                {"cargo_num": cargo_num, "place_in_cargo": place_in_cargo}
+            ],
+        }
+
+    def _station_payload(self):
+        return {
+            "name": f"Benchmark station {next(self.names)}",
+            "latitude": 50.0,
+            "longitude": 30.0,
+            "service_cost": 2.0,
+        }
+
+    def _journey_payload(self):
+        departure_time = self.free_from + timedelta(
+            hours=4 * next(self.slots)
+        )
+        return {
+            "departure_time": departure_time.isoformat(),
+            "arrival_time": (departure_time + timedelta(hours=3)).isoformat(),
+            "route": self.route.id,
+            "train": self.train.id,
+            "crew": [self.crew.id] if self.crew else [],
+        }
+
+    def _journey(self):
+        departure_time = self.journey.departure_time
+        return Journey.objects.create(
+            route=self.route,
+            train=self.train,
+            departure_time=departure_time,
+            arrival_time=departure_time + timedelta(hours=3),
+        )
+
+    def endpoints(self) -> list:
+        def url(name, *args):
+            return reverse(name, args=args)
+
+        def get(name, *args, query=None):
+            return lambda iteration: (url(name, *args), query)
+
+        return [
+            Endpoint("train_type list", "get", get("task:traintype-list")),
+            Endpoint(
+                "train_type detail",
+                "get",
+                get("task:traintype-detail", self.train_type.id),
+            ),
+            Endpoint(
+                "train_type create",
+                "post",
+                lambda iteration: (
+                    url("task:traintype-list"),
+                    {"type_name": f"Benchmark type {next(self.names)}"},
+                ),
+                role="admin",
+            ),
+            Endpoint("train list", "get", get("task:train-list")),
+            Endpoint(
+                "train detail", "get", get("task:train-detail", self.train.id)
+            ),
+            Endpoint(
+                "train create",
+                "post",
+                lambda iteration: (
+                    url("task:train-list"),
+                    {
+                        "name": f"Benchmark train {next(self.names)}",
+                        "cargo_num": 10,
+                        "places_in_cargo": 40,
+                        "kilometer_price": 1.2,
+                        "train_type": self.train_type.id,
+                    },
+                ),
+                role="admin",
+            ),
+            Endpoint("crew list", "get", get("task:crew-list")),
+            Endpoint(
+                "crew detail", "get", get("task:crew-detail", self.crew.id)
+            ),
+            Endpoint(
+                "crew create",
+                "post",
+                lambda iteration: (
+                    url("task:crew-list"),
+                    {"first_name": "Benchmark", "last_name": "Driver"},
+                ),
+                role="admin",
+            ),
+            Endpoint("station list", "get", get("task:station-list")),
+            Endpoint(
+                "station detail",
+                "get",
+                get("task:station-detail", self.station.id),
+            ),
+            Endpoint(
+                "station autocomplete",
+                "get",
+                get(
+                    "task:station-autocomplete",
+                    query={"q": self.station.name[:3]},
+                ),
+            ),
+            Endpoint(
+                "station distance matrix",
+                "get",
+                get("task:station-distance-matrix", query={
+                    "train": self.train.id
+                }),
+                role="admin",
+            ),
+            Endpoint(
+                "station create",
+                "post",
+                lambda iteration: (
+                    url("task:station-list"), self._station_payload()
+                ),
+                role="admin",
+            ),
+            Endpoint(
+                "station update",
+                "patch",
+                lambda iteration: (
+                    url("task:station-detail", self.station.id),
+                    {"service_cost": 2 + iteration % 2},
+                ),
+                role="admin",
+            ),
+            Endpoint("route list", "get", get("task:route-list")),
+            Endpoint(
+                "route detail", "get", get("task:route-detail", self.route.id)
+            ),
+            Endpoint(
+                "route create",
+                "post",
+                lambda iteration: (
+                    url("task:route-list"),
+                    {
+                        "source": self.route.destination_id,
+                        "destination": self.route.source_id,
+                    },
+                ),
+                role="admin",
+            ),
+            Endpoint("journey list", "get", get("task:journey-list")),
+            Endpoint(
+                "journey list filtered",
+                "get",
+                get(
+                    "task:journey-list",
+                    query={
+                        "departure_date": (
+                            self.journey.departure_time.date().isoformat()
+                        ),
+                        "source_station": self.station.name[:3],
+                        "ordering": "price_trip",
+                    },
+                ),
+            ),
+            Endpoint(
+                "journey list cursor",
+                "get",
+                get("task:journey-list", query={"pagination": "cursor"}),
+            ),
+            Endpoint(
+                "journey detail",
+                "get",
+                get("task:journey-detail", self.journey.id),
+            ),
+            Endpoint(
+                "journey seats",
+                "get",
+                get("task:journey-seats", self.journey.id),
+            ),
+            Endpoint(
+                "journey connections",
+                "get",
+                get(
+                    "task:journey-connections",
+                    query={
+                        "source": self.journey.route.source_id,
+                        "destination": self.destination.id,
+                        "departure_time": (
+                            self.journey.departure_time.isoformat()
+                        ),
+                    },
+                ),
+            ),
+            Endpoint(
+                "journey timetable stats",
+                "get",
+                get("task:journey-timetable-stats"),
+                role="admin",
+            ),
+            Endpoint(
+                "journey create",
+                "post",
+                lambda iteration: (
+                    url("task:journey-list"), self._journey_payload()
+                ),
+                role="admin",
+            ),
+            Endpoint(
+                "journey delete",
+                "delete",
+                lambda iteration: (
+                    url("task:journey-detail", self._journey().id), None
+                ),
+                role="admin",
+            ),
+            Endpoint("order list", "get", get("task:order-list")),
+            Endpoint(
+                "order detail", "get", get("task:order-detail", self.order.id)
+            ),
+            Endpoint(
+                "order create",
+                "post",
+                lambda iteration: (
+                    url("task:order-list"), self._order_payload()
+                ),
+            ),
+            Endpoint(
+                "order delete",
+                "delete",
+                lambda iteration: (
+                    url("task:order-detail", self._order().id), None
+                ),
+            ),
+            Endpoint(
+                "hold create",
+                "post",
+                lambda iteration: (
+                    url("task:seathold-list"), self._hold_payload()
+                ),
+            ),
+            Endpoint("hold list", "get", get("task:seathold-list")),
+            Endpoint(
+                "hold confirm",
+                "post",
+                lambda iteration: (
+                    url("task:seathold-confirm", self._hold().id), None
+                ),
+            ),
+            Endpoint(
+                "hold delete",
+                "delete",
+                lambda iteration: (
+                    url("task:seathold-detail", self._hold().id), None
+                ),
+            ),
+            Endpoint(
+                "user create",
+                "post",
+                lambda iteration: (
+                    url("user:create"),
+                    {
+                        "email": (
+                            f"benchmark.{uuid.uuid4().hex}@example.com"
+                        ),
+                        "password": PASSWORD,
+                    },
+                ),
+                role="anonymous",
+            ),
+            Endpoint(
+                "user token",
+                "post",
+                lambda iteration: (
+                    url("user:token_obtain_pair"),
+                    {"email": self.user.email, "password": PASSWORD},
+                ),
+                role="anonymous",
+            ),
+            Endpoint(
+                "user token refresh",
+                "post",
+                lambda iteration: (
+                    url("user:token_refresh"),
+                    {"refresh": str(RefreshToken.for_user(self.user))},
+                ),
+                role="anonymous",
+            ),
+            Endpoint(
+                "user token verify",
+                "post",
+                lambda iteration: (
+                    url("user:token_verify"),
+                    {
+                        "token": str(
+                            RefreshToken.for_user(self.user).access_token
+                        )
+                    },
+                ),
+                role="anonymous",
+            ),
+            Endpoint("user me", "get", get("user:manage")),
+            Endpoint(
+                "user me update",
+                "patch",
+                lambda iteration: (
+                    url("user:manage"), {"first_name": f"Name{iteration}"}
+                ),
+            ),
+        ]
+
+    def _reset_throttles(self):
+        """Keep the rate limits from failing the timed requests"""
+        throttle_store().delete(
+            throttle_keys([self.user.pk, self.admin.pk, "127.0.0.1"])
+        )
+
+    def _request(self, endpoint, iteration):
+        path, data = endpoint.prepare(iteration)
+        self._reset_throttles()
+        client = self.clients[endpoint.role]
+        kwargs = {"format": endpoint.data_format} if data is not None else {}
+        started = time.perf_counter()
+        response = getattr(client, endpoint.method)(path, data, **kwargs)
+        return response, time.perf_counter() - started
+
+    def measure(self, endpoint) -> dict:
+        self._request(endpoint, 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            response, _ = self._request(endpoint, 1)
+        # Read now, the next requests reset the connection query log
+        query_count = len(queries)
+
+        timings = [
+            self._request(endpoint, iteration)[1]
+            for iteration in range(2, self.repeat + 2)
+        ]
+
+        tracemalloc.start()
+        try:
+            self._request(endpoint, self.repeat + 2)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "name": endpoint.name,
+            "method": endpoint.method.upper(),
+            "path": response.wsgi_request.path,
+            "status": response.status_code,
+            "queries": query_count,
+            "p50_ms": round(statistics.median(timings) * 1000, 3),
+            "p95_ms": round(percentile(timings, 0.95) * 1000, 3),
+            "mean_ms": round(statistics.mean(timings) * 1000, 3),
+            "peak_memory_kb": round(peak / 1024, 1),
+        }
+
+    def run(self, names=None) -> list:
+        return [
+            self.measure(endpoint)
+            for endpoint in self.endpoints()
+            if not names or endpoint.name in names
+        ]
+
+
+# URL names of the DRF view and of its async version
+STACK_ENDPOINTS = {
+    "journey list": ("task:journey-list", "task:async-journey-list"),
+    "journey detail": ("task:journey-detail", "task:async-journey-detail"),
+    "station list": ("task:station-list", "task:async-station-list"),
+    "order list": ("task:order-list", "task:async-order-list"),
+}
+
+
+class StackBenchmark:
+    """Sends the same reads concurrently through the WSGI stack,
+    worker threads with a database connection each, and through the ASGI
+    stack, coroutines on one event loop calling the async views.
+    Worker threads do not see uncommitted rows, run it on committed data"""
+
+    def __init__(self, concurrency=10, requests=200):
+        self.concurrency = concurrency
+        self.requests = requests
+        user = (
+            get_user_model().objects.filter(order__isnull=False).first()
+            or get_user_model().objects.filter(is_active=True).first()
+        )
+        if user is None:
+            raise ValueError("There are no users to authenticate")
+        self.authorization = (
+            f"Bearer {RefreshToken.for_user(user).access_token}"
+        )
+        self.journey_id = Journey.objects.values_list("id", flat=True).first()
+        if self.journey_id is None:
+            raise ValueError("There are no journeys to read")
+
+    def _paths(self, name) -> tuple:
+        args = [self.journey_id] if name == "journey detail" else []
+        return tuple(
+            reverse(url_name, args=args) for url_name in STACK_ENDPOINTS[name]
+        )
+
+    def _shares(self) -> list:
+        """Number of requests sent by every worker"""
+        share, rest = divmod(self.requests, self.concurrency)
+        return [
+            share + (worker < rest) for worker in range(self.concurrency)
+        ]
+
+    def run_wsgi(self, path) -> tuple:
+        def worker(count):
+            client = Client(HTTP_AUTHORIZATION=self.authorization)
+            timings = []
+            try:
+                for _ in range(count):
+                    started = time.perf_counter()
+                    response = client.get(path)
+                    timings.append(
+                        (time.perf_counter() - started, response.status_code)
+                    )
+            finally:
+                connection.close()
+            return timings
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            timings = list(executor.map(worker, self._shares()))
+        return timings, time.perf_counter() - started
+
+    def run_asgi(self, path) -> tuple:
+        async def worker(count):
+            client = AsyncClient()
+            timings = []
+            for _ in range(count):
+                started = time.perf_counter()
+                response = await client.get(
+                    path, authorization=self.authorization
+                )
+                timings.append(
+                    (time.perf_counter() - started, response.status_code)
+                )
+            return timings
+
+        async def run():
+            started = time.perf_counter()
+            timings = await asyncio.gather(
+                *(worker(count) for count in self._shares())
+            )
+            elapsed = time.perf_counter() - started
+            # Close the connection of the thread the async ORM ran in
+            await sync_to_async(connections.close_all)()
+            return timings, elapsed
+
+        return asyncio.run(run())
+
+    def measure(self, name, stack, path, timings, elapsed) -> dict:
+        timings = [timing for worker in timings for timing in worker]
+        durations = [duration for duration, _ in timings]
+        return {
+            "name": name,
+            "stack": stack,
+            "path": path,
+            "requests": len(timings),
+            "concurrency": self.concurrency,
+            "statuses": dict(Counter(status for _, status in timings)),
+            "seconds": round(elapsed, 3),
+            "requests_per_second": round(len(timings) / elapsed, 1),
+            "p50_ms": round(statistics.median(durations) * 1000, 3),
+            "p95_ms": round(percentile(durations, 0.95) * 1000, 3),
+        }
+
+    def run(self, names=None) -> list:
+        results = []
+        for name in names or STACK_ENDPOINTS:
+            sync_path, async_path = self._paths(name)
+            results.append(
+                self.measure(
+                    name, "wsgi", sync_path, *self.run_wsgi(sync_path)
+                )
+            )
+            results.append(
+                self.measure(
+                    name, "asgi", async_path, *self.run_asgi(async_path)
+                )
+            )
+        return results
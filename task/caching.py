@@ -0,0 +1,120 @@
+import hashlib
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models as db_models
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from task.models import DataVersion
+
+_deferred_bumps = ContextVar("deferred_version_bumps", default=None)
+
+
+def version_key(model) -> str:
+    return f"version:{model._meta.label_lower}"
+
+
+def bump_model_version(model) -> None:
+    """Change the version of the model data in the DataVersion table
+    shared by the workers, within the transaction of the change.
+    Versions follow the clock, so responses cached inside a rolled back
+    transaction never match a later version"""
+    deferred = _deferred_bumps.get()
+    if deferred is not None:
+        deferred.add(model)
+        return
+    key = version_key(model)
+    version = Greatest(
+        F("version") + 1,
+        Value(time.time_ns()),
+        output_field=db_models.PositiveBigIntegerField(),
+    )
+    if not DataVersion.objects.filter(key=key).update(version=version):
+        DataVersion.objects.get_or_create(
+            key=key, defaults={"version": time.time_ns()}
+        )
+
+
+@contextmanager
+def deferred_version_bumps():
+    """Bump the version of every model changed in the block once
+    at the end instead of once per object saved or deleted in it"""
+    changed = set()
+    token = _deferred_bumps.set(changed)
+    try:
+        yield
+    finally:
+        _deferred_bumps.reset(token)
+        for model in sorted(changed, key=version_key):
+            bump_model_version(model)
+
+
+def model_versions(models) -> list:
+    """Versions of the models with one indexed query,
+    0 for models never changed"""
+    keys = [version_key(model) for model in models]
+    versions = dict(
+        DataVersion.objects.filter(key__in=keys).values_list("key", "version")
+    )
+    return [versions.get(key, 0) for key in keys]
+
+
+class CachedResponseMixin:
+    """Caches list and retrieve responses until one of cache_models changes.
+    Responses carry a strong ETag, a matching If-None-Match gets 304
+    straight from the cache"""
+    cache_models = ()
+
+    def _response_cache_key(self, request) -> str:
+        versions = model_versions(self.cache_models or [self.queryset.model])
+        location = hashlib.sha256(
+            "|".join(
+                [
+                    request.build_absolute_uri(),
+                    request.accepted_renderer.format,
+                    *map(str, versions),
+                ]
+            ).encode()
+        ).hexdigest()
+        return f"response:{self.basename}:{self.action}:{location}"
+
+    @staticmethod
+    def _not_modified(request, etag) -> bool:
+        etags = parse_etags(request.headers.get("If-None-Match", ""))
+        return "*" in etags or etag in etags
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        key = self._response_cache_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = json.dumps(response.data, cls=JSONEncoder)
+            etag = quote_etag(hashlib.sha256(content.encode()).hexdigest())
+            cached = (etag, response.data)
+            cache.set(key, cached, settings.RESPONSE_CACHE_TIMEOUT)
+
+        etag, data = cached
+        if self._not_modified(request, etag):
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+        return Response(data, headers={"ETag": etag})
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
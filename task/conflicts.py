@@ -0,0 +1,217 @@
+import heapq
+import itertools
+from collections import defaultdict
+
+from django.db.models import Max, Min, OuterRef, Q, Subquery
+
+from task.models import Crew, Journey
+
+BATCH_SIZE = 1000
+
+
+class ScheduleConflict(ValueError):
+    pass
+
+
+def find_overlaps(intervals):
+    """Yield every pair of overlapping (start, end, key) intervals,
+    which must be sorted by start. Sweeps the starts keeping a heap of
+    the intervals still running, O(n log n) plus the number of pairs"""
+    running = []
+    for start, end, key in intervals:
+        while running and running[0][0] <= start:
+            heapq.heappop(running)
+        for _, _, other_key in running:
+            yield other_key, key
+        heapq.heappush(running, (end, start, key))
+
+
+def journey_conflicts(
+    departure_time, arrival_time, train_id, crew_ids, journey_id=None
+) -> dict:
+    """Journeys of the train and of the crew overlapping the trip,
+    as {"train": [journey ids], "crew": {crew id: [journey ids]}}.
+
+    Validated journeys of one train or crew member never overlap,
+    so only those departing during the trip and the last one departing
+    before it can. Both are range scans of the departure time index"""
+    journeys = Journey.objects.exclude(pk=journey_id).order_by()
+    during = journeys.filter(
+        departure_time__gte=departure_time,
+        departure_time__lt=arrival_time,
+    )
+    before = journeys.filter(departure_time__lt=departure_time).order_by(
+        "-departure_time"
+    )
+
+    conflicts = {"train": [], "crew": defaultdict(list)}
+    if train_id is not None:
+        train_before = before.filter(train_id=train_id).values("id")[:1]
+        conflicts["train"] = list(
+            journeys.filter(train_id=train_id, arrival_time__gt=departure_time)
+            .filter(
+                Q(
+                    departure_time__gte=departure_time,
+                    departure_time__lt=arrival_time,
+                )
+                | Q(pk=Subquery(train_before))
+            )
+            .order_by("departure_time")
+            .values_list("id", flat=True)
+        )
+
+    if crew_ids:
+        crew_before = before.filter(crew=OuterRef("pk"))
+        for crew_id, previous_id, previous_arrival in Crew.objects.filter(
+            pk__in=crew_ids
+        ).annotate(
+            previous_id=Subquery(crew_before.values("id")[:1]),
+            previous_arrival=Subquery(crew_before.values("arrival_time")[:1]),
+        ).values_list("id", "previous_id", "previous_arrival"):
+            if previous_id and previous_arrival > departure_time:
+                conflicts["crew"][crew_id].append(previous_id)
+        for crew_id, conflict_id in Journey.crew.through.objects.filter(
+            crew_id__in=crew_ids, journey__in=during
+        ).order_by("journey__departure_time").values_list(
+            "crew_id", "journey_id"
+        ):
+            conflicts["crew"][crew_id].append(conflict_id)
+    conflicts["crew"] = dict(conflicts["crew"])
+    return conflicts
+
+
+def validate_schedule(
+    departure_time, arrival_time, train, crew, journey_id, error_to_raise
+) -> None:
+    """Raise error_to_raise with messages by field when the trip is
+    not after its departure or overlaps journeys of its train or crew"""
+    if departure_time is None or arrival_time is None:
+        return
+    if arrival_time <= departure_time:
+        raise error_to_raise(
+            {"arrival_time": "Must be after departure_time."}
+        )
+
+    crew_names = {member.id: member.full_name for member in crew}
+    conflicts = journey_conflicts(
+        departure_time,
+        arrival_time,
+        getattr(train, "id", None),
+        list(crew_names),
+        journey_id,
+    )
+    errors = {}
+    if conflicts["train"]:
+        errors["train"] = (
+            "The train is on overlapping journeys "
+            f"{', '.join(map(str, conflicts['train']))}."
+        )
+    if conflicts["crew"]:
+        errors["crew"] = [
+            f"{crew_names[crew_id]} is on overlapping journeys "
+            f"{', '.join(map(str, journey_ids))}."
+            for crew_id, journey_ids in conflicts["crew"].items()
+        ]
+    if errors:
+        raise error_to_raise(errors)
+
+
+def timetable_overlaps(chunk_size=2000):
+    """Yield ("train" or "crew", train or crew id, journey id,
+    overlapping journey id) for every overlap in the timetable.
+    Rows are streamed in order of the key and departure time,
+    so only the journeys running at the same time are held"""
+    return _sweep(
+        Journey.objects.all(), Journey.crew.through.objects.all(), chunk_size
+    )
+
+
+def batch_overlaps(journey_ids=(), assignments=(), chunk_size=2000):
+    """Yield the overlaps, as timetable_overlaps does, of journeys or of
+    (journey id, crew id) assignments written in bulk without validation,
+    with each other and with the rest of the timetable. Only the journeys
+    of their trains and crew running during the batch are swept"""
+    journey_ids = set(journey_ids)
+    assignments = set(assignments)
+    batch = journey_ids | {journey_id for journey_id, _ in assignments}
+    if not batch:
+        return
+    window = Journey.objects.filter(pk__in=batch).aggregate(
+        start=Min("departure_time"), end=Max("arrival_time")
+    )
+    running = Journey.objects.filter(
+        departure_time__lt=window["end"], arrival_time__gt=window["start"]
+    )
+    crew = Journey.crew.through.objects.filter(journey__in=running)
+    if assignments:
+        # Only the new crew of the journeys, their trains did not change
+        trains = running.none()
+        crew = crew.filter(
+            crew_id__in={crew_id for _, crew_id in assignments}
+        )
+    else:
+        trains = running.filter(
+            train_id__in=Journey.objects.filter(pk__in=batch).values(
+                "train_id"
+            )
+        )
+        crew = crew.filter(
+            crew_id__in=Journey.crew.through.objects.filter(
+                journey_id__in=batch
+            ).values("crew_id")
+        )
+    for kind, key, first, second in _sweep(trains, crew, chunk_size):
+        if (
+            first in journey_ids
+            or second in journey_ids
+            or (first, key) in assignments
+            or (second, key) in assignments
+        ):
+            yield kind, key, first, second
+
+
+def check_batch(
+    journey_ids=(), assignments=(), error_to_raise=ScheduleConflict
+) -> None:
+    """Raise error_to_raise listing the first overlaps of a batch
+    written in bulk, see batch_overlaps. Journey ids are checked
+    BATCH_SIZE at a time to keep the queries bounded"""
+    journey_ids, assignments = list(journey_ids), list(assignments)
+    size = max(len(journey_ids), len(assignments))
+    overlaps = itertools.chain.from_iterable(
+        batch_overlaps(
+            journey_ids[start:start + BATCH_SIZE],
+            assignments[start:start + BATCH_SIZE],
+        )
+        for start in range(0, size, BATCH_SIZE)
+    )
+    messages = [
+        f"{kind} {key}: journey {first} overlaps journey {second}"
+        for kind, key, first, second in itertools.islice(overlaps, 6)
+    ]
+    if len(messages) > 5:
+        messages[5] = "and more"
+    if messages:
+        raise error_to_raise(
+            "Overlapping journeys, " + "; ".join(messages) + "."
+        )
+
+
+def _sweep(journeys, crew, chunk_size):
+    trains = journeys.order_by(
+        "train_id", "departure_time"
+    ).values_list("train_id", "departure_time", "arrival_time", "id")
+    crew = crew.order_by(
+        "crew_id", "journey__departure_time"
+    ).values_list(
+        "crew_id",
+        "journey__departure_time",
+        "journey__arrival_time",
+        "journey_id",
+    )
+    for kind, rows in (("train", trains), ("crew", crew)):
+        for key, group in itertools.groupby(
+            rows.iterator(chunk_size=chunk_size), key=lambda row: row[0]
+        ):
+            for first, second in find_overlaps(row[1:] for row in group):
+                yield kind, key, first, second
@@ -0,0 +1,67 @@
+import numpy as np
+
+from task.models import EARTH_RADIUS
+
+
+def distance_matrix(latitudes, longitudes) -> np.ndarray:
+    """Distances in kilometers between every pair of points,
+    rounded down to hundredths like station_distance"""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+
+    corner = np.sin((lat[np.newaxis, :] - lat[:, np.newaxis]) / 2)
+    np.square(corner, out=corner)
+    corner_lon = cos_lat[:, np.newaxis] * cos_lat[np.newaxis, :]
+    corner_lon *= np.square(
+        np.sin((lon[np.newaxis, :] - lon[:, np.newaxis]) / 2)
+    )
+    corner += corner_lon
+    np.clip(corner, 0.0, 1.0, out=corner)
+
+    distance = np.arctan2(np.sqrt(corner), np.sqrt(1 - corner))
+    distance *= EARTH_RADIUS * 2
+    distance *= 100
+    np.floor(distance, out=distance)
+    distance /= 100
+    return distance
+
+
+def fare_matrix(
+        distances: np.ndarray,
+        service_costs,
+        kilometer_price: float
+) -> np.ndarray:
+    """Trip prices between every pair of stations for one train,
+    rounded down to cents like Journey.price_trip"""
+    service_costs = np.asarray(service_costs, dtype=np.float64)
+
+    fares = distances * kilometer_price
+    fares += service_costs[:, np.newaxis]
+    fares += service_costs[np.newaxis, :]
+    fares *= 100
+    np.floor(fares, out=fares)
+    fares /= 100
+    return fares
+
+
+def station_matrices(stations, train=None) -> dict:
+    """Distance matrix and, when train is given, fare matrix
+    for the stations queryset"""
+    rows = list(
+        stations.order_by("id").values_list(
+            "id", "latitude", "longitude", "service_cost"
+        )
+    )
+    ids, latitudes, longitudes, service_costs = (
+        zip(*rows) if rows else ((), (), (), ())
+    )
+
+    distances = distance_matrix(latitudes, longitudes)
+    matrices = {"stations": list(ids), "distances": distances}
+
+    if train is not None:
+        matrices["fares"] = fare_matrix(
+            distances, service_costs, train.kilometer_price
+        )
+    return matrices
@@ -0,0 +1,156 @@
+import csv
+import itertools
+import json
+import tempfile
+
+from django.conf import settings
+from rest_framework import serializers
+
+from task.models import Order, Route, Ticket
+
+datetime_field = serializers.DateTimeField()
+
+ORDER_VALUES = ("id", "created_at", "user__email", "total_price")
+TICKET_VALUES = (
+    "order_id",
+    "id",
+    "journey_id",
+    "journey__departure_time",
+    "journey__arrival_time",
+    "journey__train__name",
+    "journey__route__source__name",
+    "journey__route__destination__name",
+    "cargo_num",
+    "place_in_cargo",
+    "price",
+)
+TICKET_FIELDS = (
+    "id",
+    "journey",
+    "departure_time",
+    "arrival_time",
+    "train",
+    "route",
+    "cargo_num",
+    "place_in_cargo",
+    "price",
+)
+CSV_COLUMNS = (
+    "order_id",
+    "created_at",
+    "user",
+    "total_price",
+    "ticket_id",
+    "journey_id",
+    *TICKET_FIELDS[2:],
+)
+
+
+def order_chunks(queryset=None, chunk_size=2000):
+    """Yield lists of (order row, ticket dicts) in order of ids.
+    Orders are read through a server-side cursor, the tickets of every
+    chunk with one more query, so memory depends on chunk_size only"""
+    if queryset is None:
+        queryset = Order.objects.all()
+    orders = (
+        queryset.order_by("id")
+        .values(*ORDER_VALUES)
+        .iterator(chunk_size=chunk_size)
+    )
+    while chunk := list(itertools.islice(orders, chunk_size)):
+        tickets = {row["id"]: [] for row in chunk}
+        for values in (
+            Ticket.objects.filter(order_id__in=tickets)
+            .order_by("order_id", "id")
+            .values_list(*TICKET_VALUES)
+        ):
+            tickets[values[0]].append(ticket_data(values))
+        yield [(row, tickets[row["id"]]) for row in chunk]
+
+
+def ticket_data(values) -> dict:
+    (
+        _,
+        ticket_id,
+        journey_id,
+        departure_time,
+        arrival_time,
+        train_name,
+        source_name,
+        destination_name,
+        cargo_num,
+        place_in_cargo,
+        price,
+    ) = values
+    return {
+        "id": ticket_id,
+        "journey": journey_id,
+        "departure_time": datetime_field.to_representation(departure_time),
+        "arrival_time": datetime_field.to_representation(arrival_time),
+        "train": train_name,
+        "route": Route.label(source_name, destination_name),
+        "cargo_num": cargo_num,
+        "place_in_cargo": place_in_cargo,
+        "price": price,
+    }
+
+
+def order_data(row) -> dict:
+    return {
+        "id": row["id"],
+        "created_at": datetime_field.to_representation(row["created_at"]),
+        "user": row["user__email"],
+        "total_price": row["total_price"],
+    }
+
+
+def export_ndjson(chunks):
+    """One JSON object per order with its tickets"""
+    for chunk in chunks:
+        yield "".join(
+            json.dumps({**order_data(row), "tickets": tickets}) + "\n"
+            for row, tickets in chunk
+        )
+
+
+class LineBuffer:
+    """File-like object returning what csv.writer writes to it"""
+
+    def write(self, line):
+        return line
+
+
+def export_csv(chunks):
+    """One line per ticket, orders without tickets get a line as well"""
+    writer = csv.writer(LineBuffer())
+    yield writer.writerow(CSV_COLUMNS)
+    for chunk in chunks:
+        lines = []
+        for row, tickets in chunk:
+            order_values = list(order_data(row).values())
+            for ticket in tickets or [{}]:
+                lines.append(
+                    writer.writerow(
+                        order_values
+                        + [ticket.get(name, "") for name in TICKET_FIELDS]
+                    )
+                )
+        yield "".join(lines)
+
+
+def spooled_file(content):
+    """Temporary file with the exported text, kept in memory up to
+    FILE_UPLOAD_MAX_MEMORY_SIZE bytes and on disk beyond it"""
+    spool = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    for part in content:
+        spool.write(part.encode())
+    spool.seek(0)
+    return spool
+
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", export_ndjson),
+    "csv": ("text/csv", export_csv),
+}
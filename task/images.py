@@ -0,0 +1,180 @@
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils.text import slugify
+from PIL import Image, ImageOps, features
+
+from task.models import Crew
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = "upload/crew/incoming/"
+VARIANT_DIR = "upload/crew/"
+
+# Field of every variant with its longest side setting and format
+VARIANTS = {
+    "image": ("CREW_IMAGE_SIZE", "JPEG"),
+    "image_webp": ("CREW_IMAGE_SIZE", "WEBP"),
+    "thumbnail": ("CREW_THUMBNAIL_SIZE", "JPEG"),
+    "thumbnail_webp": ("CREW_THUMBNAIL_SIZE", "WEBP"),
+}
+EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def variant_formats() -> set:
+    """WebP needs Pillow built with libwebp, without it only JPEG"""
+    if features.check("webp"):
+        return {"JPEG", "WEBP"}
+    return {"JPEG"}
+
+
+def render_variants(source) -> dict:
+    """Encoded bytes by field name. The image is turned upright
+    and saved without EXIF or other metadata"""
+    try:
+        with Image.open(source) as image:
+            if image.width * image.height > settings.CREW_IMAGE_MAX_PIXELS:
+                raise InvalidImage(
+                    f"{image.width}x{image.height} image is too large"
+                )
+            image = ImageOps.exif_transpose(image).convert("RGB")
+    except (OSError, ValueError, Image.DecompressionBombError) as error:
+        raise InvalidImage(str(error))
+
+    formats = variant_formats()
+    variants = {}
+    for field, (size_setting, image_format) in VARIANTS.items():
+        if image_format not in formats:
+            continue
+        size = getattr(settings, size_setting)
+        variant = image.copy()
+        variant.thumbnail((size, size), Image.Resampling.LANCZOS)
+        content = BytesIO()
+        variant.save(content, image_format, quality=85, optimize=True)
+        variants[field] = content.getvalue()
+    return variants
+
+
+def save_upload(upload) -> str:
+    """Keep the uploaded file until it is processed, returns its name"""
+    _, extension = os.path.splitext(upload.name)
+    return default_storage.save(
+        f"{UPLOAD_DIR}{uuid.uuid4()}{extension.lower()}", upload
+    )
+
+
+def process_crew_image(crew_id, upload_name) -> None:
+    """Store the variants of the upload and mark the image ready,
+    or failed when the upload is not a valid image. Skipped when
+    a newer upload of the crew member replaced this one"""
+    try:
+        with default_storage.open(upload_name) as source:
+            variants = render_variants(source)
+    except InvalidImage as error:
+        logger.info("Crew %s image rejected: %s", crew_id, error)
+        variants = None
+
+    with transaction.atomic():
+        crew = (
+            Crew.objects.select_for_update()
+            .filter(pk=crew_id, image_upload=upload_name)
+            .first()
+        )
+        if crew is None:
+            default_storage.delete(upload_name)
+            return
+        old_names = [
+            getattr(crew, field).name
+            for field in VARIANTS
+            if getattr(crew, field)
+        ]
+        if variants is None:
+            crew.image_status = Crew.ImageStatus.FAILED
+        else:
+            name = f"{VARIANT_DIR}{slugify(crew.first_name)}-{uuid.uuid4()}"
+            for field, (_, image_format) in VARIANTS.items():
+                content = variants.get(field)
+                if content is None:
+                    setattr(crew, field, None)
+                    continue
+                suffix = "" if field == "image" else f"-{field}"
+                setattr(
+                    crew,
+                    field,
+                    default_storage.save(
+                        f"{name}{suffix}.{EXTENSIONS[image_format]}",
+                        ContentFile(content),
+                    ),
+                )
+            crew.image_status = Crew.ImageStatus.READY
+        crew.image_upload = ""
+        crew.save(
+            update_fields=["image_status", "image_upload", *VARIANTS]
+        )
+
+    if variants is None:
+        # The current variants stay, a stored image that failed as well
+        old_names = [] if upload_name in old_names else [upload_name]
+    else:
+        old_names.append(upload_name)
+    for old_name in old_names:
+        default_storage.delete(old_name)
+
+
+def _process_in_worker(crew_id, upload_name) -> None:
+    try:
+        process_crew_image(crew_id, upload_name)
+    except Exception:
+        logger.exception("Crew %s image processing failed", crew_id)
+    finally:
+        # Every thread of the pool opens its own connections
+        connections.close_all()
+
+
+class ImagePipeline:
+    """Thread pool processing uploads after the request returned.
+    Pillow releases the GIL while it decodes, resizes and encodes,
+    so threads keep the database connection handling of the request
+    workers without forking them"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.CREW_IMAGE_WORKERS,
+                    thread_name_prefix="crew-image",
+                )
+            return self._executor
+
+    def submit(self, crew_id, upload_name) -> None:
+        """Process the upload once the transaction saving it commits"""
+        if settings.CREW_IMAGE_WORKERS:
+            transaction.on_commit(
+                lambda: self.executor.submit(
+                    _process_in_worker, crew_id, upload_name
+                )
+            )
+        else:
+            transaction.on_commit(
+                lambda: process_crew_image(crew_id, upload_name)
+            )
+
+
+image_pipeline = ImagePipeline()
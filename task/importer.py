@@ -0,0 +1,440 @@
+import csv
+import itertools
+import json
+from abc import ABC, abstractmethod
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from task.conflicts import check_batch
+from task.models import (
+    Crew,
+    Journey,
+    Route,
+    Station,
+    Train,
+    TrainType,
+    station_distance,
+)
+from task.timetable import deferred_timetable_change
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(stream, data_format: str):
+    """Yield (line number, row dict) from CSV with a header line
+    or from NDJSON, one object per line"""
+    if data_format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            raise RowError(f"Line {line_number}: invalid JSON, {error}")
+        if not isinstance(row, dict):
+            raise RowError(f"Line {line_number}: an object is required")
+        yield line_number, row
+
+
+def positive_int(value) -> int:
+    value = int(value)
+    if value < 1:
+        raise ValueError
+    return value
+
+
+def date_time(value):
+    value = parse_datetime(str(value))
+    if value is None:
+        raise ValueError
+    if settings.USE_TZ and timezone.is_naive(value):
+        return timezone.make_aware(value)
+    if not settings.USE_TZ and timezone.is_aware(value):
+        return timezone.make_naive(value)
+    return value
+
+
+class Importer(ABC):
+    """Saves rows of one kind batch by batch. Foreign keys are resolved
+    by natural keys through lookup maps of the reference tables, so memory
+    depends on the batch size and the network, not on the number of rows.
+    Rows matching an existing natural key update it with update=True
+    and are left unchanged otherwise"""
+    # Model of the saved rows and its fields written with update=True
+    model = None
+    update_fields = ()
+
+    def __init__(self, batch_size=1000, update=False):
+        self.batch_size = batch_size
+        self.update = update
+        self.counts = Counter(created=0, updated=0, unchanged=0)
+
+    def run(self, rows) -> dict:
+        rows = iter(rows)
+        # One timetable version bump for the import, not one per batch
+        with deferred_timetable_change():
+            while batch := list(itertools.islice(rows, self.batch_size)):
+                objects = {}
+                for line_number, row in batch:
+                    try:
+                        obj = self.build(row)
+                    except RowError as error:
+                        raise RowError(
+                            f"Line {line_number}: {error}"
+                        ) from None
+                    # The last row with the same natural key wins
+                    objects[self.key(obj)] = obj
+                self.save(objects)
+        return dict(self.counts)
+
+    @staticmethod
+    def value(row, name, convert=str):
+        value = row.get(name)
+        if value is None or value == "":
+            raise RowError(f"{name} is required")
+        try:
+            return convert(value)
+        except (TypeError, ValueError):
+            raise RowError(f"{name} has an invalid value {value!r}")
+
+    @staticmethod
+    def lookup(mapping, key, name):
+        try:
+            return mapping[key]
+        except KeyError:
+            raise RowError(f"unknown {name} {key!r}")
+
+    @abstractmethod
+    def build(self, row):
+        """Unsaved object of the row, raises RowError for invalid values"""
+
+    @abstractmethod
+    def key(self, obj):
+        """Natural key of the object"""
+
+    @abstractmethod
+    def existing(self, keys) -> dict:
+        """Primary keys of the saved rows by natural key"""
+
+    def save(self, objects: dict) -> None:
+        existing = self.existing(list(objects))
+        created = [
+            obj for key, obj in objects.items() if key not in existing
+        ]
+        updated = []
+        for key, pk in existing.items():
+            objects[key].pk = pk
+            updated.append(objects[key])
+
+        if created:
+            self.model.objects.bulk_create(created)
+            self.created(created)
+        if updated and self.update and self.update_fields:
+            self.model.objects.bulk_update(updated, self.update_fields)
+            self.counts["updated"] += len(updated)
+            self.written(created + updated)
+        else:
+            self.counts["unchanged"] += len(updated)
+            self.written(created)
+        self.counts["created"] += len(created)
+
+    def created(self, objects) -> None:
+        """Called with the inserted objects, their ids are set"""
+
+    def written(self, objects) -> None:
+        """Called with the inserted and updated objects of the batch,
+        raises RowError to reject it"""
+
+
+class StationImporter(Importer):
+    """Columns: name, latitude, longitude, service_cost"""
+    model = Station
+    update_fields = ("latitude", "longitude", "service_cost")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stations = dict(Station.objects.values_list("name", "id"))
+
+    def build(self, row):
+        return Station(
+            name=self.value(row, "name"),
+            latitude=self.value(row, "latitude", float),
+            longitude=self.value(row, "longitude", float),
+            service_cost=self.value(row, "service_cost", float),
+        )
+
+    def key(self, obj):
+        return obj.name
+
+    def existing(self, keys) -> dict:
+        return {
+            name: self.stations[name] for name in keys if name in self.stations
+        }
+
+    def created(self, objects) -> None:
+        self.stations.update((station.name, station.id) for station in objects)
+
+
+class TrainImporter(Importer):
+    """Columns: name, cargo_num, places_in_cargo, kilometer_price,
+    train_type. Missing train types are created"""
+    model = Train
+    update_fields = (
+        "cargo_num",
+        "places_in_cargo",
+        "kilometer_price",
+        "train_type",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.trains = dict(Train.objects.values_list("name", "id"))
+        self.train_types = dict(
+            TrainType.objects.values_list("type_name", "id")
+        )
+
+    def build(self, row):
+        return Train(
+            name=self.value(row, "name"),
+            cargo_num=self.value(row, "cargo_num", positive_int),
+            places_in_cargo=self.value(row, "places_in_cargo", positive_int),
+            kilometer_price=self.value(row, "kilometer_price", float),
+            train_type=TrainType(type_name=self.value(row, "train_type")),
+        )
+
+    def key(self, obj):
+        return obj.name
+
+    def existing(self, keys) -> dict:
+        return {
+            name: self.trains[name] for name in keys if name in self.trains
+        }
+
+    def save(self, objects: dict) -> None:
+        missing = {
+            train.train_type.type_name for train in objects.values()
+        } - self.train_types.keys()
+        if missing:
+            self.train_types.update(
+                (train_type.type_name, train_type.id)
+                for train_type in TrainType.objects.bulk_create(
+                    TrainType(type_name=type_name) for type_name in missing
+                )
+            )
+        for train in objects.values():
+            train.train_type = TrainType(
+                id=self.train_types[train.train_type.type_name],
+                type_name=train.train_type.type_name,
+            )
+        super().save(objects)
+
+    def created(self, objects) -> None:
+        self.trains.update((train.name, train.id) for train in objects)
+
+
+class RouteImporter(Importer):
+    """Columns: source, destination, names of existing stations"""
+    model = Route
+    update_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stations = {
+            name: (pk, latitude, longitude)
+            for name, pk, latitude, longitude in Station.objects.values_list(
+                "name", "id", "latitude", "longitude"
+            )
+        }
+        self.routes = {
+            (source_id, destination_id): pk
+            for pk, source_id, destination_id in Route.objects.values_list(
+                "id", "source_id", "destination_id"
+            )
+        }
+
+    def build(self, row):
+        source = self.lookup(
+            self.stations, self.value(row, "source"), "station"
+        )
+        destination = self.lookup(
+            self.stations, self.value(row, "destination"), "station"
+        )
+        return Route(
+            source_id=source[0],
+            destination_id=destination[0],
+            distance=station_distance(*source[1:], *destination[1:]),
+        )
+
+    def key(self, obj):
+        return obj.source_id, obj.destination_id
+
+    def existing(self, keys) -> dict:
+        return {key: self.routes[key] for key in keys if key in self.routes}
+
+    def created(self, objects) -> None:
+        self.routes.update(
+            ((route.source_id, route.destination_id), route.id)
+            for route in objects
+        )
+
+
+class JourneyImporter(Importer):
+    """Columns: train, source, destination, departure_time, arrival_time.
+    The route of the stations must exist, a train departure is the
+    natural key of the journey"""
+    model = Journey
+    update_fields = ("route", "arrival_time")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.trains = dict(Train.objects.values_list("name", "id"))
+        self.stations = dict(Station.objects.values_list("name", "id"))
+        self.routes = {
+            (source_id, destination_id): pk
+            for pk, source_id, destination_id in Route.objects.values_list(
+                "id", "source_id", "destination_id"
+            )
+        }
+
+    def build(self, row):
+        source = self.lookup(
+            self.stations, self.value(row, "source"), "station"
+        )
+        destination = self.lookup(
+            self.stations, self.value(row, "destination"), "station"
+        )
+        journey = Journey(
+            train_id=self.lookup(
+                self.trains, self.value(row, "train"), "train"
+            ),
+            route_id=self.lookup(
+                self.routes,
+                (source, destination),
+                "route between stations",
+            ),
+            departure_time=self.value(row, "departure_time", date_time),
+            arrival_time=self.value(row, "arrival_time", date_time),
+        )
+        if journey.arrival_time <= journey.departure_time:
+            raise RowError("arrival_time must be after departure_time")
+        return journey
+
+    def key(self, obj):
+        return obj.train_id, obj.departure_time
+
+    def existing(self, keys) -> dict:
+        return journeys_by_departure(keys)
+
+    def written(self, objects) -> None:
+        check_batch(
+            [journey.id for journey in objects], error_to_raise=RowError
+        )
+
+
+def journeys_by_departure(keys) -> dict:
+    """Journey ids by (train_id, departure_time) with one query"""
+    if not keys:
+        return {}
+    departures = [departure_time for _, departure_time in keys]
+    journeys = Journey.objects.filter(
+        train_id__in={train_id for train_id, _ in keys},
+        departure_time__range=(min(departures), max(departures)),
+    ).values_list("train_id", "departure_time", "id")
+    keys = set(keys)
+    return {
+        (train_id, departure_time): pk
+        for train_id, departure_time, pk in journeys
+        if (train_id, departure_time) in keys
+    }
+
+
+class CrewAssignmentImporter(Importer):
+    """Columns: train, departure_time, first_name, last_name.
+    Adds crew members to journeys, missing crew members are created"""
+    model = Journey.crew.through
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.trains = dict(Train.objects.values_list("name", "id"))
+        self.crew = {
+            (first_name, last_name): pk
+            for pk, first_name, last_name in Crew.objects.values_list(
+                "id", "first_name", "last_name"
+            )
+        }
+
+    def build(self, row):
+        return (
+            self.lookup(self.trains, self.value(row, "train"), "train"),
+            self.value(row, "departure_time", date_time),
+            self.value(row, "first_name"),
+            self.value(row, "last_name"),
+        )
+
+    def key(self, obj):
+        return obj
+
+    def existing(self, keys) -> dict:
+        """Ids of the saved assignments by (journey id, crew id),
+        the keys of the rows are resolved to them by save"""
+        keys = set(keys)
+        return {
+            (journey_id, crew_id): pk
+            for pk, journey_id, crew_id in self.model.objects.filter(
+                journey_id__in={journey_id for journey_id, _ in keys}
+            ).values_list("id", "journey_id", "crew_id")
+            if (journey_id, crew_id) in keys
+        }
+
+    def save(self, objects: dict) -> None:
+        journeys = journeys_by_departure(
+            [(train_id, departure) for train_id, departure, _, _ in objects]
+        )
+        missing_crew = {
+            (first_name, last_name) for _, _, first_name, last_name in objects
+        } - self.crew.keys()
+        if missing_crew:
+            self.crew.update(
+                ((member.first_name, member.last_name), member.id)
+                for member in Crew.objects.bulk_create(
+                    Crew(first_name=first_name, last_name=last_name)
+                    for first_name, last_name in missing_crew
+                )
+            )
+
+        assignments = set()
+        for train_id, departure, first_name, last_name in objects:
+            journey_id = journeys.get((train_id, departure))
+            if journey_id is None:
+                raise RowError(
+                    f"no journey of train id {train_id} departing {departure}"
+                )
+            assignments.add((journey_id, self.crew[first_name, last_name]))
+
+        created = assignments - self.existing(assignments).keys()
+        self.model.objects.bulk_create(
+            self.model(journey_id=journey_id, crew_id=crew_id)
+            for journey_id, crew_id in created
+        )
+        check_batch(assignments=created, error_to_raise=RowError)
+        self.counts["created"] += len(created)
+        self.counts["unchanged"] += len(assignments) - len(created)
+
+
+IMPORTERS = {
+    "stations": StationImporter,
+    "trains": TrainImporter,
+    "routes": RouteImporter,
+    "journeys": JourneyImporter,
+    "crew": CrewAssignmentImporter,
+}
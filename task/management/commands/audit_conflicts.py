@@ -0,0 +1,81 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from task.conflicts import timetable_overlaps
+from task.models import Crew, Journey, Train
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "List journeys of one train or crew member overlapping in time. "
+        "Imported and generated journeys are not validated one by one"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Fail when any overlap is found",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Journeys read from the database at a time",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        overlaps = list(timetable_overlaps(options["chunk_size"]))
+        elapsed = time.perf_counter() - started
+
+        keys = {"train": set(), "crew": set()}
+        journey_ids = set()
+        for kind, key, first, second in overlaps:
+            keys[kind].add(key)
+            journey_ids.update((first, second))
+        names = {
+            "train": dict(
+                Train.objects.filter(pk__in=keys["train"]).values_list(
+                    "id", "name"
+                )
+            ),
+            "crew": {
+                member.id: member.full_name
+                for member in Crew.objects.filter(
+                    pk__in=keys["crew"]
+                ).only("first_name", "last_name")
+            },
+        }
+        times = {
+            journey_id: (departure_time, arrival_time)
+            for journey_id, departure_time, arrival_time in (
+                Journey.objects.filter(pk__in=journey_ids).values_list(
+                    "id", "departure_time", "arrival_time"
+                )
+            )
+        }
+        for kind, key, first, second in overlaps:
+            self.stdout.write(
+                f"{kind} {names[kind].get(key, key)}: "
+                f"journey {first} {self.period(times[first])} overlaps "
+                f"journey {second} {self.period(times[second])}"
+            )
+
+        counts = Counter(kind for kind, _, _, _ in overlaps)
+        summary = (
+            f"{counts['train']} train overlaps, "
+            f"{counts['crew']} crew overlaps in {elapsed:.1f}s"
+        )
+        if options["check"] and overlaps:
+            raise CommandError(summary)
+        self.stdout.write(summary)
+
+    @staticmethod
+    def period(times) -> str:
+        departure_time, arrival_time = times
+        return (
+            f"{departure_time:%Y-%m-%d %H:%M} - {arrival_time:%Y-%m-%d %H:%M}"
+        )
@@ -0,0 +1,90 @@
+import json
+import platform
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from task.benchmark import STACK_ENDPOINTS, StackBenchmark
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "Compare throughput and latency of concurrent reads through "
+        "the WSGI views and their async versions on the ASGI stack. "
+        "Uses the data in the database, fill it with generate_network"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Requests per endpoint and stack",
+        )
+        parser.add_argument(
+            "--endpoint",
+            action="append",
+            dest="endpoints",
+            choices=list(STACK_ENDPOINTS),
+            help="Only compare the endpoint with this name, repeatable",
+        )
+        parser.add_argument(
+            "--output",
+            default="benchmark_async.json",
+            help="JSON file for the results",
+        )
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1 or options["requests"] < 1:
+            raise CommandError("Concurrency and requests must be at least 1")
+
+        # Both stacks do the same work: no throttling, no cached responses
+        # and no sync only middleware, which production settings leave out
+        middleware = [
+            path for path in settings.MIDDLEWARE
+            if getattr(import_string(path), "async_capable", False)
+        ]
+        with override_settings(
+            DEBUG=False,
+            ALLOWED_HOSTS=["testserver"],
+            MIDDLEWARE=middleware,
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.dummy.DummyCache"
+                }
+            },
+            THROTTLE_STORE={"BACKEND": "task.throttling.NullBucketStore"},
+        ):
+            try:
+                benchmark = StackBenchmark(
+                    concurrency=options["concurrency"],
+                    requests=options["requests"],
+                )
+            except ValueError as error:
+                raise CommandError(error)
+            results = benchmark.run(options["endpoints"])
+
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": settings.DATABASES["default"]["ENGINE"],
+            "results": results,
+        }
+        with open(options["output"], "w") as output:
+            json.dump(report, output, indent=2)
+
+        for result in results:
+            self.stdout.write(
+                f"{result['name']:<15} {result['stack']} "
+                f"{result['requests_per_second']:>8.1f} req/s  "
+                f"p50 {result['p50_ms']:>8.2f} ms  "
+                f"p95 {result['p95_ms']:>8.2f} ms  "
+                f"{result['statuses']}"
+            )
+        self.stdout.write(f"Saved to {options['output']}")
@@ -0,0 +1,94 @@
+import json
+import platform
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from task.benchmark import EndpointBenchmark
+from task.caching import bump_model_version
+from task.management.commands.generate_network import (
+    add_network_arguments,
+    network_options,
+)
+from task.models import Journey
+from task.signals import REFERENCE_MODELS
+from task.synthetic import generate_network
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "Time every task and user endpoint on a synthetic network "
+        "and write p50/p95 latency, query counts and peak memory to JSON. "
+        "Everything runs in a transaction that is rolled back"
+    )
+
+    def add_arguments(self, parser):
+        add_network_arguments(parser)
+        parser.add_argument(
+            "--existing-data",
+            action="store_true",
+            help="Benchmark the data already in the database "
+                 "instead of generating a network",
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument(
+            "--endpoint",
+            action="append",
+            dest="endpoints",
+            help="Only benchmark the endpoint with this name, repeatable",
+        )
+        parser.add_argument(
+            "--output",
+            default="benchmark.json",
+            help="JSON file for the results",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("Repeat must be at least 1")
+
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "repeat": options["repeat"],
+            "network": None,
+        }
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=["testserver"]):
+            with transaction.atomic():
+                if not options["existing_data"]:
+                    network = network_options(options)
+                    started = time.perf_counter()
+                    created = generate_network(**network)
+                    report["network"] = {
+                        "options": network,
+                        "created": created,
+                        "seconds": round(time.perf_counter() - started, 3),
+                    }
+                if not Journey.objects.exists():
+                    raise CommandError("There are no journeys to benchmark")
+
+                benchmark = EndpointBenchmark(repeat=options["repeat"])
+                report["endpoints"] = benchmark.run(options["endpoints"])
+                transaction.set_rollback(True)
+
+        # Responses cached during the run hold rolled back rows
+        for model in REFERENCE_MODELS:
+            bump_model_version(model)
+
+        with open(options["output"], "w") as output:
+            json.dump(report, output, indent=2)
+
+        for result in report["endpoints"]:
+            self.stdout.write(
+                f"{result['name']:<26} {result['status']:>3} "
+                f"p50 {result['p50_ms']:>8.2f} ms  "
+                f"p95 {result['p95_ms']:>8.2f} ms  "
+                f"{result['queries']:>3} queries  "
+                f"{result['peak_memory_kb']:>9.1f} KiB"
+            )
+        self.stdout.write(f"Saved to {options['output']}")
@@ -0,0 +1,164 @@
+import time
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from task.models import (
+    Journey,
+    Order,
+    Route,
+    Station,
+    Ticket,
+    Train,
+    TrainType,
+)
+from task.serializers import (
+    JourneyListSerializer,
+    JourneyListValuesSerializer,
+    OrderListSerializer,
+    OrderListValuesSerializer,
+)
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "Compare rendering of journey and order list pages "
+        "through model serializers and through values() rows. "
+        "Sample data is created in a transaction that is rolled back"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--tickets-per-order", type=int, default=3)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        page_size = options["page_size"]
+        with transaction.atomic():
+            self.create_sample_data(page_size, options["tickets_per_order"])
+
+            journeys = (
+                Journey.objects.prefetch_related(
+                    "train",
+                    "route__source",
+                    "route__destination",
+                )
+                .with_price_trip()
+                .with_tickets_available()
+            )
+            self.compare(
+                "journey list",
+                lambda: JourneyListSerializer(
+                    journeys[:page_size], many=True
+                ).data,
+                lambda: JourneyListValuesSerializer(
+                    JourneyListValuesSerializer.queryset(journeys)[:page_size]
+                ).data,
+                options["repeat"],
+            )
+
+            orders = Order.objects.prefetch_related(
+                "tickets__journey__train__train_type",
+                "tickets__journey__route__source",
+                "tickets__journey__route__destination",
+            )
+            self.compare(
+                "order list",
+                lambda: OrderListSerializer(
+                    orders[:page_size], many=True
+                ).data,
+                lambda: OrderListValuesSerializer(
+                    OrderListValuesSerializer.queryset(orders)[:page_size]
+                ).data,
+                options["repeat"],
+            )
+            transaction.set_rollback(True)
+
+    def create_sample_data(self, count, tickets_per_order):
+        train_type = TrainType.objects.create(type_name="benchmark type")
+        train = Train.objects.create(
+            name="Benchmark train",
+            cargo_num=tickets_per_order,
+            places_in_cargo=1,
+            kilometer_price=1.2,
+            train_type=train_type,
+        )
+        stations = Station.objects.bulk_create(
+            Station(
+                name=f"Benchmark station {number}",
+                latitude=44 + number % 8,
+                longitude=22 + number % 18,
+                service_cost=2,
+            )
+            for number in range(count + 1)
+        )
+        routes = Route.objects.bulk_create(
+            Route(source=source, destination=destination)
+            for source, destination in zip(stations, stations[1:])
+        )
+        Route.objects.filter(
+            id__in=[route.id for route in routes]
+        ).refresh_distance()
+        start = datetime(2024, 1, 1)
+        journeys = Journey.objects.bulk_create(
+            Journey(
+                route=route,
+                train=train,
+                departure_time=start + timedelta(hours=number),
+                arrival_time=start + timedelta(hours=number + 5),
+            )
+            for number, route in enumerate(routes)
+        )
+        user = get_user_model().objects.create_user(
+            "benchmark@benchmark.com", "benchmark"
+        )
+        prices = Journey.objects.filter(
+            id__in=[journey.id for journey in journeys]
+        ).prices()
+        orders = Order.objects.bulk_create(
+            Order(
+                user=user,
+                total_price=round(prices[journey.id] * tickets_per_order, 2),
+            )
+            for journey in journeys
+        )
+        Ticket.objects.bulk_create(
+            Ticket(
+                order=order,
+                journey=journey,
+                cargo_num=cargo_num,
+                place_in_cargo=1,
+                price=prices[journey.id],
+            )
+            for order, journey in zip(orders, journeys)
+            for cargo_num in range(1, tickets_per_order + 1)
+        )
+
+    def compare(self, name, model_path, values_path, repeat):
+        renderer = JSONRenderer()
+        results = []
+        for render in (model_path, values_path):
+            with CaptureQueriesContext(connection) as queries:
+                content = renderer.render(render())
+            started = time.perf_counter()
+            for _ in range(repeat):
+                renderer.render(render())
+            elapsed = (time.perf_counter() - started) / repeat
+            results.append((content, len(queries), elapsed))
+
+        (model_content, model_queries, model_time), (
+            values_content, values_queries, values_time
+        ) = results
+        self.stdout.write(
+            f"{name}: {len(model_content)} bytes, "
+            f"same output: {model_content == values_content}\n"
+            f"  serializer: {model_time * 1000:.2f} ms, "
+            f"{model_queries} queries\n"
+            f"  values:     {values_time * 1000:.2f} ms, "
+            f"{values_queries} queries\n"
+            f"  speedup:    {model_time / values_time:.1f}x"
+        )
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from task.export import EXPORT_FORMATS, order_chunks
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "Write all orders with their tickets as NDJSON, one order "
+        "per line, or as CSV, one ticket per line"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format",
+            choices=list(EXPORT_FORMATS),
+            default="ndjson",
+        )
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="File for the export, - for stdout",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Orders read with one query for their tickets",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("Chunk size must be at least 1")
+        _, export = EXPORT_FORMATS[options["format"]]
+        parts = export(order_chunks(chunk_size=options["chunk_size"]))
+
+        if options["output"] == "-":
+            for part in parts:
+                self.stdout.write(part, ending="")
+            return
+
+        started = time.perf_counter()
+        try:
+            with open(
+                options["output"], "w", newline="", encoding="utf-8"
+            ) as output:
+                output.writelines(parts)
+        except OSError as error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Orders exported to {options['output']} in {elapsed:.1f}s"
+        )
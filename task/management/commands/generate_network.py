@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from task.synthetic import generate_network
+
+
+def add_network_arguments(parser):
+    parser.add_argument("--stations", type=int, default=100)
+    parser.add_argument("--routes", type=int, default=300)
+    parser.add_argument("--journeys-per-day", type=int, default=200)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--trains", type=int, default=50)
+    parser.add_argument(
+        "--fill-rate",
+        type=float,
+        default=0.3,
+        help="Share of the seats of every journey sold in orders",
+    )
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def network_options(options) -> dict:
+    if options["stations"] < 2 or options["routes"] < 1:
+        raise CommandError("At least 2 stations and 1 route are required")
+    if options["trains"] < 1:
+        raise CommandError("At least 1 train is required")
+    if not 0 <= options["fill_rate"] <= 1:
+        raise CommandError("Fill rate must be between 0 and 1")
+    return {
+        name: options[name]
+        for name in (
+            "stations",
+            "routes",
+            "journeys_per_day",
+            "days",
+            "trains",
+            "fill_rate",
+            "users",
+            "seed",
+        )
+    }
+
+
+class Command(BaseCommand):
+    help = "Fill the database with a synthetic network"  # noqa: VNE003
+
+    def add_arguments(self, parser):
+        add_network_arguments(parser)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = generate_network(**network_options(options))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            ", ".join(f"{count} {name}" for name, count in created.items())
+            + f" created in {elapsed:.1f}s"
+        )
@@ -0,0 +1,76 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from task.conflicts import ScheduleConflict
+from task.models import TimetableTemplate
+from task.recurring import generate_journeys
+
+
+def iso_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}, use YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "Expand timetable templates into journeys departing in a window. "
+        "Running it again only writes what the templates changed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--template",
+            type=int,
+            action="append",
+            dest="templates",
+            help="Only generate the template with this id, repeatable",
+        )
+        parser.add_argument(
+            "--from",
+            dest="date_from",
+            help="First departure date, today by default",
+        )
+        parser.add_argument(
+            "--to",
+            dest="date_to",
+            help="Last departure date, the end of the validity by default",
+        )
+
+    def handle(self, *args, **options):
+        date_from = (
+            iso_date(options["date_from"])
+            if options["date_from"]
+            else timezone.now().date()
+        )
+        date_to = options["date_to"] and iso_date(options["date_to"])
+        if date_to and date_to < date_from:
+            raise CommandError("--to must not be before --from")
+
+        templates = TimetableTemplate.objects.all()
+        if options["templates"]:
+            templates = templates.filter(pk__in=options["templates"])
+            missing = set(options["templates"]) - set(
+                templates.values_list("pk", flat=True)
+            )
+            if missing:
+                raise CommandError(
+                    f"Unknown templates {', '.join(map(str, sorted(missing)))}"
+                )
+
+        started = time.perf_counter()
+        try:
+            counts = generate_journeys(templates, date_from, date_to)
+        except ScheduleConflict as error:
+            raise CommandError(f"Nothing generated. {error}")
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            "journeys: "
+            + ", ".join(f"{count} {name}" for name, count in counts.items())
+            + f" in {elapsed:.1f}s"
+        )
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from task.importer import IMPORTERS, RowError, read_rows
+
+FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "Stream stations, trains, routes, journeys or crew assignments "
+        "from a CSV or NDJSON file into the database in batches. "
+        "Foreign keys are given by names, import the kinds in this order"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=list(IMPORTERS))
+        parser.add_argument("path", help="File to import, - for stdin")
+        parser.add_argument(
+            "--format",
+            choices=sorted(set(FORMATS.values())),
+            help="Format of the file, guessed from its extension by default",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--update",
+            action="store_true",
+            help="Update existing rows, they are kept unchanged by default",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("Batch size must be at least 1")
+        data_format = options["format"] or FORMATS.get(
+            os.path.splitext(options["path"])[1].lower()
+        )
+        if data_format is None:
+            raise CommandError("Unknown file format, use --format")
+
+        importer = IMPORTERS[options["kind"]](
+            batch_size=options["batch_size"], update=options["update"]
+        )
+        started = time.perf_counter()
+        try:
+            with self.open(options["path"]) as stream, transaction.atomic():
+                counts = importer.run(read_rows(stream, data_format))
+        except RowError as error:
+            raise CommandError(f"Nothing imported. {error}")
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{options['kind']}: "
+            + ", ".join(f"{count} {name}" for name, count in counts.items())
+            + f" in {elapsed:.1f}s"
+        )
+
+    @staticmethod
+    def open(path):
+        if path == "-":
+            return nullcontext(sys.stdin)
+        try:
+            return open(path, newline="", encoding="utf-8")
+        except OSError as error:
+            raise CommandError(error)
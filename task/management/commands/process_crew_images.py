@@ -0,0 +1,80 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from task.images import process_crew_image
+from task.models import Crew
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "Render the thumbnail and WebP variants of crew images "
+        "uploaded before they were processed, and process again uploads "
+        "left processing by a worker that stopped"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--stale-minutes",
+            type=int,
+            default=settings.CREW_IMAGE_STALE_MINUTES,
+            help="Uploads processing for longer are processed again",
+        )
+
+    def handle(self, *args, **options):
+        processed = failed = 0
+        # Images saved before uploads were processed have no status
+        crew = Crew.objects.filter(image_status="").exclude(image="").exclude(
+            image__isnull=True
+        )
+        for member in crew.iterator():
+            # The stored image is processed like a new upload
+            member.image_upload = member.image.name
+            member.image_uploaded_at = timezone.now()
+            member.image_status = Crew.ImageStatus.PROCESSING
+            member.save(
+                update_fields=[
+                    "image_upload", "image_uploaded_at", "image_status"
+                ]
+            )
+            if self.process(member):
+                processed += 1
+            else:
+                failed += 1
+
+        # Uploads lost by a worker that stopped, uploads of rows
+        # from before image_uploaded_at have no time
+        cutoff = timezone.now() - timedelta(minutes=options["stale_minutes"])
+        stale = Crew.objects.filter(
+            Q(image_uploaded_at__lte=cutoff)
+            | Q(image_uploaded_at__isnull=True),
+            image_status=Crew.ImageStatus.PROCESSING,
+        ).exclude(image_upload="")
+        for member in stale.iterator():
+            if self.process(member):
+                processed += 1
+            else:
+                failed += 1
+
+        self.stdout.write(f"{processed} images processed, {failed} failed")
+
+    @staticmethod
+    def process(member) -> bool:
+        """Whether the upload of the crew member is ready"""
+        try:
+            process_crew_image(member.id, member.image_upload)
+        except OSError:
+            # The upload is gone or unreadable, it will not get better
+            logger.exception("Crew %s image processing failed", member.id)
+            Crew.objects.filter(
+                pk=member.id, image_upload=member.image_upload
+            ).update(image_status=Crew.ImageStatus.FAILED, image_upload="")
+            return False
+        member.refresh_from_db(fields=["image_status"])
+        return member.image_status == Crew.ImageStatus.READY
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from task.models import Journey
+from task.seats import release_expired_holds, seat_repairs
+
+
+class Command(BaseCommand):
+    help = "Repair journey seat counters and seat maps"  # noqa: VNE003
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report journeys with wrong counters",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+        )
+
+    def handle(self, *args, **options):
+        if not options["dry_run"]:
+            release_expired_holds()
+
+        journeys = Journey.objects.select_related("train").only(
+            "id",
+            "tickets_sold",
+            "tickets_held",
+            "seat_map",
+            "train__cargo_num",
+            "train__places_in_cargo",
+        ).order_by("id")
+
+        repaired = 0
+        batch = []
+        with transaction.atomic():
+            for journey in journeys.iterator(chunk_size=options["batch_size"]):
+                batch.append(journey)
+                if len(batch) >= options["batch_size"]:
+                    repaired += self.repair(batch, options["dry_run"])
+                    batch = []
+            repaired += self.repair(batch, options["dry_run"])
+
+        action = "Found" if options["dry_run"] else "Repaired"
+        self.stdout.write(f"{action} {repaired} journeys")
+
+    def repair(self, journeys, dry_run) -> int:
+        drifted = []
+        for journey, tickets_sold, tickets_held, seat_map in seat_repairs(
+            journeys
+        ):
+            self.stdout.write(
+                f"Journey {journey.id}: tickets_sold "
+                f"{journey.tickets_sold} -> {tickets_sold}, tickets_held "
+                f"{journey.tickets_held} -> {tickets_held}"
+            )
+            journey.tickets_sold = tickets_sold
+            journey.tickets_held = tickets_held
+            journey.seat_map = seat_map
+            drifted.append(journey)
+
+        if drifted and not dry_run:
+            Journey.objects.bulk_update(
+                drifted, ["tickets_sold", "tickets_held", "seat_map"]
+            )
+        return len(drifted)
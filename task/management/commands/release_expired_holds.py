@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from task.seats import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Return seats of expired holds back to sale"  # noqa: VNE003
+
+    def handle(self, *args, **options):
+        released = release_expired_holds()
+        self.stdout.write(f"Released {released} expired holds")
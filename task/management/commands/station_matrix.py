@@ -0,0 +1,81 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from task.distance_matrix import distance_matrix, station_matrices
+from task.models import Station, Train, station_distance
+
+
+class Command(BaseCommand):
+    help = "Build distance and fare matrices for stations"  # noqa: VNE003
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--train",
+            type=int,
+            help="Id of the train used to calculate the fare matrix",
+        )
+        parser.add_argument(
+            "--output",
+            help="Save matrices to this .npz file",
+        )
+        parser.add_argument(
+            "--benchmark",
+            type=int,
+            metavar="STATIONS",
+            help="Compare with the scalar station_distance loop "
+                 "on this number of random stations instead",
+        )
+
+    def handle(self, *args, **options):
+        if options["benchmark"]:
+            return self.benchmark(options["benchmark"])
+
+        train = None
+        if options["train"]:
+            try:
+                train = Train.objects.get(pk=options["train"])
+            except Train.DoesNotExist:
+                raise CommandError(f"Train {options['train']} does not exist")
+
+        started = time.perf_counter()
+        matrices = station_matrices(Station.objects.all(), train)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"Built matrices for {len(matrices['stations'])} stations "
+            f"in {elapsed:.3f}s"
+        )
+
+        if options["output"]:
+            np.savez_compressed(
+                options["output"],
+                **{
+                    name: np.asarray(matrix)
+                    for name, matrix in matrices.items()
+                }
+            )
+            self.stdout.write(f"Saved to {options['output']}")
+
+    def benchmark(self, count):
+        rng = np.random.default_rng(0)
+        latitudes = rng.uniform(44.0, 52.0, count)
+        longitudes = rng.uniform(22.0, 40.0, count)
+
+        started = time.perf_counter()
+        distance_matrix(latitudes, longitudes)
+        vectorized = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for lat1, lon1 in zip(latitudes, longitudes):
+            for lat2, lon2 in zip(latitudes, longitudes):
+                station_distance(lat1, lon1, lat2, lon2)
+        scalar = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{count} stations, {count * count} pairs\n"
+            f"scalar loop: {scalar:.3f}s\n"
+            f"vectorized:  {vectorized:.3f}s\n"
+            f"speedup:     {scalar / vectorized:.1f}x"
+        )
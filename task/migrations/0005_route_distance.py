@@ -0,0 +1,45 @@
+# Generated by Django 4.1 on 2026-10-18 04:17
+
+from math import atan2, cos, radians, sin, sqrt
+
+from django.db import migrations, models
+
+
+def station_distance(lat1, lon1, lat2, lon2):
+    # Copy of task.models.station_distance at the time of this migration
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    corner = (
+        sin((lat2 - lat1) / 2) ** 2
+        + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    )
+    distance = 6371.0 * 2 * atan2(sqrt(corner), sqrt(1 - corner))
+    return distance * 100 // 1 / 100
+
+
+def fill_route_distance(apps, schema_editor):
+    Route = apps.get_model("task", "Route")
+    routes = list(Route.objects.select_related("source", "destination"))
+    for route in routes:
+        route.distance = station_distance(
+            route.source.latitude,
+            route.source.longitude,
+            route.destination.latitude,
+            route.destination.longitude,
+        )
+    Route.objects.bulk_update(routes, ["distance"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0004_alter_journey_crew'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='distance',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_route_distance, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.1 on 2026-10-18 04:31
+
+from django.db import migrations, models
+
+
+def fill_seat_map(apps, schema_editor):
+    # One bit per seat numbered by cargo and place from 1, the layout
+    # of task.seats.SeatMap at the time of this migration
+    Journey = apps.get_model("task", "Journey")
+    Ticket = apps.get_model("task", "Ticket")
+    journeys = {
+        journey.id: journey
+        for journey in Journey.objects.select_related("train")
+    }
+    seat_maps = {
+        journey.id: bytearray(
+            (journey.train.cargo_num * journey.train.places_in_cargo + 7)
+            // 8
+        )
+        for journey in journeys.values()
+    }
+    for journey_id, cargo_num, place_in_cargo in Ticket.objects.values_list(
+        "journey_id", "cargo_num", "place_in_cargo"
+    ):
+        train = journeys[journey_id].train
+        if not (
+            1 <= cargo_num <= train.cargo_num
+            and 1 <= place_in_cargo <= train.places_in_cargo
+        ):
+            continue
+        index = (cargo_num - 1) * train.places_in_cargo + place_in_cargo - 1
+        seat_maps[journey_id][index >> 3] |= 1 << (index & 7)
+
+    for journey_id, seat_map in seat_maps.items():
+        journeys[journey_id].seat_map = bytes(seat_map)
+    Journey.objects.bulk_update(
+        journeys.values(), ["seat_map"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0006_journey_tickets_sold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='journey',
+            name='seat_map',
+            field=models.BinaryField(default=b'', editable=False),
+        ),
+        migrations.RunPython(fill_seat_map, migrations.RunPython.noop),
+    ]
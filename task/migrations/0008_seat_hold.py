@@ -0,0 +1,48 @@
+# Generated by Django 4.1 on 2026-10-18 04:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('task', '0007_journey_seat_map'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='journey',
+            name='tickets_held',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='SeatHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('journey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='task.journey')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_holds', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='HeldSeat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cargo_num', models.IntegerField()),
+                ('place_in_cargo', models.IntegerField()),
+                ('hold', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seats', to='task.seathold')),
+                ('journey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='held_seats', to='task.journey')),
+            ],
+            options={
+                'ordering': ['cargo_num', 'place_in_cargo'],
+                'unique_together': {('journey', 'cargo_num', 'place_in_cargo')},
+            },
+        ),
+    ]
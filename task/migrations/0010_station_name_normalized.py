@@ -0,0 +1,37 @@
+# Generated by Django 4.1 on 2026-10-18 04:31
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalize_name(name):
+    # Copy of task.models.normalize_name as of this migration
+    decomposed = unicodedata.normalize("NFKD", name)
+    return "".join(
+        char for char in decomposed if not unicodedata.combining(char)
+    ).casefold()
+
+
+def fill_name_normalized(apps, schema_editor):
+    Station = apps.get_model("task", "Station")
+    stations = list(Station.objects.only("id", "name"))
+    for station in stations:
+        station.name_normalized = normalize_name(station.name)
+    Station.objects.bulk_update(stations, ["name_normalized"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0009_journey_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='station',
+            name='name_normalized',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_name_normalized, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.1 on 2026-10-18 05:10
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Floor, Round
+
+
+def fill_prices(apps, schema_editor):
+    """Tickets sold before prices were stored get the current tariff"""
+    Journey = apps.get_model("task", "Journey")
+    Order = apps.get_model("task", "Order")
+    Ticket = apps.get_model("task", "Ticket")
+    price_trip = (
+        Journey.objects.filter(pk=OuterRef("journey_id"))
+        .annotate(
+            price_trip=Floor(
+                (
+                    F("route__distance") * F("train__kilometer_price")
+                    + F("route__source__service_cost")
+                    + F("route__destination__service_cost")
+                ) * 100
+            ) / 100.0
+        )
+        .values("price_trip")
+    )
+    Ticket.objects.update(price=Subquery(price_trip))
+
+    totals = (
+        Ticket.objects.filter(order=OuterRef("pk"))
+        .order_by()
+        .values("order")
+        .annotate(total=Round(Sum("price"), 2))
+        .values("total")
+    )
+    Order.objects.update(total_price=Coalesce(Subquery(totals), 0.0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0011_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_price',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='price',
+            field=models.FloatField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1 on 2026-10-18 05:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0012_ticket_price_order_total'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='journey',
+            index=models.Index(fields=['train', 'departure_time'], name='journey_train_departure_idx'),
+        ),
+    ]
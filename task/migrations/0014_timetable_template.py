@@ -0,0 +1,37 @@
+# Generated by Django 4.1 on 2026-10-18 05:32
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0013_journey_train_departure_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimetableTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('departure_time', models.TimeField()),
+                ('duration', models.DurationField()),
+                ('weekdays', models.PositiveSmallIntegerField(default=127, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(127)])),
+                ('valid_from', models.DateField()),
+                ('valid_until', models.DateField()),
+                ('crew', models.ManyToManyField(blank=True, related_name='timetable_templates', to='task.crew')),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='task.route')),
+                ('train', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='task.train')),
+            ],
+            options={
+                'ordering': ['departure_time', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='journey',
+            name='template',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='journeys', to='task.timetabletemplate'),
+        ),
+    ]
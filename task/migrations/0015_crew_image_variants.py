@@ -0,0 +1,38 @@
+# Generated by Django 4.1 on 2026-10-18 05:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0014_timetable_template'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crew',
+            name='image_status',
+            field=models.CharField(blank=True, choices=[('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='crew',
+            name='image_upload',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='crew',
+            name='image_webp',
+            field=models.ImageField(editable=False, null=True, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='crew',
+            name='thumbnail',
+            field=models.ImageField(editable=False, null=True, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='crew',
+            name='thumbnail_webp',
+            field=models.ImageField(editable=False, null=True, upload_to=''),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-18 06:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0015_crew_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crew',
+            name='image_uploaded_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+    ]
@@ -1,13 +1,26 @@
 import os
+import unicodedata
 import uuid
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Floor, Round
 from math import radians, sin, cos, sqrt, atan2
 from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.conf import settings
+from django.dispatch import Signal
+from django.utils import timezone
 from django.utils.text import slugify
 
 
+EARTH_RADIUS = 6371.0
+
+# Sent with sender=model and fields=set of field names after
+# bulk writes that do not send post_save signals
+bulk_changed = Signal()
+
+
 def station_distance(
         lat1: float,
         lon1: float,
@@ -19,11 +32,19 @@ def station_distance(
     corner_lat = sin((lat2 - lat1) / 2) ** 2
     corner_lon = cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
     corner = corner_lat + corner_lon
-    distance = 6371.0 * 2 * atan2(sqrt(corner), sqrt(1 - corner))
+    distance = EARTH_RADIUS * 2 * atan2(sqrt(corner), sqrt(1 - corner))
 
     return distance * 100 // 1 / 100
 
 
+def normalize_name(name: str) -> str:
+    """Lowercase name without accents used for station search"""
+    decomposed = unicodedata.normalize("NFKD", name)
+    return "".join(
+        char for char in decomposed if not unicodedata.combining(char)
+    ).casefold()
+
+
 def crew_image_file_path(instance, filename):
     _, extension = os.path.split(filename)
 
@@ -33,12 +54,32 @@ def crew_image_file_path(instance, filename):
 
 
 class Crew(models.Model):
+    class ImageStatus(models.TextChoices):
+        PROCESSING = "processing"
+        READY = "ready"
+        FAILED = "failed"
+
     first_name = models.CharField(max_length=65)
     last_name = models.CharField(max_length=65)
     image = models.ImageField(
         null=True,
         upload_to=crew_image_file_path
     )
+    # Variants of the processed upload, see task.images
+    image_webp = models.ImageField(null=True, editable=False)
+    thumbnail = models.ImageField(null=True, editable=False)
+    thumbnail_webp = models.ImageField(null=True, editable=False)
+    image_status = models.CharField(
+        max_length=10,
+        choices=ImageStatus.choices,
+        blank=True,
+        editable=False,
+    )
+    # Original waiting for processing, newer uploads replace it
+    image_upload = models.CharField(
+        max_length=255, blank=True, editable=False
+    )
+    image_uploaded_at = models.DateTimeField(null=True, editable=False)
 
     @property
     def full_name(self):
@@ -48,14 +89,50 @@ class Crew(models.Model):
         return f"{self.first_name} {self.last_name}"
 
 
+class BulkChangeQuerySet(models.QuerySet):
+    """QuerySet that reports update, bulk_create and bulk_update
+    through the bulk_changed signal"""
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        bulk_changed.send(sender=self.model, fields=set(kwargs))
+        return rows
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):  # noqa: VNE002
+        created = super().bulk_create(objs, *args, **kwargs)
+        bulk_changed.send(sender=self.model, fields=None)
+        return created
+
+    bulk_create.alters_data = True
+
+    def bulk_update(self, objs, fields, *args, **kwargs):  # noqa: VNE002
+        objs = list(objs)  # noqa: VNE002
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        bulk_changed.send(
+            sender=self.model,
+            fields=set(fields),
+            pks=[obj.pk for obj in objs],
+        )
+        return rows
+
+    bulk_update.alters_data = True
+
+
 class TrainType(models.Model):
     type_name = models.CharField(max_length=65, unique=True)
 
+    objects = BulkChangeQuerySet.as_manager()
+
     def __str__(self):
         return self.type_name
 
 
 class Train(models.Model):
+    # Seat maps of the journeys are indexed by them
+    LAYOUT_FIELDS = {"cargo_num", "places_in_cargo"}
+
     name = models.CharField(max_length=255)
     cargo_num = models.IntegerField()
     places_in_cargo = models.IntegerField()
@@ -66,9 +143,21 @@ class Train(models.Model):
         related_name="trains"
     )
 
+    objects = BulkChangeQuerySet.as_manager()
+
     class Meta:
         ordering = ["name"]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_layout = instance.layout
+        return instance
+
+    @property
+    def layout(self) -> tuple:
+        return self.cargo_num, self.places_in_cargo
+
     @property
     def capacity(self) -> int:
         return self.cargo_num * self.places_in_cargo
@@ -77,19 +166,122 @@ class Train(models.Model):
         return f"Train:{self.name} all places:{self.capacity}"
 
 
+class StationQuerySet(BulkChangeQuerySet):
+    COORDINATE_FIELDS = {"latitude", "longitude"}
+
+    def update(self, **kwargs):
+        """Bulk update that keeps distances of related routes
+        and normalized names in sync"""
+        if isinstance(kwargs.get("name"), str):
+            kwargs["name_normalized"] = normalize_name(kwargs["name"])
+
+        if not self.COORDINATE_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+
+        with transaction.atomic(using=self.db):
+            station_ids = list(self.values_list("pk", flat=True))
+            rows = super().update(**kwargs)
+            Route.objects.with_stations(station_ids).refresh_distance()
+        return rows
+
+    update.alters_data = True
+
+    def bulk_create(self, stations, *args, **kwargs):
+        stations = list(stations)
+        for station in stations:
+            station.name_normalized = normalize_name(station.name)
+        return super().bulk_create(stations, *args, **kwargs)
+
+    bulk_create.alters_data = True
+
+    def bulk_update(self, stations, fields, batch_size=None):
+        stations = list(stations)
+        if "name" in fields:
+            for station in stations:
+                station.name_normalized = normalize_name(station.name)
+            fields = [*fields, "name_normalized"]
+
+        if not self.COORDINATE_FIELDS & set(fields):
+            return super().bulk_update(stations, fields, batch_size)
+
+        with transaction.atomic(using=self.db):
+            rows = super().bulk_update(stations, fields, batch_size)
+            Route.objects.with_stations(
+                [station.pk for station in stations]
+            ).refresh_distance()
+        return rows
+
+    bulk_update.alters_data = True
+
+    def name_startswith(self, prefix: str):
+        """Index range scan over normalized names starting with prefix"""
+        prefix = normalize_name(prefix)
+        return self.filter(
+            name_normalized__gte=prefix,
+            name_normalized__lt=prefix + chr(0x10FFFF),
+        )
+
+
 class Station(models.Model):
     name = models.CharField(max_length=255)
+    name_normalized = models.CharField(
+        max_length=255, db_index=True, editable=False, default=""
+    )
     latitude = models.FloatField()
     longitude = models.FloatField()
     service_cost = models.FloatField()
 
+    objects = StationQuerySet.as_manager()
+
     class Meta:
         ordering = ["name"]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_coordinates = instance.coordinates
+        return instance
+
+    @property
+    def coordinates(self) -> tuple:
+        return self.latitude, self.longitude
+
+    def save(self, *args, **kwargs):
+        coordinates_changed = (
+            getattr(self, "_loaded_coordinates", None) != self.coordinates
+        )
+        self.name_normalized = normalize_name(self.name)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "name" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "name_normalized"}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if coordinates_changed:
+                Route.objects.with_stations([self.pk]).refresh_distance()
+        self._loaded_coordinates = self.coordinates
+
     def __str__(self):
         return self.name
 
 
+class RouteQuerySet(BulkChangeQuerySet):
+    def with_stations(self, station_ids):
+        """Routes that start or end at any of the given stations"""
+        return self.filter(
+            models.Q(source_id__in=station_ids)
+            | models.Q(destination_id__in=station_ids)
+        )
+
+    def refresh_distance(self, batch_size=500) -> int:
+        """Recalculate the stored distance of every route in the queryset"""
+        routes = list(self.select_related("source", "destination"))
+        for route in routes:
+            route.distance = route.calculate_distance()
+        return self.model.objects.bulk_update(
+            routes, ["distance"], batch_size=batch_size
+        )
+
+
 class Route(models.Model):
     source = models.ForeignKey(
         Station,
@@ -101,12 +293,26 @@ class Route(models.Model):
         on_delete=models.CASCADE,
         related_name="routers_destination"
     )
+    distance = models.FloatField(default=0, editable=False)
+
+    objects = RouteQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["source", "destination"],
+                name="route_source_destination_idx",
+            ),
+        ]
 
     def __str__(self):
-        return f"Source:{self.source.name} destination:{self.destination.name}"
+        return self.label(self.source.name, self.destination.name)
 
-    @property
-    def distance(self) -> float:
+    @staticmethod
+    def label(source_name, destination_name) -> str:
+        return f"Source:{source_name} destination:{destination_name}"
+
+    def calculate_distance(self) -> float:
         return station_distance(
             self.source.latitude,
             self.source.longitude,
@@ -114,6 +320,106 @@ class Route(models.Model):
             self.destination.longitude
         )
 
+    def save(self, *args, **kwargs):
+        self.distance = self.calculate_distance()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "distance" not in update_fields:
+            kwargs["update_fields"] = {*update_fields, "distance"}
+        super().save(*args, **kwargs)
+
+
+def price_trip_expression(journey=""):
+    """Price of the trip calculated by the database, rounded down
+    to cents the same way as Journey.price_trip.
+    journey is the lookup prefix of the journey, e.g. journey__"""
+    return Floor(
+        (
+            F(f"{journey}route__distance")
+            * F(f"{journey}train__kilometer_price")
+            + F(f"{journey}route__source__service_cost")
+            + F(f"{journey}route__destination__service_cost")
+        ) * 100
+    ) / 100.0
+
+
+class JourneyQuerySet(BulkChangeQuerySet):
+    def with_price_trip(self):
+        """Annotate price_trip calculated by the database"""
+        return self.annotate(price_trip=price_trip_expression())
+
+    def prices(self) -> dict:
+        """Current price_trip of every journey in the queryset by id"""
+        return dict(self.with_price_trip().values_list("id", "price_trip"))
+
+    def with_tickets_available(self):
+        """Annotate the number of places neither sold nor held. Seats
+        of expired holds count as available before they are released"""
+        expired = (
+            HeldSeat.objects.filter(
+                journey=OuterRef("pk"), hold__expires_at__lte=timezone.now()
+            )
+            .order_by()
+            .values("journey")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        return self.annotate(
+            tickets_available=(
+                F("train__cargo_num")
+                * F("train__places_in_cargo")
+                - F("tickets_sold")
+                - F("tickets_held")
+                + Coalesce(Subquery(expired), 0)
+            )
+        )
+
+
+class TimetableTemplate(models.Model):
+    """Service departing at the same time on the weekdays of the mask,
+    expanded into journeys for its validity period"""
+    # Bit of every weekday in the mask, Monday is the lowest
+    EVERY_DAY = 0b1111111
+
+    route = models.ForeignKey(Route, on_delete=models.CASCADE)
+    train = models.ForeignKey(Train, on_delete=models.CASCADE)
+    departure_time = models.TimeField()
+    duration = models.DurationField()
+    weekdays = models.PositiveSmallIntegerField(
+        default=EVERY_DAY,
+        validators=[MinValueValidator(1), MaxValueValidator(EVERY_DAY)],
+    )
+    valid_from = models.DateField()
+    valid_until = models.DateField()
+    crew = models.ManyToManyField(
+        Crew, related_name="timetable_templates", blank=True
+    )
+
+    class Meta:
+        ordering = ["departure_time", "id"]
+
+    def __str__(self):
+        return (
+            f"Departure:{self.departure_time} "
+            f"from {self.valid_from} until {self.valid_until}"
+        )
+
+    def clean(self):
+        self.validate_period(
+            self.valid_from, self.valid_until, self.duration, ValidationError
+        )
+
+    @staticmethod
+    def validate_period(valid_from, valid_until, duration, error_to_raise):
+        if valid_from and valid_until and valid_until < valid_from:
+            raise error_to_raise(
+                {"valid_until": "Must not be before valid_from."}
+            )
+        if duration is not None and duration.total_seconds() <= 0:
+            raise error_to_raise({"duration": "Must be positive."})
+
+    def runs_on(self, day) -> bool:
+        return bool(self.weekdays >> day.weekday() & 1)
+
 
 class Journey(models.Model):
     departure_time = models.DateTimeField()
@@ -121,9 +427,36 @@ class Journey(models.Model):
     route = models.ForeignKey(Route, on_delete=models.CASCADE)
     train = models.ForeignKey(Train, on_delete=models.CASCADE)
     crew = models.ManyToManyField(Crew, related_name="journeys")
+    template = models.ForeignKey(
+        TimetableTemplate,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="journeys",
+    )
+    tickets_sold = models.PositiveIntegerField(default=0, editable=False)
+    tickets_held = models.PositiveIntegerField(default=0, editable=False)
+    seat_map = models.BinaryField(default=b"", editable=False)
+
+    objects = JourneyQuerySet.as_manager()
 
     class Meta:
         ordering = ["-departure_time"]
+        indexes = [
+            models.Index(
+                fields=["departure_time", "id"],
+                name="journey_departure_idx",
+            ),
+            models.Index(
+                fields=["route", "departure_time"],
+                name="journey_route_departure_idx",
+            ),
+            models.Index(
+                fields=["train", "departure_time"],
+                name="journey_train_departure_idx",
+            ),
+        ]
 
     def __str__(self):
         return (
@@ -133,6 +466,10 @@ class Journey(models.Model):
 
     @property
     def price_trip(self) -> float:
+        annotated_price = getattr(self, "_price_trip", None)
+        if annotated_price is not None:
+            return annotated_price
+
         price_distance = self.route.distance * self.train.kilometer_price
         return (
             price_distance
@@ -140,12 +477,33 @@ class Journey(models.Model):
             + self.route.destination.service_cost
         ) * 100 // 1 / 100
 
+    @price_trip.setter
+    def price_trip(self, value: float) -> None:
+        self._price_trip = value
+
+
+class OrderQuerySet(models.QuerySet):
+    def refresh_total(self) -> int:
+        """Recalculate the stored total of every order in the queryset
+        from the prices of its tickets"""
+        totals = (
+            Ticket.objects.filter(order_id=OuterRef("pk"))
+            .order_by()
+            .values("order_id")
+            .annotate(total=Round(Sum("price"), 2))
+            .values("total")
+        )
+        return self.update(total_price=Coalesce(Subquery(totals), 0.0))
+
 
 class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE
     )
+    total_price = models.FloatField(default=0, editable=False)
+
+    objects = OrderQuerySet.as_manager()
 
     def __str__(self):
         return str(self.created_at)
@@ -154,6 +512,43 @@ class Order(models.Model):
         ordering = ["-created_at"]
 
 
+class SeatHold(models.Model):
+    journey = models.ForeignKey(
+        Journey, on_delete=models.CASCADE, related_name="holds"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="seat_holds"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{str(self.journey)} held until:{self.expires_at}"
+
+
+class HeldSeat(models.Model):
+    hold = models.ForeignKey(
+        SeatHold, on_delete=models.CASCADE, related_name="seats"
+    )
+    journey = models.ForeignKey(
+        Journey, on_delete=models.CASCADE, related_name="held_seats"
+    )
+    cargo_num = models.IntegerField()
+    place_in_cargo = models.IntegerField()
+
+    class Meta:
+        unique_together = ("journey", "cargo_num", "place_in_cargo")
+        ordering = ["cargo_num", "place_in_cargo"]
+
+    def __str__(self):
+        return f"row: {self.cargo_num}, seat: {self.place_in_cargo}"
+
+
 class Ticket(models.Model):
     journey = models.ForeignKey(
         Journey, on_delete=models.CASCADE, related_name="tickets"
@@ -163,6 +558,17 @@ class Ticket(models.Model):
     )
     cargo_num = models.IntegerField()
     place_in_cargo = models.IntegerField()
+    price = models.FloatField(editable=False)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_seat = instance.seat
+        return instance
+
+    @property
+    def seat(self) -> tuple:
+        return self.journey_id, self.cargo_num, self.place_in_cargo
 
     @staticmethod
     def validate_ticket(cargo_num, place_in_cargo, train, error_to_raise):
@@ -196,6 +602,8 @@ class Ticket(models.Model):
         using=None,
         update_fields=None,
     ):
+        if self.price is None and self.journey_id is not None:
+            self.price = self.journey.price_trip
         self.full_clean()
         return super(Ticket, self).save(
             force_insert, force_update, using, update_fields
@@ -210,3 +618,26 @@ class Ticket(models.Model):
     class Meta:
         unique_together = ("journey", "cargo_num", "place_in_cargo")
         ordering = ["cargo_num", "place_in_cargo"]
+
+
+class DataVersion(models.Model):
+    """Counter bumped on every change of the data behind a process cache,
+    so each worker can detect changes made by the others"""
+    key = models.CharField(max_length=65, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key}:{self.version}"
+
+    @classmethod
+    def bump(cls, key: str) -> None:
+        if not cls.objects.filter(key=key).update(version=F("version") + 1):
+            cls.objects.get_or_create(key=key, defaults={"version": 1})
+
+    @classmethod
+    def current(cls, key: str) -> int:
+        return (
+            cls.objects.filter(key=key)
+            .values_list("version", flat=True)
+            .first()
+        ) or 0
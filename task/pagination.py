@@ -0,0 +1,234 @@
+import base64
+import json
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Pages ordered by a descending datetime field with id as tie breaker.
+    Every page is a range scan after the cursor, no COUNT and no OFFSET.
+    Views with ordering_fields reject ?ordering= in this mode"""
+    cursor_query_param = "cursor"
+    ordering_param = "ordering"
+    invalid_cursor_message = "Invalid cursor"
+    ordering_message = (
+        "Cursor pages are always ordered by {field}, "
+        "ordering can not be combined with them."
+    )
+
+    def __init__(self, field, page_size, page_size_query_param, max_page_size):
+        self.field = field
+        self.page_size = page_size
+        self.page_size_query_param = page_size_query_param
+        self.max_page_size = max_page_size
+
+    @classmethod
+    def requested(cls, request) -> bool:
+        return (
+            cls.cursor_query_param in request.query_params
+            or request.query_params.get("pagination") == cls.cursor_query_param
+        )
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, instance, reverse: bool) -> str:
+        if isinstance(instance, dict):
+            value, pk = instance[self.field], instance["id"]
+        else:
+            value, pk = getattr(instance, self.field), instance.id
+        position = {
+            "value": value.isoformat(),
+            "id": pk,
+            "reverse": reverse,
+        }
+        encoded = base64.urlsafe_b64encode(json.dumps(position).encode())
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded.decode()
+        )
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            value = parse_datetime(position["value"])
+            if value is None:
+                raise ValueError
+            return value, int(position["id"]), bool(position["reverse"])
+        except (TypeError, KeyError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, page_size, position = self._page_queryset(
+            queryset, request, view
+        )
+        return self._page(
+            list(queryset[:page_size + 1]), page_size, position
+        )
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset reading the page with the async ORM"""
+        queryset, page_size, position = self._page_queryset(
+            queryset, request, view
+        )
+        return self._page(
+            [row async for row in queryset[:page_size + 1]],
+            page_size,
+            position,
+        )
+
+    def _page_queryset(self, queryset, request, view):
+        if getattr(view, "ordering_fields", None) and (
+            request.query_params.get(self.ordering_param)
+        ):
+            raise ValidationError(
+                {
+                    self.ordering_param: self.ordering_message.format(
+                        field=f"-{self.field}"
+                    )
+                }
+            )
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), "page"
+        )
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        reverse = bool(position and position[2])
+
+        if position is not None:
+            value, pk, _ = position
+            if reverse:
+                queryset = queryset.filter(
+                    Q(**{f"{self.field}__gt": value})
+                    | Q(**{self.field: value, "id__lt": pk})
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(**{f"{self.field}__lt": value})
+                    | Q(**{self.field: value, "id__gt": pk})
+                )
+
+        if reverse:
+            queryset = queryset.order_by(self.field, "-id")
+        else:
+            queryset = queryset.order_by(f"-{self.field}", "id")
+        return queryset, page_size, position
+
+    def _page(self, results, page_size, position) -> list:
+        reverse = bool(position and position[2])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        has_next = has_more if not reverse else position is not None
+        has_previous = position is not None if not reverse else has_more
+
+        self.next = (
+            self.encode_cursor(results[-1], reverse=False)
+            if has_next and results else None
+        )
+        self.previous = (
+            self.encode_cursor(results[0], reverse=True)
+            if has_previous and results else None
+        )
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.next,
+                "previous": self.previous,
+                "results": data,
+            }
+        )
+
+
+class KeysetSelectablePagination(PageNumberPagination):
+    """Page number pagination that switches to keyset pagination
+    on ?pagination=cursor or when a cursor is given"""
+    keyset_field = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self._requested_keyset(request)
+        if self.keyset is not None:
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset counting and reading the page
+        with the async ORM"""
+        self.keyset = self._requested_keyset(request)
+        if self.keyset is not None:
+            return await self.keyset.apaginate_queryset(
+                queryset, request, view
+            )
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Fill the cached count, so the paginator runs no query itself
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(
+                self.invalid_page_message.format(
+                    page_number=page_number, message=str(exc)
+                )
+            )
+        self.page.object_list = [row async for row in self.page.object_list]
+        self.request = request
+        return list(self.page)
+
+    def _requested_keyset(self, request):
+        if self.keyset_field and KeysetPagination.requested(request):
+            return KeysetPagination(
+                self.keyset_field,
+                self.page_size,
+                self.page_size_query_param,
+                self.max_page_size,
+            )
+        return None
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": "pagination",
+                "required": False,
+                "in": "query",
+                "description": (
+                    "Use cursor for keyset pagination, pages are ordered "
+                    f"by -{self.keyset_field} and id"
+                ),
+                "schema": {"type": "string", "enum": ["cursor"]},
+            },
+            {
+                "name": KeysetPagination.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Keyset pagination cursor value",
+                "schema": {"type": "string"},
+            },
+        ]
@@ -0,0 +1,264 @@
+import heapq
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from task.models import Journey, Station, station_distance
+
+
+OPTIMIZE_CHOICES = ("arrival", "transfers", "price")
+
+
+class Timetable:
+    """Journeys packed in flat arrays and grouped by source station
+    with departures sorted, so the next trains are found by bisection"""
+
+    def __init__(self, journeys, stations):
+        self.journey_ids = array("q")
+        self.sources = array("q")
+        self.destinations = array("q")
+        self.departures = array("d")
+        self.arrivals = array("d")
+        self.prices = array("d")
+        self.tzinfo = None
+        self.stations = {
+            station_id: (latitude, longitude)
+            for station_id, latitude, longitude in stations
+        }
+
+        max_speed = 0.0
+        min_kilometer_price = None
+        rows = sorted(journeys, key=lambda row: row[3])
+        for (
+            journey_id,
+            source_id,
+            destination_id,
+            departure_time,
+            arrival_time,
+            price_trip,
+            distance,
+            kilometer_price,
+        ) in rows:
+            self.tzinfo = departure_time.tzinfo
+            departure = departure_time.timestamp()
+            arrival = arrival_time.timestamp()
+            if arrival <= departure:
+                continue
+
+            self.journey_ids.append(journey_id)
+            self.sources.append(source_id)
+            self.destinations.append(destination_id)
+            self.departures.append(departure)
+            self.arrivals.append(arrival)
+            self.prices.append(price_trip)
+            max_speed = max(max_speed, distance / (arrival - departure))
+            if min_kilometer_price is None:
+                min_kilometer_price = kilometer_price
+            min_kilometer_price = min(min_kilometer_price, kilometer_price)
+
+        self.max_speed = max_speed
+        self.min_kilometer_price = max(min_kilometer_price or 0.0, 0.0)
+
+        self.by_source = {}
+        for index, source_id in enumerate(self.sources):
+            departures, indexes = self.by_source.setdefault(
+                source_id, (array("d"), array("q"))
+            )
+            departures.append(self.departures[index])
+            indexes.append(index)
+
+    @classmethod
+    def from_db(cls, departure_from=None, departure_to=None) -> "Timetable":
+        journeys = Journey.objects.with_price_trip()
+        if departure_from is not None:
+            journeys = journeys.filter(departure_time__gte=departure_from)
+        if departure_to is not None:
+            journeys = journeys.filter(departure_time__lt=departure_to)
+
+        return cls(
+            journeys.order_by().values_list(
+                "id",
+                "route__source_id",
+                "route__destination_id",
+                "departure_time",
+                "arrival_time",
+                "price_trip",
+                "route__distance",
+                "train__kilometer_price",
+            ),
+            Station.objects.order_by().values_list(
+                "id", "latitude", "longitude"
+            ),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used by the arrays and indexes"""
+        arrays = [
+            self.journey_ids,
+            self.sources,
+            self.destinations,
+            self.departures,
+            self.arrivals,
+            self.prices,
+        ]
+        for departures, indexes in self.by_source.values():
+            arrays += [departures, indexes]
+        return (
+            sum(sys.getsizeof(values) for values in arrays)
+            + sys.getsizeof(self.by_source)
+            + sys.getsizeof(self.stations)
+            + sum(sys.getsizeof(value) for value in self.stations.values())
+        )
+
+    def departures_from(self, station_id, ready: float, latest: float):
+        """Indexes of journeys leaving the station between ready and latest"""
+        departures, indexes = self.by_source.get(station_id, ((), ()))
+        position = bisect_left(departures, ready)
+        while position < len(departures) and departures[position] <= latest:
+            yield indexes[position]
+            position += 1
+
+    def to_datetime(self, timestamp: float) -> datetime:
+        return datetime.fromtimestamp(timestamp, self.tzinfo)
+
+    def distance(self, station_id, other_station_id) -> float:
+        if station_id not in self.stations:
+            return 0.0
+        if other_station_id not in self.stations:
+            return 0.0
+        return station_distance(
+            *self.stations[station_id], *self.stations[other_station_id]
+        )
+
+
+class ConnectionPlanner:
+    """A* search over a time expanded graph of journeys.
+    Labels are (station, arrival time) reached through a chain of journeys,
+    each station is settled at most limit times"""
+
+    def __init__(
+            self,
+            timetable: Timetable,
+            min_transfer=timedelta(minutes=10),
+            max_wait=timedelta(hours=24),
+            max_transfers=3,
+    ):
+        self.timetable = timetable
+        self.min_transfer = min_transfer.total_seconds()
+        self.max_wait = max_wait.total_seconds()
+        self.max_transfers = max_transfers
+
+    def _heuristic(self, station_id, destination_id, optimize) -> float:
+        distance = self.timetable.distance(station_id, destination_id)
+        if optimize == "price":
+            return distance * self.timetable.min_kilometer_price
+        if self.timetable.max_speed <= 0:
+            return 0.0
+        return distance / self.timetable.max_speed
+
+    def _priority(self, arrival, transfers, price, estimate, optimize):
+        if optimize == "price":
+            return price + estimate, arrival
+        if optimize == "transfers":
+            return transfers, arrival + estimate
+        return arrival + estimate, transfers
+
+    def search(
+            self,
+            source_id,
+            destination_id,
+            departure_time: datetime,
+            optimize="arrival",
+            limit=3,
+    ) -> list:
+        timetable = self.timetable
+        start = departure_time.timestamp()
+        settled = {}
+        estimates = {}
+        itineraries = []
+        counter = 0
+
+        queue = [((0, 0), counter, source_id, start, -1, 0.0, ())]
+        while queue and len(itineraries) < limit:
+            _, _, station_id, arrival, transfers, price, legs = heapq.heappop(
+                queue
+            )
+            if station_id == destination_id and legs:
+                itineraries.append(legs)
+                continue
+
+            # Labels out of transfers can not go on, they leave
+            # the station to later ones that can
+            if transfers >= self.max_transfers:
+                continue
+            if settled.get(station_id, 0) >= limit:
+                continue
+            settled[station_id] = settled.get(station_id, 0) + 1
+
+            ready = arrival + self.min_transfer if legs else arrival
+            visited = {timetable.sources[leg] for leg in legs}
+            visited.add(station_id)
+            for index in timetable.departures_from(
+                station_id, ready, ready + self.max_wait
+            ):
+                next_station = timetable.destinations[index]
+                if next_station in visited:
+                    continue
+                if settled.get(next_station, 0) >= limit:
+                    continue
+
+                next_arrival = timetable.arrivals[index]
+                next_price = price + timetable.prices[index]
+                if next_station not in estimates:
+                    estimates[next_station] = self._heuristic(
+                        next_station, destination_id, optimize
+                    )
+                estimate = estimates[next_station]
+                counter += 1
+                heapq.heappush(
+                    queue,
+                    (
+                        self._priority(
+                            next_arrival,
+                            transfers + 1,
+                            next_price,
+                            estimate,
+                            optimize,
+                        ),
+                        counter,
+                        next_station,
+                        next_arrival,
+                        transfers + 1,
+                        next_price,
+                        legs + (index,),
+                    )
+                )
+
+        return [self.describe(legs) for legs in itineraries]
+
+    def describe(self, legs) -> dict:
+        timetable = self.timetable
+        steps = [
+            {
+                "journey": timetable.journey_ids[index],
+                "source": timetable.sources[index],
+                "destination": timetable.destinations[index],
+                "departure_time": timetable.to_datetime(
+                    timetable.departures[index]
+                ),
+                "arrival_time": timetable.to_datetime(
+                    timetable.arrivals[index]
+                ),
+                "price_trip": timetable.prices[index],
+            }
+            for index in legs
+        ]
+        return {
+            "departure_time": steps[0]["departure_time"],
+            "arrival_time": steps[-1]["arrival_time"],
+            "transfers": len(steps) - 1,
+            "price_trip": round(sum(step["price_trip"] for step in steps), 2),
+            "legs": steps,
+        }
@@ -0,0 +1,135 @@
+import logging
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.urls import resolve
+
+logger = logging.getLogger(__name__)
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LISTS = re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql: str) -> str:
+    """SQL with literals and parameter lists replaced by ?,
+    so queries repeated for every row collapse into one fingerprint"""
+    sql = LITERALS.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = PLACEHOLDER_LISTS.sub("(...)", sql)
+    return " ".join(sql.split())
+
+
+def view_query_budget(view_func, method: str):
+    """Budget declared by the view for the request method.
+    Viewsets declare query_budgets by action, other views by method name.
+    None when the view has no budget for it"""
+    view_class = getattr(view_func, "cls", None)
+    budgets = getattr(view_class, "query_budgets", None)
+    if not budgets:
+        return None
+    method = method.lower()
+    actions = getattr(view_func, "actions", None)
+    if actions is not None:
+        return budgets.get(actions.get(method))
+    return budgets.get(method)
+
+
+class QueryRecorder:
+    """Execute wrapper keeping the SQL of every query"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def report(self, budget, label) -> str:
+        fingerprints = Counter(fingerprint(sql) for sql in self.queries)
+        lines = [
+            f"{label} ran {len(self.queries)} queries, budget is {budget}:"
+        ]
+        lines += [
+            f"  {count} x {sql}" for sql, count in fingerprints.most_common()
+        ]
+        return "\n".join(lines)
+
+
+def assert_query_budget(client, method, path, *args, **kwargs):
+    """Send the request with the test client and fail
+    when it runs more queries than the view budget allows"""
+    match = resolve(path.split("?")[0])
+    budget = view_query_budget(match.func, method)
+    if budget is None:
+        raise QueryBudgetExceeded(f"{method.upper()} {path} has no budget")
+
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        response = getattr(client, method.lower())(path, *args, **kwargs)
+        if response.streaming:
+            # Streamed rows are read while the body is consumed
+            response.streaming_content = [b"".join(response.streaming_content)]
+    if len(recorder) > budget:
+        raise QueryBudgetExceeded(
+            recorder.report(budget, f"{method.upper()} {path}")
+        )
+    return response
+
+
+class QueryBudgetMiddleware:
+    """Debug middleware checking every request against the budget of its
+    view. Logs a warning, or raises when QUERY_BUDGET_RAISE is set"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        budget = getattr(request, "query_budget", None)
+        if budget is None:
+            return response
+        if response.streaming:
+            response.streaming_content = self.checked_stream(
+                response.streaming_content, recorder, budget, request
+            )
+        else:
+            self.check(recorder, budget, request)
+        return response
+
+    def checked_stream(self, content, recorder, budget, request):
+        """Streamed content counting the queries run to produce it,
+        checked once the body is consumed"""
+        content = iter(content)
+        while True:
+            # Only the queries of this stream, not of code run between chunks
+            with connection.execute_wrapper(recorder):
+                chunk = next(content, None)
+            if chunk is None:
+                break
+            yield chunk
+        self.check(recorder, budget, request)
+
+    @staticmethod
+    def check(recorder, budget, request) -> None:
+        if len(recorder) > budget:
+            message = recorder.report(
+                budget, f"{request.method} {request.path}"
+            )
+            if getattr(settings, "QUERY_BUDGET_RAISE", False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = view_query_budget(view_func, request.method)
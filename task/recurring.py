@@ -0,0 +1,169 @@
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from task.conflicts import check_batch
+from task.models import Journey
+from task.timetable import deferred_timetable_change
+
+BATCH_SIZE = 1000
+
+
+def day_start(day: date) -> datetime:
+    value = datetime.combine(day, datetime.min.time())
+    if settings.USE_TZ:
+        return timezone.make_aware(value)
+    return value
+
+
+def template_journeys(template, date_from, date_to) -> dict:
+    """Arrival time by departure time of every journey
+    of the template between the dates, both included"""
+    day = max(template.valid_from, date_from)
+    last_day = min(template.valid_until, date_to)
+    journeys = {}
+    while day <= last_day:
+        if template.runs_on(day):
+            departure = datetime.combine(day, template.departure_time)
+            if settings.USE_TZ:
+                departure = timezone.make_aware(departure)
+            journeys[departure] = departure + template.duration
+        day += timedelta(days=1)
+    return journeys
+
+
+def generate_journeys(templates, date_from: date, date_to=None) -> dict:
+    """Make the journeys of the templates departing between the dates
+    match the templates. Missing journeys are inserted with the template
+    crew, changed ones updated and those no longer scheduled deleted.
+    Journeys with sold or held tickets are kept as they are.
+    date_to None stands for the end of the validity of every template.
+    Raises ScheduleConflict, writing nothing, when the written journeys
+    overlap others of their train or crew"""
+    with transaction.atomic(), deferred_timetable_change():
+        return _sync_journeys(
+            list(templates.prefetch_related("crew")), date_from, date_to
+        )
+
+
+def _sync_journeys(templates, date_from, date_to) -> dict:
+    counts = Counter(created=0, updated=0, deleted=0, unchanged=0, kept=0)
+    if not templates:
+        return dict(counts)
+
+    existing = Journey.objects.filter(
+        template__in=templates, departure_time__gte=day_start(date_from)
+    )
+    if date_to is not None:
+        existing = existing.filter(
+            departure_time__lt=day_start(date_to + timedelta(days=1))
+        )
+    existing_by_template = {}
+    for journey in existing.order_by().only(
+        "id",
+        "template_id",
+        "departure_time",
+        "arrival_time",
+        "route_id",
+        "train_id",
+        "tickets_sold",
+        "tickets_held",
+    ):
+        existing_by_template.setdefault(journey.template_id, []).append(
+            journey
+        )
+    crew_by_journey = {}
+    for journey_id, crew_id in Journey.crew.through.objects.filter(
+        journey__in=existing
+    ).values_list("journey_id", "crew_id"):
+        crew_by_journey.setdefault(journey_id, set()).add(crew_id)
+
+    created, updated, deleted, crew_changed = [], [], [], []
+    for template in templates:
+        scheduled = template_journeys(
+            template, date_from, date_to or template.valid_until
+        )
+        crew = {member.id for member in template.crew.all()}
+        for journey in existing_by_template.get(template.id, ()):
+            arrival_time = scheduled.pop(journey.departure_time, None)
+            if journey.tickets_sold or journey.tickets_held:
+                counts["kept"] += 1
+                continue
+            if arrival_time is None:
+                deleted.append(journey.id)
+                continue
+            changed = (
+                journey.arrival_time != arrival_time
+                or journey.route_id != template.route_id
+                or journey.train_id != template.train_id
+            )
+            if changed:
+                journey.arrival_time = arrival_time
+                journey.route_id = template.route_id
+                journey.train_id = template.train_id
+                updated.append(journey)
+            if crew_by_journey.get(journey.id, set()) != crew:
+                crew_changed.append((journey.id, crew))
+                changed = True
+            counts["updated" if changed else "unchanged"] += 1
+
+        for departure_time, arrival_time in scheduled.items():
+            created.append(
+                (
+                    Journey(
+                        template=template,
+                        departure_time=departure_time,
+                        arrival_time=arrival_time,
+                        route_id=template.route_id,
+                        train_id=template.train_id,
+                    ),
+                    crew,
+                )
+            )
+
+    for start in range(0, len(deleted), BATCH_SIZE):
+        Journey.objects.filter(
+            id__in=deleted[start:start + BATCH_SIZE]
+        ).delete()
+    if updated:
+        Journey.objects.bulk_update(
+            updated,
+            ["arrival_time", "route", "train"],
+            batch_size=BATCH_SIZE,
+        )
+    if created:
+        Journey.objects.bulk_create(
+            [journey for journey, _ in created], batch_size=BATCH_SIZE
+        )
+    for start in range(0, len(crew_changed), BATCH_SIZE):
+        Journey.crew.through.objects.filter(
+            journey_id__in=[
+                journey_id
+                for journey_id, _ in crew_changed[start:start + BATCH_SIZE]
+            ]
+        ).delete()
+    Journey.crew.through.objects.bulk_create(
+        [
+            Journey.crew.through(journey_id=journey_id, crew_id=crew_id)
+            for journey_id, crew in [
+                *crew_changed,
+                *((journey.id, crew) for journey, crew in created),
+            ]
+            for crew_id in crew
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    check_batch(
+        [
+            *(journey.id for journey in updated),
+            *(journey_id for journey_id, _ in crew_changed),
+            *(journey.id for journey, _ in created),
+        ]
+    )
+
+    counts["created"] = len(created)
+    counts["deleted"] = len(deleted)
+    return dict(counts)
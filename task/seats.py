@@ -0,0 +1,389 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from task.models import HeldSeat, Journey, Order, SeatHold, Ticket
+
+# Seats of deleted tickets waiting to be released, by journey
+_deferred_release = ContextVar("deferred_release", default=None)
+
+
+class SeatsTaken(Exception):
+    """Raised when some of the requested seats are sold or held"""
+
+    def __init__(self, seats):
+        self.seats = seats
+        super().__init__(f"Seats are already taken: {seats}")
+
+
+class SeatMap:
+    """Occupancy bitmap of a journey, one bit per seat
+    numbered by cargo and place starting from 1"""
+
+    def __init__(self, data, cargo_num: int, places_in_cargo: int):
+        self.cargo_num = cargo_num
+        self.places_in_cargo = places_in_cargo
+        self.bits = bytearray(data or b"")
+        missing = (cargo_num * places_in_cargo + 7) // 8 - len(self.bits)
+        if missing > 0:
+            self.bits.extend(bytes(missing))
+
+    @classmethod
+    def for_journey(cls, journey: Journey) -> "SeatMap":
+        return cls(
+            journey.seat_map,
+            journey.train.cargo_num,
+            journey.train.places_in_cargo,
+        )
+
+    def __contains__(self, seat) -> bool:
+        cargo_num, place_in_cargo = seat
+        return (
+            1 <= cargo_num <= self.cargo_num
+            and 1 <= place_in_cargo <= self.places_in_cargo
+        )
+
+    def _position(self, cargo_num: int, place_in_cargo: int) -> tuple:
+        index = (cargo_num - 1) * self.places_in_cargo + place_in_cargo - 1
+        return index >> 3, 1 << (index & 7)
+
+    def is_taken(self, cargo_num: int, place_in_cargo: int) -> bool:
+        byte, mask = self._position(cargo_num, place_in_cargo)
+        return bool(self.bits[byte] & mask)
+
+    def take(self, cargo_num: int, place_in_cargo: int) -> None:
+        byte, mask = self._position(cargo_num, place_in_cargo)
+        self.bits[byte] |= mask
+
+    def free(self, cargo_num: int, place_in_cargo: int) -> None:
+        byte, mask = self._position(cargo_num, place_in_cargo)
+        self.bits[byte] &= ~mask
+
+    def cargos(self) -> list:
+        occupied = int.from_bytes(self.bits, "little")
+        cargos = []
+        for cargo_num in range(1, self.cargo_num + 1):
+            start = (cargo_num - 1) * self.places_in_cargo
+            cargo_bits = occupied >> start
+            cargos.append(
+                {
+                    "cargo_num": cargo_num,
+                    "free_places": [
+                        place
+                        for place in range(1, self.places_in_cargo + 1)
+                        if not cargo_bits >> (place - 1) & 1
+                    ],
+                }
+            )
+        return cargos
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.bits)
+
+
+class HoldExpired(Exception):
+    """Raised when a hold was released before it was confirmed"""
+
+
+def _lock_journeys(journey_ids) -> None:
+    """Take the write lock of the journey rows before reading their seats.
+    A no-op update locks the rows on every backend and makes SQLite
+    wait for concurrent writers instead of failing the transaction"""
+    Journey.objects.filter(pk__in=journey_ids).update(
+        tickets_held=F("tickets_held")
+    )
+
+
+def _lock_journey(journey_id) -> None:
+    _lock_journeys([journey_id])
+
+
+def _change_seats(
+        journey_seats: dict,
+        take: bool,
+        counter: str,
+        exclusive: bool = False,
+) -> None:
+    """Take or free seats of several journeys with three queries"""
+    journey_seats = {
+        journey_id: seats
+        for journey_id, seats in journey_seats.items()
+        if seats
+    }
+    if not journey_seats:
+        return
+    _lock_journeys(list(journey_seats))
+    journeys = (
+        Journey.objects.select_related("train")
+        .only(
+            "seat_map",
+            counter,
+            "train__cargo_num",
+            "train__places_in_cargo",
+        )
+        .in_bulk(list(journey_seats))
+    )
+
+    for journey in journeys.values():
+        seats = journey_seats[journey.id]
+        seat_map = SeatMap.for_journey(journey)
+        if take and exclusive:
+            taken = [
+                seat for seat in seats
+                if seat in seat_map and seat_map.is_taken(*seat)
+            ]
+            if taken or len(set(seats)) != len(seats):
+                raise SeatsTaken(taken)
+
+        for cargo_num, place_in_cargo in seats:
+            if (cargo_num, place_in_cargo) not in seat_map:
+                continue
+            if take:
+                seat_map.take(cargo_num, place_in_cargo)
+            else:
+                seat_map.free(cargo_num, place_in_cargo)
+
+        change = len(seats) if take else -len(seats)
+        journey.seat_map = seat_map.to_bytes()
+        setattr(journey, counter, getattr(journey, counter) + change)
+
+    if journeys:
+        Journey.objects.bulk_update(journeys.values(), ["seat_map", counter])
+
+
+def occupy_seats(journey_id, seats, exclusive: bool = False) -> None:
+    """Mark seats (cargo_num, place_in_cargo) of the journey as sold,
+    with exclusive=True fail with SeatsTaken instead of overbooking"""
+    occupy_journey_seats({journey_id: seats}, exclusive)
+
+
+def occupy_journey_seats(journey_seats, exclusive: bool = False) -> None:
+    """occupy_seats for a dict of seat lists by journey id"""
+    _change_seats(journey_seats, True, "tickets_sold", exclusive)
+
+
+def release_seats(journey_id, seats) -> None:
+    """Return sold seats (cargo_num, place_in_cargo) of the journey"""
+    release_journey_seats({journey_id: seats})
+
+
+def release_journey_seats(journey_seats) -> None:
+    """release_seats for a dict of seat lists by journey id"""
+    _change_seats(journey_seats, False, "tickets_sold")
+
+
+def defer_release(journey_id, seats, order_id) -> bool:
+    """Queue seats of a deleted ticket inside deferred_seat_release,
+    False outside of it"""
+    deferred = _deferred_release.get()
+    if deferred is None:
+        return False
+    journey_seats, order_ids = deferred
+    journey_seats[journey_id].extend(seats)
+    order_ids.add(order_id)
+    return True
+
+
+@contextmanager
+def deferred_seat_release():
+    """Release the seats of tickets deleted in the block and recalculate
+    totals of their orders once at the end instead of once per ticket"""
+    journey_seats = defaultdict(list)
+    order_ids = set()
+    token = _deferred_release.set((journey_seats, order_ids))
+    try:
+        with transaction.atomic():
+            yield
+            _deferred_release.reset(token)
+            token = None
+            release_journey_seats(journey_seats)
+            if order_ids:
+                Order.objects.filter(pk__in=order_ids).refresh_total()
+    finally:
+        if token is not None:
+            _deferred_release.reset(token)
+
+
+def hold_seats(user, journey, seats, minutes: int) -> SeatHold:
+    """Reserve free seats of the journey for the user for some minutes"""
+    release_expired_holds(journey_id=journey.id)
+    with transaction.atomic():
+        _lock_journey(journey.id)
+        hold = SeatHold.objects.create(
+            journey=journey,
+            user=user,
+            expires_at=timezone.now() + timedelta(minutes=minutes),
+        )
+        HeldSeat.objects.bulk_create(
+            [
+                HeldSeat(
+                    hold=hold,
+                    journey=journey,
+                    cargo_num=cargo_num,
+                    place_in_cargo=place_in_cargo,
+                )
+                for cargo_num, place_in_cargo in seats
+            ]
+        )
+        _change_seats(
+            {journey.id: seats}, True, "tickets_held", exclusive=True
+        )
+    return hold
+
+
+def _claim_hold(hold: SeatHold, active_only: bool) -> list:
+    """Delete the hold and return its seats, empty if it is already gone"""
+    _lock_journey(hold.journey_id)
+    seats = list(
+        HeldSeat.objects.filter(hold_id=hold.pk).values_list(
+            "cargo_num", "place_in_cargo"
+        )
+    )
+    holds = SeatHold.objects.filter(pk=hold.pk)
+    if active_only:
+        holds = holds.filter(expires_at__gt=timezone.now())
+    deleted, _ = holds.delete()
+    return seats if deleted else []
+
+
+def release_hold(hold: SeatHold) -> None:
+    """Return held seats back to sale"""
+    with transaction.atomic():
+        seats = _claim_hold(hold, active_only=False)
+        if seats:
+            _change_seats({hold.journey_id: seats}, False, "tickets_held")
+
+
+def release_expired_holds(journey_id=None, journey_ids=None) -> int:
+    """Release holds past their expiry time, found by expires_at index,
+    of one journey, of several or of all of them. All of them are
+    released together, the number of queries does not depend on how
+    many holds expired"""
+    expired = SeatHold.objects.filter(expires_at__lte=timezone.now())
+    if journey_id is not None:
+        expired = expired.filter(journey_id=journey_id)
+    if journey_ids is not None:
+        expired = expired.filter(journey_id__in=journey_ids)
+    journey_ids = set(expired.values_list("journey_id", flat=True))
+    if not journey_ids:
+        return 0
+
+    with transaction.atomic():
+        # Holds confirmed or cancelled meanwhile are gone after the lock
+        _lock_journeys(list(journey_ids))
+        journey_seats = defaultdict(list)
+        for hold_journey_id, cargo_num, place_in_cargo in (
+            HeldSeat.objects.filter(hold__in=expired).values_list(
+                "journey_id", "cargo_num", "place_in_cargo"
+            )
+        ):
+            journey_seats[hold_journey_id].append((cargo_num, place_in_cargo))
+        _, deleted = expired.delete()
+        _change_seats(journey_seats, False, "tickets_held")
+    return deleted.get(SeatHold._meta.label, 0)
+
+
+def _seats_by_journey(model, journeys) -> defaultdict:
+    seats = defaultdict(list)
+    for journey_id, cargo_num, place_in_cargo in model.objects.filter(
+        journey__in=journeys
+    ).values_list("journey_id", "cargo_num", "place_in_cargo"):
+        seats[journey_id].append((cargo_num, place_in_cargo))
+    return seats
+
+
+def seat_repairs(journeys):
+    """Yield (journey, tickets_sold, tickets_held, seat map bytes)
+    recounted from the tickets and held seats for every journey, with
+    its train loaded, whose counters or seat map do not match them"""
+    sold = _seats_by_journey(Ticket, journeys)
+    held = _seats_by_journey(HeldSeat, journeys)
+    for journey in journeys:
+        seat_map = SeatMap(
+            b"", journey.train.cargo_num, journey.train.places_in_cargo
+        )
+        for seat in sold[journey.id] + held[journey.id]:
+            if seat in seat_map:
+                seat_map.take(*seat)
+
+        repair = (
+            journey,
+            len(sold[journey.id]),
+            len(held[journey.id]),
+            seat_map.to_bytes(),
+        )
+        if (journey.tickets_sold, journey.tickets_held) != repair[1:3] or (
+            bytes(journey.seat_map) != repair[3]
+        ):
+            yield repair
+
+
+def rebuild_seat_maps(journeys, batch_size=500) -> int:
+    """Repair the seat counters and seat maps of the journeys of the
+    queryset, needed when their train changes its layout. Returns the
+    number of journeys that were wrong"""
+    journey_ids = list(journeys.values_list("id", flat=True))
+    repaired = 0
+    with transaction.atomic():
+        for start in range(0, len(journey_ids), batch_size):
+            batch = journey_ids[start:start + batch_size]
+            _lock_journeys(batch)
+            drifted = []
+            for journey, sold, held, seat_map in seat_repairs(
+                list(
+                    Journey.objects.select_related("train").only(
+                        "id",
+                        "tickets_sold",
+                        "tickets_held",
+                        "seat_map",
+                        "train__cargo_num",
+                        "train__places_in_cargo",
+                    ).filter(pk__in=batch)
+                )
+            ):
+                journey.tickets_sold = sold
+                journey.tickets_held = held
+                journey.seat_map = seat_map
+                drifted.append(journey)
+            if drifted:
+                Journey.objects.bulk_update(
+                    drifted, ["tickets_sold", "tickets_held", "seat_map"]
+                )
+            repaired += len(drifted)
+    return repaired
+
+
+def confirm_hold(hold: SeatHold) -> Order:
+    """Turn an active hold into an order with tickets for held seats"""
+    with transaction.atomic():
+        seats = _claim_hold(hold, active_only=True)
+        if not seats:
+            raise HoldExpired
+        price = Journey.objects.filter(pk=hold.journey_id).prices()[
+            hold.journey_id
+        ]
+        order = Order.objects.create(
+            user=hold.user, total_price=round(price * len(seats), 2)
+        )
+        Ticket.objects.bulk_create(
+            [
+                Ticket(
+                    order=order,
+                    journey_id=hold.journey_id,
+                    cargo_num=cargo_num,
+                    place_in_cargo=place_in_cargo,
+                    price=price,
+                )
+                for cargo_num, place_in_cargo in seats
+            ]
+        )
+        Journey.objects.filter(pk=hold.journey_id).update(
+            tickets_held=F("tickets_held") - len(seats),
+            tickets_sold=F("tickets_sold") + len(seats),
+        )
+    return order
@@ -1,6 +1,13 @@
-from django.db import transaction
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
+from rest_framework.relations import MANY_RELATION_KWARGS
 from task.models import (
     TrainType,
     Train,
@@ -10,6 +17,19 @@ from task.models import (
     Station,
     Ticket,
     Order,
+    SeatHold,
+    HeldSeat,
+    TimetableTemplate,
+)
+from task.conflicts import validate_schedule
+from task.images import image_pipeline, save_upload
+from task.planner import OPTIMIZE_CHOICES
+from task.seats import (
+    SeatMap,
+    SeatsTaken,
+    hold_seats,
+    occupy_journey_seats,
+    release_expired_holds,
 )
 
 
@@ -64,7 +84,16 @@ class TrainDetailSerializer(TrainSerializer):
 class CrewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Crew
-        fields = ("id", "first_name", "last_name", "image")
+        fields = (
+            "id",
+            "first_name",
+            "last_name",
+            "image",
+            "image_webp",
+            "thumbnail",
+            "thumbnail_webp",
+            "image_status",
+        )
         read_only_fields = ("image",)
 
 
@@ -72,13 +101,34 @@ class CrewListSerializer(CrewSerializer):
 
     class Meta:
         model = Crew
-        fields = ("id", "full_name")
+        fields = ("id", "full_name", "thumbnail")
 
 
 class CrewImageSerializer(serializers.ModelSerializer):
+    """Takes the upload, the variants are rendered in the background"""
+    image = serializers.ImageField(write_only=True)
+
     class Meta:
         model = Crew
-        fields = ("id", "image")
+        fields = ("id", "image", "image_status")
+
+    def validate_image(self, image):
+        if image.size > settings.CREW_IMAGE_MAX_BYTES:
+            raise ValidationError(
+                f"Image must not exceed "
+                f"{settings.CREW_IMAGE_MAX_BYTES // 1024 // 1024} MB."
+            )
+        return image
+
+    def update(self, instance, validated_data):
+        instance.image_upload = save_upload(validated_data["image"])
+        instance.image_uploaded_at = timezone.now()
+        instance.image_status = Crew.ImageStatus.PROCESSING
+        instance.save(
+            update_fields=["image_upload", "image_uploaded_at", "image_status"]
+        )
+        image_pipeline.submit(instance.id, instance.image_upload)
+        return instance
 
 
 class StationSerializer(serializers.ModelSerializer):
@@ -140,7 +190,51 @@ class RouteDetailSerializer(RouteSerializer):
     )
 
 
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Looks up all primary keys of the list with one query"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+
+        child = self.child_relation
+        queryset = child.get_queryset()
+        pk_field = queryset.model._meta.pk
+        keys = []
+        for value in data:
+            if isinstance(value, bool):
+                child.fail("incorrect_type", data_type=type(value).__name__)
+            try:
+                keys.append(pk_field.to_python(value))
+            except (DjangoValidationError, TypeError, ValueError):
+                child.fail("incorrect_type", data_type=type(value).__name__)
+
+        instances = queryset.in_bulk(keys)
+        for key, value in zip(keys, data):
+            if key not in instances:
+                child.fail("does_not_exist", pk_value=value)
+        return [instances[key] for key in keys]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+
 class JourneySerializer(serializers.ModelSerializer):
+    crew = BulkPrimaryKeyRelatedField(
+        many=True,
+        queryset=Crew.objects.all(),
+        allow_empty=False,
+    )
+
     class Meta:
         model = Journey
         fields = (
@@ -152,6 +246,26 @@ class JourneySerializer(serializers.ModelSerializer):
             "crew",
         )
 
+    def validate(self, attrs):
+        data = super(JourneySerializer, self).validate(attrs=attrs)
+        schedule = {
+            name: attrs.get(name, getattr(self.instance, name, None))
+            for name in ("departure_time", "arrival_time", "train")
+        }
+        if "crew" in attrs:
+            crew = attrs["crew"]
+        elif self.instance is not None:
+            crew = self.instance.crew.all()
+        else:
+            crew = []
+        validate_schedule(
+            **schedule,
+            crew=crew,
+            journey_id=getattr(self.instance, "id", None),
+            error_to_raise=ValidationError,
+        )
+        return data
+
 
 class JourneyListSerializer(JourneySerializer):
     route = serializers.StringRelatedField()
@@ -174,6 +288,57 @@ class JourneyListSerializer(JourneySerializer):
         )
 
 
+class ValuesListSerializer(ABC):
+    """Renders values() rows into the output of a list serializer
+    without building model instances or running field machinery per row"""
+    values = ()
+    datetime_field = serializers.DateTimeField()
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @classmethod
+    def queryset(cls, queryset):
+        return queryset.prefetch_related(None).values(*cls.values)
+
+    @abstractmethod
+    def to_representation(self, row) -> dict:
+        """Output of one of the rows"""
+
+    @property
+    def data(self) -> list:
+        return [self.to_representation(row) for row in self.rows]
+
+
+class JourneyListValuesSerializer(ValuesListSerializer):
+    """Same output as JourneyListSerializer, the queryset must be
+    annotated with price_trip and tickets_available"""
+    values = (
+        "id",
+        "departure_time",
+        "route__source__name",
+        "route__destination__name",
+        "train__name",
+        "price_trip",
+        "tickets_available",
+    )
+
+    def to_representation(self, row) -> dict:
+        return {
+            "id": row["id"],
+            "departure_time": self.datetime_field.to_representation(
+                row["departure_time"]
+            ),
+            "route": Route.label(
+                row["route__source__name"],
+                row["route__destination__name"],
+            ),
+            "train": row["train__name"],
+            "price_trip": row["price_trip"],
+            "tickets_available": row["tickets_available"],
+        }
+
+
 class JourneyDetailSerializer(JourneySerializer):
     route = serializers.StringRelatedField()
     crew = CrewSerializer(
@@ -201,15 +366,9 @@ class JourneyDetailSerializer(JourneySerializer):
 
 
 class TicketSerializer(serializers.ModelSerializer):
-    def validate(self, attrs):
-        data = super(TicketSerializer, self).validate(attrs=attrs)
-        Ticket.validate_ticket(
-            attrs["cargo_num"],
-            attrs["place_in_cargo"],
-            attrs["journey"].train,
-            ValidationError
-        )
-        return data
+    """Seats and journeys of the tickets are validated
+    together by OrderCreateSerializer.validate_tickets"""
+    journey = serializers.IntegerField(source="journey_id")
 
     class Meta:
         model = Ticket
@@ -219,6 +378,7 @@ class TicketSerializer(serializers.ModelSerializer):
             "cargo_num",
             "place_in_cargo"
         )
+        validators = []
 
 
 class TicketDetailSerializer(TicketSerializer):
@@ -242,10 +402,7 @@ class TicketDetailSerializer(TicketSerializer):
         source="journey.train.name",
         read_only=True,
     )
-    price_trip = serializers.FloatField(
-        source="journey.price_trip",
-        read_only=True
-    )
+    price_trip = serializers.FloatField(source="price", read_only=True)
 
     class Meta:
         model = Ticket
@@ -284,6 +441,7 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = (
             "id",
             "created_at",
+            "total_price",
             "tickets"
         )
 
@@ -291,13 +449,100 @@ class OrderSerializer(serializers.ModelSerializer):
 class OrderCreateSerializer(OrderSerializer):
     tickets = TicketSerializer(many=True, read_only=False, allow_empty=False)
 
+    seat_taken_message = (
+        "The fields journey, cargo_num, place_in_cargo "
+        "must make a unique set."
+    )
+
+    def validate_tickets(self, tickets):
+        """Validate and price all tickets with one query
+        for journeys and trains. Seats of expired holds
+        are released first"""
+        release_expired_holds(
+            journey_ids={ticket["journey_id"] for ticket in tickets}
+        )
+        journeys = Journey.objects.select_related("train").only(
+            "id",
+            "seat_map",
+            "train__cargo_num",
+            "train__places_in_cargo",
+        ).with_price_trip().in_bulk(
+            {ticket["journey_id"] for ticket in tickets}
+        )
+
+        seat_maps = {}
+        ordered_seats = set()
+        errors = []
+        for ticket in tickets:
+            journey = journeys.get(ticket["journey_id"])
+            if journey is None:
+                errors.append(
+                    {
+                        "journey": [
+                            f"Invalid pk \"{ticket['journey_id']}\" "
+                            f"- object does not exist."
+                        ]
+                    }
+                )
+                continue
+
+            try:
+                Ticket.validate_ticket(
+                    ticket["cargo_num"],
+                    ticket["place_in_cargo"],
+                    journey.train,
+                    ValidationError
+                )
+            except ValidationError as error:
+                errors.append(serializers.as_serializer_error(error))
+                continue
+
+            if journey.id not in seat_maps:
+                seat_maps[journey.id] = SeatMap.for_journey(journey)
+
+            seat = (journey.id, ticket["cargo_num"], ticket["place_in_cargo"])
+            if seat in ordered_seats or seat_maps[journey.id].is_taken(
+                ticket["cargo_num"], ticket["place_in_cargo"]
+            ):
+                errors.append({"non_field_errors": [self.seat_taken_message]})
+                continue
+
+            ordered_seats.add(seat)
+            ticket["price"] = journey.price_trip
+            errors.append({})
+
+        if any(errors):
+            raise ValidationError(errors)
+        return tickets
+
     def create(self, validated_data):
-        with transaction.atomic():
-            tickets_data = validated_data.pop("tickets")
-            order = Order.objects.create(**validated_data)
-            for ticket_data in tickets_data:
-                Ticket.objects.create(order=order, **ticket_data)
-            return order
+        tickets_data = validated_data.pop("tickets")
+        journey_seats = defaultdict(list)
+        for ticket_data in tickets_data:
+            journey_seats[ticket_data["journey_id"]].append(
+                (ticket_data["cargo_num"], ticket_data["place_in_cargo"])
+            )
+        try:
+            with transaction.atomic():
+                order = Order.objects.create(
+                    total_price=round(
+                        sum(ticket["price"] for ticket in tickets_data), 2
+                    ),
+                    **validated_data,
+                )
+                # Holds expired since the validation, after the first
+                # write so that SQLite waits for concurrent orders
+                release_expired_holds(journey_ids=list(journey_seats))
+                Ticket.objects.bulk_create(
+                    [
+                        Ticket(order=order, **ticket_data)
+                        for ticket_data in tickets_data
+                    ]
+                )
+                occupy_journey_seats(journey_seats, exclusive=True)
+                return order
+        except (IntegrityError, SeatsTaken):
+            raise ValidationError({"tickets": [self.seat_taken_message]})
 
 
 class OrderListSerializer(OrderSerializer):
@@ -310,10 +555,64 @@ class OrderListSerializer(OrderSerializer):
         model = Order
         fields = (
             "id",
+            "total_price",
             "tickets",
         )
 
 
+class OrderListValuesSerializer(ValuesListSerializer):
+    """Same output as OrderListSerializer,
+    tickets of the whole page are read with one query"""
+    values = ("id", "created_at", "total_price")
+    tickets = None
+
+    def to_representation(self, row) -> dict:
+        return {
+            "id": row["id"],
+            "total_price": row["total_price"],
+            "tickets": self.tickets[row["id"]],
+        }
+
+    @staticmethod
+    def tickets_queryset(rows):
+        """Tickets of the orders in rows, as read by add_tickets"""
+        return Ticket.objects.filter(
+            order_id__in=[row["id"] for row in rows]
+        ).values_list(
+            "order_id",
+            "journey__departure_time",
+            "journey__route__source__name",
+            "journey__route__destination__name",
+            "price",
+        )
+
+    def add_tickets(self, tickets) -> None:
+        self.tickets = defaultdict(list)
+        for (
+            order_id,
+            departure_time,
+            source_name,
+            destination_name,
+            price,
+        ) in tickets:
+            self.tickets[order_id].append(
+                {
+                    "departure_time": self.datetime_field.to_representation(
+                        departure_time
+                    ),
+                    "route": Route.label(source_name, destination_name),
+                    "price_trip": price,
+                }
+            )
+
+    @property
+    def data(self) -> list:
+        if self.tickets is None:
+            self.rows = list(self.rows)
+            self.add_tickets(self.tickets_queryset(self.rows))
+        return super().data
+
+
 class OrderDetailSerializer(OrderSerializer):
     tickets = TicketDetailSerializer(
         many=True,
@@ -325,5 +624,180 @@ class OrderDetailSerializer(OrderSerializer):
         fields = (
             "id",
             "created_at",
+            "total_price",
             "tickets",
         )
+
+
+class HeldSeatSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HeldSeat
+        fields = ("cargo_num", "place_in_cargo")
+
+
+class SeatHoldSerializer(serializers.ModelSerializer):
+    journey = serializers.PrimaryKeyRelatedField(
+        queryset=Journey.objects.select_related("train")
+    )
+    seats = HeldSeatSerializer(many=True, allow_empty=False)
+    minutes = serializers.IntegerField(
+        write_only=True,
+        min_value=1,
+        max_value=settings.SEAT_HOLD_MAX_MINUTES,
+        default=settings.SEAT_HOLD_MINUTES,
+    )
+
+    seat_taken_message = "Some of the seats are already sold or held."
+
+    class Meta:
+        model = SeatHold
+        fields = ("id", "journey", "seats", "minutes", "expires_at")
+        read_only_fields = ("expires_at",)
+
+    def validate(self, attrs):
+        data = super(SeatHoldSerializer, self).validate(attrs=attrs)
+        for seat in attrs["seats"]:
+            Ticket.validate_ticket(
+                seat["cargo_num"],
+                seat["place_in_cargo"],
+                attrs["journey"].train,
+                ValidationError
+            )
+        return data
+
+    def create(self, validated_data):
+        seats = [
+            (seat["cargo_num"], seat["place_in_cargo"])
+            for seat in validated_data["seats"]
+        ]
+        try:
+            return hold_seats(
+                validated_data["user"],
+                validated_data["journey"],
+                seats,
+                validated_data["minutes"],
+            )
+        except (IntegrityError, SeatsTaken):
+            raise ValidationError({"seats": [self.seat_taken_message]})
+
+
+class WeekdaysField(serializers.ListField):
+    """Weekday mask as the list of ISO weekday numbers, Monday is 1"""
+    child = serializers.IntegerField(min_value=1, max_value=7)
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("allow_empty", False)
+        super().__init__(**kwargs)
+
+    def to_representation(self, mask):
+        return [day for day in range(1, 8) if mask >> day - 1 & 1]
+
+    def to_internal_value(self, data):
+        days = super().to_internal_value(data)
+        return sum(1 << day - 1 for day in set(days))
+
+
+class TimetableTemplateSerializer(serializers.ModelSerializer):
+    weekdays = WeekdaysField(required=False)
+    crew = BulkPrimaryKeyRelatedField(
+        many=True,
+        queryset=Crew.objects.all(),
+        required=False,
+    )
+
+    class Meta:
+        model = TimetableTemplate
+        fields = (
+            "id",
+            "route",
+            "train",
+            "departure_time",
+            "duration",
+            "weekdays",
+            "valid_from",
+            "valid_until",
+            "crew",
+        )
+
+    def validate(self, attrs):
+        data = super(TimetableTemplateSerializer, self).validate(attrs=attrs)
+        period = {
+            name: attrs.get(name, getattr(self.instance, name, None))
+            for name in ("valid_from", "valid_until", "duration")
+        }
+        TimetableTemplate.validate_period(
+            **period, error_to_raise=ValidationError
+        )
+        return data
+
+
+class TimetableGenerateSerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        data = super(TimetableGenerateSerializer, self).validate(attrs=attrs)
+        if (
+            "date_from" in attrs
+            and "date_to" in attrs
+            and attrs["date_to"] < attrs["date_from"]
+        ):
+            raise ValidationError(
+                {"date_to": "Must not be before date_from."}
+            )
+        return data
+
+
+class TimetableGenerateResultSerializer(serializers.Serializer):
+    created = serializers.IntegerField()
+    updated = serializers.IntegerField()
+    deleted = serializers.IntegerField()
+    unchanged = serializers.IntegerField()
+    kept = serializers.IntegerField(
+        help_text="Journeys with sold or held tickets left as they are"
+    )
+
+
+class ConnectionSearchSerializer(serializers.Serializer):
+    source = serializers.PrimaryKeyRelatedField(
+        queryset=Station.objects.all()
+    )
+    destination = serializers.PrimaryKeyRelatedField(
+        queryset=Station.objects.all()
+    )
+    departure_time = serializers.DateTimeField(required=False)
+    optimize = serializers.ChoiceField(
+        choices=OPTIMIZE_CHOICES, default="arrival"
+    )
+    max_transfers = serializers.IntegerField(
+        min_value=0, max_value=5, default=3
+    )
+    min_transfer = serializers.IntegerField(
+        min_value=0, max_value=24 * 60, default=10
+    )
+    limit = serializers.IntegerField(min_value=1, max_value=10, default=3)
+
+    def validate(self, attrs):
+        data = super(ConnectionSearchSerializer, self).validate(attrs=attrs)
+        if attrs["source"] == attrs["destination"]:
+            raise ValidationError(
+                {"destination": "Destination must differ from source."}
+            )
+        return data
+
+
+class ConnectionLegSerializer(serializers.Serializer):
+    journey = serializers.IntegerField()
+    source = serializers.IntegerField()
+    destination = serializers.IntegerField()
+    departure_time = serializers.DateTimeField()
+    arrival_time = serializers.DateTimeField()
+    price_trip = serializers.FloatField()
+
+
+class ConnectionSerializer(serializers.Serializer):
+    departure_time = serializers.DateTimeField()
+    arrival_time = serializers.DateTimeField()
+    transfers = serializers.IntegerField()
+    price_trip = serializers.FloatField()
+    legs = ConnectionLegSerializer(many=True)
@@ -0,0 +1,120 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from task.caching import bump_model_version
+from task.models import (
+    Journey,
+    Order,
+    Route,
+    Station,
+    Ticket,
+    Train,
+    TrainType,
+    bulk_changed,
+    normalize_name,
+)
+from task.seats import (
+    defer_release,
+    occupy_seats,
+    rebuild_seat_maps,
+    release_seats,
+)
+from task.timetable import SEAT_FIELDS, timetable_changed
+
+TIMETABLE_MODELS = (Journey, Route, Station, Train)
+REFERENCE_MODELS = (Route, Station, Train, TrainType)
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_saved(sender, instance, created, **kwargs):
+    """Keep journey seat counters in sync with admin and API ticket edits"""
+    loaded_seat = getattr(instance, "_loaded_seat", None)
+    if not created:
+        if loaded_seat is None or loaded_seat == instance.seat:
+            return
+        release_seats(loaded_seat[0], [loaded_seat[1:]])
+
+    occupy_seats(instance.journey_id, [instance.seat[1:]])
+    instance._loaded_seat = instance.seat
+    Order.objects.filter(pk=instance.order_id).refresh_total()
+
+
+@receiver(post_save, sender=Route)
+def route_loaded(sender, instance, raw, **kwargs):
+    """Fixtures are saved raw, without the distance set by Route.save"""
+    if raw:
+        Route.objects.filter(pk=instance.pk).refresh_distance()
+
+
+@receiver(post_save, sender=Station)
+def station_loaded(sender, instance, raw, **kwargs):
+    """Fixtures are saved raw, without the normalized name set by
+    Station.save. Routes loaded before their stations get the distance"""
+    if raw:
+        Station.objects.filter(pk=instance.pk).update(
+            name_normalized=normalize_name(instance.name)
+        )
+        Route.objects.with_stations([instance.pk]).refresh_distance()
+
+
+@receiver(post_save, sender=Train)
+def train_saved(sender, instance, update_fields=None, **kwargs):
+    """Seats of the journeys are numbered by the layout of the train,
+    their seat maps are rebuilt from the tickets and holds when it changes"""
+    loaded_layout = getattr(instance, "_loaded_layout", None)
+    changed = update_fields is None or Train.LAYOUT_FIELDS & set(update_fields)
+    if loaded_layout not in (None, instance.layout) and changed:
+        rebuild_seat_maps(Journey.objects.filter(train_id=instance.pk))
+    instance._loaded_layout = instance.layout
+
+
+@receiver(bulk_changed, sender=Train)
+def trains_bulk_changed(sender, fields, pks=None, **kwargs):
+    """Layout updates of several trains, of every one when their ids
+    are not known. Inserted trains, fields None, have no journeys"""
+    if fields is None or not Train.LAYOUT_FIELDS & fields:
+        return
+    journeys = Journey.objects.all()
+    if pks is not None:
+        journeys = journeys.filter(train_id__in=pks)
+    rebuild_seat_maps(journeys)
+
+
+@receiver(post_delete, sender=Ticket)
+def ticket_deleted(sender, instance, **kwargs):
+    """Free the seat when a ticket or its whole order is cancelled"""
+    seat = getattr(instance, "_loaded_seat", instance.seat)
+    if not defer_release(seat[0], [seat[1:]], instance.order_id):
+        release_seats(seat[0], [seat[1:]])
+        Order.objects.filter(pk=instance.order_id).refresh_total()
+
+
+def _changes_timetable(sender, fields) -> bool:
+    if sender not in TIMETABLE_MODELS:
+        return False
+    return not (sender is Journey and fields and set(fields) <= SEAT_FIELDS)
+
+
+@receiver(post_save)
+def timetable_model_saved(sender, update_fields=None, **kwargs):
+    """Invalidate cached timetables and responses when the data changes"""
+    if _changes_timetable(sender, update_fields):
+        timetable_changed()
+    if sender in REFERENCE_MODELS:
+        bump_model_version(sender)
+
+
+@receiver(post_delete)
+def timetable_model_deleted(sender, **kwargs):
+    if _changes_timetable(sender, None):
+        timetable_changed()
+    if sender in REFERENCE_MODELS:
+        bump_model_version(sender)
+
+
+@receiver(bulk_changed)
+def timetable_model_bulk_changed(sender, fields, **kwargs):
+    if _changes_timetable(sender, fields):
+        timetable_changed()
+    if sender in REFERENCE_MODELS:
+        bump_model_version(sender)
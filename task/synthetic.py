@@ -0,0 +1,211 @@
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from task.models import (
+    Crew,
+    Journey,
+    Order,
+    Route,
+    Station,
+    Ticket,
+    Train,
+    TrainType,
+)
+from task.seats import SeatMap
+
+
+STATION_NAMES = (
+    "Kyiv", "Lviv", "Odesa", "Kharkiv", "Dnipro", "Vinnytsia", "Poltava",
+    "Chernihiv", "Zhytomyr", "Rivne", "Lutsk", "Ternopil", "Uzhhorod",
+    "Ivano-Frankivsk", "Chernivtsi", "Khmelnytskyi", "Sumy", "Cherkasy",
+    "Kropyvnytskyi", "Mykolaiv", "Kherson", "Zaporizhzhia", "Kremenchuk",
+)
+TRAIN_TYPES = ("Intercity", "Regional", "Night express")
+BATCH_SIZE = 1000
+
+
+def generate_network(
+        stations=100,
+        routes=300,
+        journeys_per_day=200,
+        days=7,
+        trains=50,
+        fill_rate=0.3,
+        users=50,
+        start=None,
+        seed=0,
+) -> dict:
+    """Fill the database with a random network of stations, routes and
+    journeys with tickets sold at fill_rate, using only bulk inserts.
+    Returns the number of rows created per model"""
+    randomizer = random.Random(seed)
+    start = start or datetime.combine(datetime.today(), datetime.min.time())
+    tag = uuid.uuid4().hex[:8]
+
+    with transaction.atomic():
+        train_types = [
+            TrainType.objects.get_or_create(type_name=type_name)[0]
+            for type_name in TRAIN_TYPES
+        ]
+        created_trains = Train.objects.bulk_create(
+            Train(
+                name=f"{randomizer.choice(TRAIN_TYPES)} {tag}-{number}",
+                cargo_num=randomizer.randint(5, 15),
+                places_in_cargo=randomizer.randint(30, 60),
+                kilometer_price=round(randomizer.uniform(0.5, 2.0), 2),
+                train_type=randomizer.choice(train_types),
+            )
+            for number in range(trains)
+        )
+        crew = Crew.objects.bulk_create(
+            Crew(first_name=f"Driver {number}", last_name=tag)
+            for number in range(trains * 2)
+        )
+        created_stations = Station.objects.bulk_create(
+            (
+                Station(
+                    name=f"{randomizer.choice(STATION_NAMES)} {number}",
+                    latitude=randomizer.uniform(44.5, 52.0),
+                    longitude=randomizer.uniform(22.5, 40.0),
+                    service_cost=round(randomizer.uniform(1, 5), 2),
+                )
+                for number in range(stations)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+        pairs = set()
+        max_routes = min(routes, stations * (stations - 1))
+        while len(pairs) < max_routes:
+            pairs.add(tuple(randomizer.sample(created_stations, 2)))
+        route_objects = []
+        for source, destination in pairs:
+            route = Route(source=source, destination=destination)
+            route.distance = route.calculate_distance()
+            route_objects.append(route)
+        created_routes = Route.objects.bulk_create(
+            route_objects, batch_size=BATCH_SIZE
+        )
+
+        password = make_password("benchmark")
+        passengers = get_user_model().objects.bulk_create(
+            get_user_model()(
+                email=f"passenger{number}.{tag}@example.com",
+                password=password,
+            )
+            for number in range(users)
+        )
+
+        counts = {"journeys": 0, "orders": 0, "tickets": 0}
+        for day in range(days):
+            created = _generate_day(
+                randomizer,
+                start + timedelta(days=day),
+                journeys_per_day,
+                created_routes,
+                created_trains,
+                crew,
+                passengers,
+                fill_rate,
+            )
+            for name, count in created.items():
+                counts[name] += count
+
+    return {
+        "stations": len(created_stations),
+        "routes": len(created_routes),
+        "trains": len(created_trains),
+        "crew": len(crew),
+        "users": len(passengers),
+        **counts,
+    }
+
+
+def _generate_day(
+        randomizer, day, count, routes, trains, crew, passengers, fill_rate
+) -> dict:
+    journeys = []
+    sold_seats = []
+    for _ in range(count):
+        route = randomizer.choice(routes)
+        train = randomizer.choice(trains)
+        departure_time = day + timedelta(
+            minutes=randomizer.randrange(24 * 60)
+        )
+        hours = route.distance / randomizer.uniform(80, 160) + 0.25
+        capacity = train.cargo_num * train.places_in_cargo
+        seats = randomizer.sample(range(capacity), int(capacity * fill_rate))
+        seat_map = SeatMap(b"", train.cargo_num, train.places_in_cargo)
+        seats = [
+            divmod(seat, train.places_in_cargo) for seat in seats
+        ]
+        seats = [(cargo + 1, place + 1) for cargo, place in seats]
+        for cargo_num, place_in_cargo in seats:
+            seat_map.take(cargo_num, place_in_cargo)
+
+        journeys.append(
+            Journey(
+                route=route,
+                train=train,
+                departure_time=departure_time,
+                arrival_time=departure_time + timedelta(hours=hours),
+                tickets_sold=len(seats),
+                seat_map=seat_map.to_bytes(),
+            )
+        )
+        sold_seats.append(seats)
+    journeys = Journey.objects.bulk_create(journeys, batch_size=BATCH_SIZE)
+
+    Journey.crew.through.objects.bulk_create(
+        (
+            Journey.crew.through(journey_id=journey.id, crew_id=member.id)
+            for journey in journeys
+            for member in randomizer.sample(crew, min(2, len(crew)))
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+    # Tickets of a journey are sold in orders of one to four seats
+    order_tickets = []
+    for journey, seats in zip(journeys, sold_seats):
+        while seats:
+            size = randomizer.randint(1, 4)
+            order_tickets.append((journey, seats[:size]))
+            seats = seats[size:]
+    if not passengers:
+        order_tickets = []
+
+    orders = Order.objects.bulk_create(
+        (
+            Order(
+                user=randomizer.choice(passengers),
+                total_price=round(journey.price_trip * len(seats), 2),
+            )
+            for journey, seats in order_tickets
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    tickets = Ticket.objects.bulk_create(
+        (
+            Ticket(
+                order=order,
+                journey=journey,
+                cargo_num=cargo_num,
+                place_in_cargo=place_in_cargo,
+                price=journey.price_trip,
+            )
+            for order, (journey, seats) in zip(orders, order_tickets)
+            for cargo_num, place_in_cargo in seats
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    return {
+        "journeys": len(journeys),
+        "orders": len(orders),
+        "tickets": len(tickets),
+    }
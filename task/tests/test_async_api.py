@@ -0,0 +1,300 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from task.models import Journey, Route, SeatHold, Station, Train, TrainType
+from task.synthetic import generate_network
+from task.throttling import throttle_store
+
+
+ASYNC_JOURNEY_URL = reverse("task:async-journey-list")
+ASYNC_STATION_URL = reverse("task:async-station-list")
+ASYNC_ORDER_URL = reverse("task:async-order-list")
+
+
+def sample_station(**params):
+    defaults = {
+        "name": "Sample station",
+        "latitude": 55.3,
+        "longitude": 20.3,
+        "service_cost": 2.3,
+    }
+    defaults.update(params)
+
+    return Station.objects.create(**defaults)
+
+
+def sample_train(**params):
+    train_type, _ = TrainType.objects.get_or_create(type_name="test_type")
+    defaults = {
+        "name": "Test train 215",
+        "cargo_num": 2,
+        "places_in_cargo": 3,
+        "kilometer_price": 1.2,
+        "train_type": train_type
+    }
+    defaults.update(params)
+
+    return Train.objects.create(**defaults)
+
+
+def sample_journey(**params):
+    defaults = {
+        "departure_time": "2024-01-12T00:00:00",
+        "arrival_time": "2024-01-13T00:00:00",
+        "route": Route.objects.create(
+            source=sample_station(name="Kiev", latitude=50.45),
+            destination=sample_station(name="Lviv", latitude=49.84),
+        ),
+        "train": sample_train(),
+    }
+    defaults.update(params)
+
+    return Journey.objects.create(**defaults)
+
+
+def async_detail_url(journey_id):
+    return reverse("task:async-journey-detail", args=[journey_id])
+
+
+def bearer(user):
+    return f"Bearer {RefreshToken.for_user(user).access_token}"
+
+
+class AsyncApiTests(TestCase):
+    def setUp(self):
+        # Throttle history of the many requests must not reach other tests
+        self.addCleanup(throttle_store().clear)
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpassword"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.journeys = [
+            sample_journey(departure_time=f"2024-01-{day}T00:00:00")
+            for day in range(10, 15)
+        ]
+
+    def async_request(self, method, path, *args, **headers):
+        async def request():
+            return await getattr(self.async_client, method)(
+                path, *args, **headers
+            )
+
+        return async_to_sync(request)()
+
+    def async_get(self, path, authorization=None, **params):
+        return self.async_request(
+            "get",
+            path,
+            params,
+            authorization=authorization or bearer(self.user),
+        )
+
+    def assertSameAsSync(self, async_path, sync_path, **params):
+        async_res = self.async_get(async_path, **params)
+        sync_res = self.client.get(sync_path, params)
+
+        self.assertEqual(async_res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            async_res.content.decode().replace("/async", ""),
+            sync_res.content.decode(),
+        )
+
+    def create_order(self, *seats):
+        return self.client.post(
+            reverse("task:order-list"),
+            {
+                "tickets": [
+                    {
+                        "journey": journey.id,
+                        "cargo_num": cargo_num,
+                        "place_in_cargo": place_in_cargo,
+                    }
+                    for journey, cargo_num, place_in_cargo in seats
+                ]
+            },
+            format="json",
+        )
+
+    def test_journey_list_same_as_sync(self):
+        self.assertSameAsSync(ASYNC_JOURNEY_URL, reverse("task:journey-list"))
+
+    def test_journey_list_filters_same_as_sync(self):
+        for params in (
+            {"page": 2},
+            {"pagination": "cursor", "page_size": 2},
+            {"departure_date": "2024-01-11,2024-01-13"},
+            {"source_station": "ki", "ordering": "-price_trip"},
+            {"min_price": 0, "max_price": 10000},
+        ):
+            with self.subTest(params=params):
+                self.assertSameAsSync(
+                    ASYNC_JOURNEY_URL, reverse("task:journey-list"), **params
+                )
+
+    def test_journey_list_cursor_follows_pages(self):
+        res = self.async_get(ASYNC_JOURNEY_URL, pagination="cursor")
+
+        next_page = self.async_get(json.loads(res.content)["next"])
+
+        ids = [
+            journey["id"]
+            for page in (res, next_page)
+            for journey in json.loads(page.content)["results"]
+        ]
+        self.assertEqual(
+            ids, [journey.id for journey in self.journeys[::-1][:4]]
+        )
+
+    def test_journey_list_invalid_page(self):
+        res = self.async_get(ASYNC_JOURNEY_URL, page=99)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(json.loads(res.content), {"detail": "Invalid page."})
+
+    def test_journey_list_invalid_date(self):
+        res = self.async_get(ASYNC_JOURNEY_URL, departure_date="12.01.2024")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("departure_date", json.loads(res.content))
+
+    def test_journey_list_cursor_rejects_ordering(self):
+        res = self.async_get(
+            ASYNC_JOURNEY_URL, pagination="cursor", ordering="price_trip"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("ordering", json.loads(res.content))
+
+    def test_journey_list_leaves_expired_holds(self):
+        journey = self.journeys[0]
+        self.client.post(
+            reverse("task:seathold-list"),
+            {"journey": journey.id, "seats": [{"cargo_num": 1,
+                                               "place_in_cargo": 1}]},
+            format="json",
+        )
+        SeatHold.objects.update(expires_at=timezone.now() - timedelta(1))
+
+        self.async_get(ASYNC_JOURNEY_URL)
+
+        # Released by the release_expired_holds command
+        journey.refresh_from_db()
+        self.assertTrue(SeatHold.objects.exists())
+        self.assertEqual(journey.tickets_held, 1)
+
+    def test_journey_detail_same_as_sync(self):
+        journey = self.journeys[0]
+
+        self.assertSameAsSync(
+            async_detail_url(journey.id),
+            reverse("task:journey-detail", args=[journey.id]),
+        )
+
+    def test_journey_detail_not_found(self):
+        res = self.async_get(async_detail_url(0))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_station_list_same_as_sync(self):
+        self.assertSameAsSync(ASYNC_STATION_URL, reverse("task:station-list"))
+
+    def test_order_list_same_as_sync(self):
+        self.create_order((self.journeys[0], 1, 1), (self.journeys[1], 1, 2))
+        self.create_order((self.journeys[2], 2, 3))
+
+        self.assertSameAsSync(ASYNC_ORDER_URL, reverse("task:order-list"))
+
+    def test_order_list_only_own_orders(self):
+        self.create_order((self.journeys[0], 1, 1))
+        other = get_user_model().objects.create_user(
+            "other@test.com", "testpassword"
+        )
+
+        res = self.async_get(ASYNC_ORDER_URL, authorization=bearer(other))
+
+        self.assertEqual(json.loads(res.content)["results"], [])
+
+    def test_auth_required(self):
+        res = self.async_request("get", ASYNC_ORDER_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res.headers["WWW-Authenticate"], 'Bearer realm="api"')
+
+    def test_invalid_token(self):
+        res = self.async_get(ASYNC_JOURNEY_URL, authorization="Bearer bad")
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(json.loads(res.content)["code"], "token_not_valid")
+
+    def test_inactive_user(self):
+        authorization = bearer(self.user)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.async_get(ASYNC_JOURNEY_URL, authorization=authorization)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_only_get_allowed(self):
+        admin = get_user_model().objects.create_superuser(
+            "admin@test.com", "testpassword"
+        )
+
+        res = self.async_request(
+            "post",
+            ASYNC_JOURNEY_URL,
+            {},
+            content_type="application/json",
+            authorization=bearer(admin),
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class BenchmarkAsyncTests(TransactionTestCase):
+    def test_benchmark_async(self):
+        generate_network(
+            stations=5, routes=5, journeys_per_day=3, days=1, trains=2
+        )
+        output = os.path.join(tempfile.mkdtemp(), "benchmark_async.json")
+
+        call_command(
+            "benchmark_async",
+            concurrency=2,
+            requests=4,
+            output=output,
+            stdout=StringIO(),
+        )
+
+        with open(output) as report_file:
+            report = json.load(report_file)
+        self.assertEqual(
+            {(result["name"], result["stack"]) for result in report["results"]},
+            {
+                (name, stack)
+                for name in (
+                    "journey list",
+                    "journey detail",
+                    "station list",
+                    "order list",
+                )
+                for stack in ("wsgi", "asgi")
+            },
+        )
+        for result in report["results"]:
+            self.assertEqual(result["statuses"], {"200": 4}, result)
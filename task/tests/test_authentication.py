@@ -0,0 +1,100 @@
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from task.async_views import AsyncJWTAuthentication
+from task.throttling import throttle_store
+from user.authentication import CachedJWTAuthentication, user_cache
+
+ME_URL = reverse("user:manage")
+STATION_URL = reverse("task:station-list")
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.addCleanup(throttle_store().clear)
+        self.addCleanup(user_cache.clear)
+        self.user = get_user_model().objects.create_user(
+            "test@test.com", "testpassword", is_staff=True
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+
+    def user_queries(self, method="get", url=ME_URL, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            res = getattr(self.client, method)(url, data)
+        return res, sum(
+            '"user_user"' in query["sql"]
+            and query["sql"].startswith("SELECT")
+            for query in queries
+        )
+
+    def test_user_read_once(self):
+        res, first = self.user_queries()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res, second = self.user_queries()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual((first, second), (1, 0))
+
+    def test_password_change_read_again(self):
+        self.user_queries()
+
+        res = self.client.patch(ME_URL, {"password": "newpassword"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.user_queries()[1], 1)
+
+    def test_deactivated_user_rejected(self):
+        self.user_queries()
+
+        self.user.is_active = False
+        self.user.save()
+
+        res, _ = self.user_queries()
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_lost_staff_status_applies(self):
+        res, _ = self.user_queries("post", STATION_URL, {})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.user.is_staff = False
+        self.user.save()
+
+        res, _ = self.user_queries("post", STATION_URL, {})
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(AUTH_USER_CACHE_TIMEOUT=0)
+    def test_expired_user_read_again(self):
+        self.user_queries()
+
+        self.assertEqual(self.user_queries()[1], 1)
+
+    def test_user_loaded_before_change_not_cached(self):
+        token = AccessToken.for_user(self.user)
+        generation = user_cache.generation
+        user = get_user_model().objects.get(pk=self.user.pk)
+        self.user.save()
+
+        user_cache.set(self.user.pk, user, generation)
+
+        self.assertIsNone(user_cache.get(self.user.pk))
+        CachedJWTAuthentication().get_user(token)
+        self.assertIsNotNone(user_cache.get(self.user.pk))
+
+    def test_async_authentication_uses_cache(self):
+        token = AccessToken.for_user(self.user)
+        CachedJWTAuthentication().get_user(token)
+
+        with self.assertNumQueries(0):
+            user = async_to_sync(AsyncJWTAuthentication().aget_user)(token)
+
+        self.assertEqual(user, self.user)
@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import Count
+from django.test import TestCase
+
+from task.models import Journey, Route, Station, Ticket
+from task.seats import SeatMap
+from task.synthetic import generate_network
+
+
+class GenerateNetworkTests(TestCase):
+    def test_generate_network(self):
+        created = generate_network(
+            stations=10,
+            routes=20,
+            journeys_per_day=5,
+            days=2,
+            trains=3,
+            fill_rate=0.5,
+            users=4,
+        )
+
+        self.assertEqual(created["stations"], Station.objects.count())
+        self.assertEqual(Route.objects.count(), 20)
+        self.assertEqual(Journey.objects.count(), 10)
+        self.assertEqual(created["tickets"], Ticket.objects.count())
+        for journey in Journey.objects.select_related("train").annotate(
+            tickets_count=Count("tickets")
+        ):
+            seat_map = SeatMap.for_journey(journey)
+            capacity = seat_map.cargo_num * seat_map.places_in_cargo
+            free_places = sum(
+                len(cargo["free_places"]) for cargo in seat_map.cargos()
+            )
+            self.assertEqual(journey.tickets_sold, journey.tickets_count)
+            self.assertEqual(journey.tickets_sold, capacity // 2)
+            self.assertEqual(free_places, capacity - journey.tickets_sold)
+
+    def test_reconcile_seats_finds_no_drift(self):
+        generate_network(
+            stations=5, routes=5, journeys_per_day=3, days=1, trains=2
+        )
+        out = StringIO()
+
+        call_command("reconcile_seats", dry_run=True, stdout=out)
+
+        self.assertIn("0 journeys", out.getvalue())
+
+
+class BenchmarkEndpointsTests(TestCase):
+    def test_benchmark_endpoints(self):
+        output = os.path.join(tempfile.mkdtemp(), "benchmark.json")
+
+        call_command(
+            "benchmark_endpoints",
+            stations=5,
+            routes=10,
+            journeys_per_day=5,
+            days=2,
+            trains=2,
+            users=2,
+            repeat=1,
+            output=output,
+            stdout=StringIO(),
+        )
+
+        with open(output) as report_file:
+            report = json.load(report_file)
+        self.assertEqual(report["network"]["created"]["journeys"], 10)
+        self.assertFalse(Journey.objects.exists())
+        for result in report["endpoints"]:
+            self.assertLess(result["status"], 300, result["name"])
+            self.assertLessEqual(result["p50_ms"], result["p95_ms"])
+        self.assertEqual(
+            {result["name"].split()[0] for result in report["endpoints"]},
+            {
+                "train_type",
+                "train",
+                "crew",
+                "station",
+                "route",
+                "journey",
+                "order",
+                "hold",
+                "user",
+            },
+        )
@@ -0,0 +1,295 @@
+from datetime import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from task.admin import JourneyAdminForm
+from task.conflicts import find_overlaps, journey_conflicts
+from task.models import Crew, Journey
+from task.query_budget import assert_query_budget
+from task.throttling import throttle_store
+from task.tests.test_timetable_template import sample_route, sample_train
+
+JOURNEY_URL = reverse("task:journey-list")
+
+
+def detail_url(journey_id):
+    return reverse("task:journey-detail", args=[journey_id])
+
+
+def at(hour, day=1):
+    return datetime(2024, 3, day, hour)
+
+
+class FindOverlapsTests(SimpleTestCase):
+    def test_overlapping_pairs(self):
+        intervals = [
+            (0, 10, "a"),
+            (2, 4, "b"),
+            (3, 12, "c"),
+            (10, 11, "d"),
+            (12, 13, "e"),
+        ]
+
+        self.assertEqual(
+            sorted(find_overlaps(intervals)),
+            [("a", "b"), ("a", "c"), ("b", "c"), ("c", "d")],
+        )
+
+    def test_touching_intervals_do_not_overlap(self):
+        self.assertEqual(
+            list(find_overlaps([(0, 2, "a"), (2, 4, "b"), (4, 6, "c")])), []
+        )
+
+
+class JourneyConflictsTests(TestCase):
+    def setUp(self):
+        self.route = sample_route()
+        self.train = sample_train()
+        self.other_train = sample_train(name="Regional")
+        self.driver = Crew.objects.create(first_name="Ivan", last_name="Sirko")
+        self.guard = Crew.objects.create(first_name="Olena", last_name="Pchilka")
+        self.morning = self.journey(at(6), at(10), self.train, [self.driver])
+        self.evening = self.journey(
+            at(18), at(22), self.other_train, [self.driver, self.guard]
+        )
+
+    def journey(self, departure_time, arrival_time, train, crew):
+        journey = Journey.objects.create(
+            route=self.route,
+            train=train,
+            departure_time=departure_time,
+            arrival_time=arrival_time,
+        )
+        journey.crew.set(crew)
+        return journey
+
+    def test_free_slot(self):
+        self.assertEqual(
+            journey_conflicts(
+                at(10), at(18), self.train.id, [self.driver.id, self.guard.id]
+            ),
+            {"train": [], "crew": {}},
+        )
+
+    def test_journey_running_before_and_during(self):
+        conflicts = journey_conflicts(
+            at(8), at(19), self.train.id, [self.driver.id, self.guard.id]
+        )
+
+        self.assertEqual(conflicts["train"], [self.morning.id])
+        self.assertEqual(
+            conflicts["crew"],
+            {
+                self.driver.id: [self.morning.id, self.evening.id],
+                self.guard.id: [self.evening.id],
+            },
+        )
+
+    def test_journey_does_not_conflict_with_itself(self):
+        self.assertEqual(
+            journey_conflicts(
+                at(7), at(11), self.train.id, [self.driver.id],
+                self.morning.id,
+            ),
+            {"train": [], "crew": {}},
+        )
+
+
+class JourneyScheduleApiTests(TestCase):
+    def setUp(self):
+        # Throttle history of the many requests must not reach other tests
+        self.addCleanup(throttle_store().clear)
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser(
+                "admin@test.com", "testpassword"
+            )
+        )
+        self.driver = Crew.objects.create(first_name="Ivan", last_name="Sirko")
+        self.payload = {
+            "route": sample_route().id,
+            "train": sample_train().id,
+            "departure_time": "2024-03-01T06:00",
+            "arrival_time": "2024-03-01T10:00",
+            "crew": [self.driver.id],
+        }
+        res = self.client.post(JOURNEY_URL, self.payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.journey_id = res.data["id"]
+
+    def test_create_overlapping_journey_rejected(self):
+        res = assert_query_budget(
+            self.client,
+            "post",
+            JOURNEY_URL,
+            {
+                **self.payload,
+                "departure_time": "2024-03-01T09:00",
+                "arrival_time": "2024-03-01T12:00",
+            },
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data["train"],
+            [f"The train is on overlapping journeys {self.journey_id}."],
+        )
+        self.assertEqual(
+            res.data["crew"],
+            [f"Ivan Sirko is on overlapping journeys {self.journey_id}."],
+        )
+        self.assertEqual(Journey.objects.count(), 1)
+
+    def test_create_back_to_back_journey(self):
+        res = assert_query_budget(
+            self.client,
+            "post",
+            JOURNEY_URL,
+            {
+                **self.payload,
+                "departure_time": "2024-03-01T10:00",
+                "arrival_time": "2024-03-01T14:00",
+            },
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_arrival_must_follow_departure(self):
+        res = self.client.post(
+            JOURNEY_URL,
+            {
+                **self.payload,
+                "departure_time": "2024-03-02T10:00",
+                "arrival_time": "2024-03-02T10:00",
+            },
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("arrival_time", res.data)
+
+    def test_update_into_overlap_rejected(self):
+        guard = Crew.objects.create(first_name="Olena", last_name="Pchilka")
+        other = self.client.post(
+            JOURNEY_URL,
+            {
+                **self.payload,
+                "departure_time": "2024-03-01T12:00",
+                "arrival_time": "2024-03-01T14:00",
+                "crew": [guard.id],
+            },
+            format="json",
+        )
+
+        res = assert_query_budget(
+            self.client,
+            "patch",
+            detail_url(other.data["id"]),
+            {"departure_time": "2024-03-01T08:00"},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(res.data), ["train"])
+
+        res = assert_query_budget(
+            self.client,
+            "patch",
+            detail_url(other.data["id"]),
+            {"crew": [self.driver.id]},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_update_journey_within_its_own_slot(self):
+        res = assert_query_budget(
+            self.client,
+            "put",
+            detail_url(self.journey_id),
+            {**self.payload, "arrival_time": "2024-03-01T11:00"},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class JourneyAdminFormTests(TestCase):
+    def test_overlapping_journey_rejected(self):
+        train = sample_train()
+        driver = Crew.objects.create(first_name="Ivan", last_name="Sirko")
+        journey = Journey.objects.create(
+            route=sample_route(),
+            train=train,
+            departure_time=at(6),
+            arrival_time=at(10),
+        )
+        journey.crew.add(driver)
+        data = {
+            "route": journey.route_id,
+            "train": train.id,
+            "departure_time": "2024-03-01 08:00:00",
+            "arrival_time": "2024-03-01 12:00:00",
+            "crew": [driver.id],
+        }
+
+        form = JourneyAdminForm(data)
+
+        self.assertFalse(form.is_valid())
+        self.assertIn("train", form.errors)
+        self.assertIn("crew", form.errors)
+
+        form = JourneyAdminForm(data, instance=journey)
+
+        self.assertTrue(form.is_valid(), form.errors)
+
+
+class AuditConflictsCommandTests(TestCase):
+    def test_reports_overlaps(self):
+        route = sample_route()
+        train = sample_train()
+        driver = Crew.objects.create(first_name="Ivan", last_name="Sirko")
+        # Bulk created journeys skip the validation
+        first, second, third = Journey.objects.bulk_create(
+            Journey(
+                route=route,
+                train=train,
+                departure_time=departure_time,
+                arrival_time=arrival_time,
+            )
+            for departure_time, arrival_time in (
+                (at(6), at(10)),
+                (at(9), at(12)),
+                (at(12), at(14)),
+            )
+        )
+        first.crew.add(driver)
+        third.crew.add(driver)
+
+        out = StringIO()
+        call_command("audit_conflicts", stdout=out)
+
+        self.assertIn(
+            f"train Intercity: journey {first.id} 2024-03-01 06:00 - "
+            f"2024-03-01 10:00 overlaps journey {second.id} "
+            "2024-03-01 09:00 - 2024-03-01 12:00",
+            out.getvalue(),
+        )
+        self.assertIn("1 train overlaps, 0 crew overlaps", out.getvalue())
+
+        with self.assertRaisesMessage(CommandError, "1 train overlaps"):
+            call_command("audit_conflicts", check=True, stdout=StringIO())
+
+    def test_clean_timetable(self):
+        out = StringIO()
+        call_command("audit_conflicts", check=True, stdout=out)
+
+        self.assertIn("0 train overlaps, 0 crew overlaps", out.getvalue())
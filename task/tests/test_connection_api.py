@@ -0,0 +1,250 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+from rest_framework import status
+from task.models import (
+    Station,
+    Route,
+    Journey,
+    TrainType,
+    Train,
+)
+from task.planner import ConnectionPlanner, Timetable
+
+
+CONNECTIONS_URL = reverse("task:journey-connections")
+
+
+def sample_station(**params):
+    defaults = {
+        "name": "Sample station",
+        "latitude": 55.3,
+        "longitude": 20.3,
+        "service_cost": 2.3,
+    }
+    defaults.update(params)
+
+    return Station.objects.create(**defaults)
+
+
+def sample_train(**params):
+    train_type, _ = TrainType.objects.get_or_create(type_name="test_type")
+    defaults = {
+        "name": "Test train 215",
+        "cargo_num": 23,
+        "places_in_cargo": 36,
+        "kilometer_price": 1.2,
+        "train_type": train_type
+    }
+    defaults.update(params)
+
+    return Train.objects.create(**defaults)
+
+
+def sample_journey(source, destination, departure_time, hours, **params):
+    route, _ = Route.objects.get_or_create(
+        source=source, destination=destination
+    )
+    departure_time = datetime.fromisoformat(departure_time)
+    defaults = {
+        "departure_time": departure_time,
+        "arrival_time": departure_time + timedelta(hours=hours),
+        "route": route,
+        "train": sample_train(),
+    }
+    defaults.update(params)
+
+    return Journey.objects.create(**defaults)
+
+
+class UnauthenticatedConnectionApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        res = self.client.get(CONNECTIONS_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AuthenticatedConnectionApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpassword"
+        )
+        self.client.force_authenticate(self.user)
+
+        self.kiev = sample_station(name="Kiev", latitude=50.45, longitude=30.52)
+        self.vinnytsia = sample_station(
+            name="Vinnytsia", latitude=49.23, longitude=28.47
+        )
+        self.lviv = sample_station(name="Lviv", latitude=49.84, longitude=24.02)
+
+        self.first_leg = sample_journey(
+            self.kiev, self.vinnytsia, "2024-01-12T08:00:00", 3
+        )
+        self.second_leg = sample_journey(
+            self.vinnytsia, self.lviv, "2024-01-12T11:30:00", 4
+        )
+        self.tight_leg = sample_journey(
+            self.vinnytsia, self.lviv, "2024-01-12T11:05:00", 3
+        )
+        self.direct = sample_journey(
+            self.kiev,
+            self.lviv,
+            "2024-01-12T09:00:00",
+            10,
+            train=sample_train(kilometer_price=0.5),
+        )
+
+    def search(self, **params):
+        query = {
+            "source": self.kiev.id,
+            "destination": self.lviv.id,
+            "departure_time": "2024-01-12T07:00:00",
+        }
+        query.update(params)
+        return self.client.get(CONNECTIONS_URL, query)
+
+    def journeys(self, itinerary):
+        return [leg["journey"] for leg in itinerary["legs"]]
+
+    def test_earliest_arrival(self):
+        res = self.search()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.journeys(res.data[0]),
+            [self.first_leg.id, self.second_leg.id]
+        )
+        self.assertEqual(res.data[0]["transfers"], 1)
+        self.assertEqual(self.journeys(res.data[1]), [self.direct.id])
+
+    def test_min_transfer_time(self):
+        res = self.search(min_transfer=0)
+
+        self.assertEqual(
+            self.journeys(res.data[0]),
+            [self.first_leg.id, self.tight_leg.id]
+        )
+
+    def test_fewest_transfers(self):
+        res = self.search(optimize="transfers")
+
+        self.assertEqual(self.journeys(res.data[0]), [self.direct.id])
+
+    def test_cheapest(self):
+        res = self.search(optimize="price", limit=1)
+
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(self.journeys(res.data[0]), [self.direct.id])
+        self.assertEqual(
+            res.data[0]["price_trip"],
+            Journey.objects.get(pk=self.direct.id).price_trip
+        )
+
+    def test_max_transfers(self):
+        res = self.search(max_transfers=0)
+
+        self.assertEqual(
+            [self.journeys(itinerary) for itinerary in res.data],
+            [[self.direct.id]]
+        )
+
+    def test_same_source_and_destination(self):
+        res = self.search(destination=self.kiev.id)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConnectionPlannerTests(TestCase):
+    def test_label_out_of_transfers_does_not_settle_station(self):
+        start = datetime(2024, 1, 12)
+
+        def journey(journey_id, source, destination, departure, arrival):
+            return (
+                journey_id,
+                source,
+                destination,
+                start + timedelta(hours=departure),
+                start + timedelta(hours=arrival),
+                10.0,
+                100.0,
+                1.2,
+            )
+
+        # 1 -> 2 -> 3 -> 4 reaches 4 first with no transfers left,
+        # the later direct 1 -> 4 goes on to 5
+        planner = ConnectionPlanner(
+            Timetable(
+                [
+                    journey(1, 1, 2, 8, 9),
+                    journey(2, 2, 3, 9.5, 10),
+                    journey(3, 3, 4, 10.5, 11),
+                    journey(4, 1, 4, 8, 12),
+                    journey(5, 4, 5, 13, 14),
+                ],
+                [(station_id, 50.0, 30.0) for station_id in range(1, 6)],
+            ),
+            max_transfers=2,
+        )
+
+        for limit in (1, 3):
+            with self.subTest(limit=limit):
+                itineraries = planner.search(1, 5, start, limit=limit)
+
+                self.assertEqual(
+                    [
+                        [leg["journey"] for leg in itinerary["legs"]]
+                        for itinerary in itineraries
+                    ],
+                    [[4, 5]],
+                )
+
+    def test_large_timetable_search(self):
+        randomizer = random.Random(0)
+        stations = [
+            (
+                station_id,
+                randomizer.uniform(44, 52),
+                randomizer.uniform(22, 40),
+            )
+            for station_id in range(200)
+        ]
+        start = datetime(2024, 1, 12)
+        journeys = []
+        for journey_id in range(30000):
+            source, destination = randomizer.sample(range(200), 2)
+            departure_time = start + timedelta(
+                minutes=randomizer.randrange(0, 3 * 24 * 60)
+            )
+            journeys.append(
+                (
+                    journey_id,
+                    source,
+                    destination,
+                    departure_time,
+                    departure_time + timedelta(
+                        minutes=randomizer.randrange(30, 600)
+                    ),
+                    randomizer.uniform(10, 500),
+                    randomizer.uniform(50, 800),
+                    1.2,
+                )
+            )
+        planner = ConnectionPlanner(Timetable(journeys, stations))
+
+        started = time.perf_counter()
+        itineraries = planner.search(0, 199, start, limit=3)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(len(itineraries), 3)
+        arrivals = [itinerary["arrival_time"] for itinerary in itineraries]
+        self.assertEqual(arrivals, sorted(arrivals))
+        self.assertLess(elapsed, 1)
@@ -0,0 +1,240 @@
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from task.images import UPLOAD_DIR, save_upload, variant_formats
+from task.models import Crew
+from task.throttling import throttle_store
+
+CREW_URL = reverse("task:crew-list")
+
+
+def image_upload_url(crew_id):
+    return reverse("task:crew-upload-image", args=[crew_id])
+
+
+def image_bytes(size=(2000, 1000), image_format="JPEG", orientation=None):
+    image = Image.new("RGB", size, "red")
+    exif = Image.Exif()
+    exif[0x010F] = "Camera maker"
+    if orientation:
+        exif[0x0112] = orientation
+    content = BytesIO()
+    image.save(content, image_format, exif=exif)
+    return content.getvalue()
+
+
+class CrewImageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, CREW_IMAGE_WORKERS=0
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(throttle_store().clear)
+
+        self.admin = get_user_model().objects.create_superuser(
+            "admin@test.com", "testpassword"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.crew = Crew.objects.create(first_name="Ivan", last_name="Petrenko")
+
+    def upload(self, content, name="photo.jpg"):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                image_upload_url(self.crew.id),
+                {"image": SimpleUploadedFile(name, content)},
+                format="multipart",
+            )
+        self.crew.refresh_from_db()
+        return res
+
+    def test_upload_image(self):
+        res = self.upload(image_bytes(orientation=6))
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data["image_status"], "processing")
+        self.assertNotIn("image", res.data)
+        self.assertEqual(self.crew.image_status, "ready")
+        self.assertEqual(self.crew.image_upload, "")
+        self.assertEqual(default_storage.listdir(UPLOAD_DIR)[1], [])
+
+        with Image.open(self.crew.image.path) as image:
+            # Turned upright, downscaled and without metadata
+            self.assertEqual(image.size, (512, 1024))
+            self.assertEqual(image.format, "JPEG")
+            self.assertEqual(len(image.getexif()), 0)
+        with Image.open(self.crew.thumbnail.path) as image:
+            self.assertEqual(image.size, (80, 160))
+        if "WEBP" in variant_formats():
+            with Image.open(self.crew.thumbnail_webp.path) as image:
+                self.assertEqual(image.format, "WEBP")
+        else:
+            self.assertFalse(self.crew.image_webp)
+
+    def test_serializers_show_variants(self):
+        self.upload(image_bytes())
+
+        detail = self.client.get(reverse("task:crew-detail",
+                                         args=[self.crew.id]))
+        listing = self.client.get(CREW_URL)
+
+        self.assertTrue(detail.data["image"].endswith(".jpg"))
+        self.assertIn("-thumbnail.jpg", detail.data["thumbnail"])
+        self.assertEqual(detail.data["image_status"], "ready")
+        self.assertEqual(
+            listing.data[0]["thumbnail"], detail.data["thumbnail"]
+        )
+        self.assertNotIn("image", listing.data[0])
+
+    def test_new_upload_replaces_variants(self):
+        self.upload(image_bytes())
+        old_names = [self.crew.image.name, self.crew.thumbnail.name]
+
+        self.upload(image_bytes(size=(100, 50)), name="photo.png")
+
+        self.assertNotIn(self.crew.image.name, old_names)
+        self.assertFalse(any(map(default_storage.exists, old_names)))
+        with Image.open(self.crew.image.path) as image:
+            self.assertEqual(image.size, (100, 50))
+
+    def test_invalid_image_rejected(self):
+        res = self.upload(b"not an image")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.crew.image_status, "")
+
+    @override_settings(CREW_IMAGE_MAX_BYTES=1000)
+    def test_too_large_file_rejected(self):
+        res = self.upload(image_bytes())
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(CREW_IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels_fail(self):
+        self.upload(image_bytes())
+        old_image = self.crew.image.name
+
+        res = self.upload(image_bytes())
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.crew.image_status, "failed")
+        self.assertEqual(self.crew.image.name, old_image)
+        self.assertEqual(default_storage.listdir(UPLOAD_DIR)[1], [])
+
+    def test_superseded_upload_skipped(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(
+                image_upload_url(self.crew.id),
+                {"image": SimpleUploadedFile("a.jpg", image_bytes())},
+                format="multipart",
+            )
+        self.upload(image_bytes(size=(300, 200)))
+        name = self.crew.image.name
+
+        callbacks[0]()
+
+        self.crew.refresh_from_db()
+        self.assertEqual(self.crew.image.name, name)
+        self.assertEqual(default_storage.listdir(UPLOAD_DIR)[1], [])
+
+    def test_process_stored_images(self):
+        self.crew.image.save("old.jpg", ContentFile(image_bytes()))
+
+        out = StringIO()
+        call_command("process_crew_images", stdout=out)
+
+        self.crew.refresh_from_db()
+        self.assertIn("1 images processed", out.getvalue())
+        self.assertEqual(self.crew.image_status, "ready")
+        self.assertTrue(self.crew.thumbnail)
+
+    def stuck_upload(self, member, minutes):
+        """Upload left processing by a worker that stopped"""
+        member.image_upload = save_upload(
+            SimpleUploadedFile("photo.jpg", image_bytes())
+        )
+        member.image_uploaded_at = timezone.now() - timedelta(minutes=minutes)
+        member.image_status = Crew.ImageStatus.PROCESSING
+        member.save()
+
+    def test_process_stale_uploads(self):
+        recent = Crew.objects.create(first_name="Olena", last_name="Pchilka")
+        self.stuck_upload(self.crew, minutes=60)
+        self.stuck_upload(recent, minutes=5)
+
+        out = StringIO()
+        call_command("process_crew_images", stale_minutes=30, stdout=out)
+
+        self.crew.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertIn("1 images processed, 0 failed", out.getvalue())
+        self.assertEqual(self.crew.image_status, "ready")
+        self.assertEqual(self.crew.image_upload, "")
+        self.assertTrue(self.crew.thumbnail)
+        self.assertEqual(recent.image_status, "processing")
+        self.assertEqual(
+            default_storage.listdir(UPLOAD_DIR)[1],
+            [recent.image_upload.rsplit("/", 1)[1]],
+        )
+
+    def test_stale_upload_missing_fails(self):
+        self.stuck_upload(self.crew, minutes=60)
+        default_storage.delete(self.crew.image_upload)
+
+        out = StringIO()
+        with self.assertLogs("task.management.commands", "ERROR"):
+            call_command("process_crew_images", stdout=out)
+
+        self.crew.refresh_from_db()
+        self.assertIn("0 images processed, 1 failed", out.getvalue())
+        self.assertEqual(self.crew.image_status, "failed")
+        self.assertEqual(self.crew.image_upload, "")
+
+
+class CrewImagePoolTests(TransactionTestCase):
+    def test_upload_processed_by_pool(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.addCleanup(throttle_store().clear)
+        admin = get_user_model().objects.create_superuser(
+            "admin@test.com", "testpassword"
+        )
+        crew = Crew.objects.create(first_name="Ivan", last_name="Petrenko")
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        with override_settings(MEDIA_ROOT=media_root):
+            res = client.post(
+                image_upload_url(crew.id),
+                {"image": SimpleUploadedFile("photo.jpg", image_bytes())},
+                format="multipart",
+            )
+            self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline:
+                crew.refresh_from_db()
+                if crew.image_status != "processing":
+                    break
+                time.sleep(0.05)
+
+        self.assertEqual(crew.image_status, "ready")
+        self.assertTrue(crew.thumbnail)
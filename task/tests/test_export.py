@@ -0,0 +1,245 @@
+import csv
+import functools
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection
+from django.test import TestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from task.export import CSV_COLUMNS, order_chunks
+from task.models import Journey, Order, Route, Station, Ticket, Train, TrainType
+from task.throttling import throttle_store
+
+EXPORT_URL = reverse("task:order-export")
+
+
+def sample_journey():
+    train_type, _ = TrainType.objects.get_or_create(type_name="test_type")
+    return Journey.objects.create(
+        departure_time="2024-01-12T08:00:00",
+        arrival_time="2024-01-12T14:00:00",
+        route=Route.objects.create(
+            source=Station.objects.create(
+                name="Kiev", latitude=50.45, longitude=30.52, service_cost=2
+            ),
+            destination=Station.objects.create(
+                name="Lviv", latitude=49.84, longitude=24.03, service_cost=1
+            ),
+        ),
+        train=Train.objects.create(
+            name="Intercity",
+            cargo_num=2,
+            places_in_cargo=10,
+            kilometer_price=1.2,
+            train_type=train_type,
+        ),
+    )
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        # Throttle history of the many requests must not reach other tests
+        self.addCleanup(throttle_store().clear)
+        self.admin = get_user_model().objects.create_superuser(
+            "admin@test.com", "testpassword"
+        )
+        self.user = get_user_model().objects.create_user(
+            "test@test.com", "testpassword"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.journey = sample_journey()
+        self.orders = [
+            Order.objects.create(user=user) for user in (self.user, self.admin)
+        ]
+        for order, seats in zip(self.orders, ([(1, 1), (1, 2)], [(2, 5)])):
+            for cargo_num, place_in_cargo in seats:
+                Ticket.objects.create(
+                    order=order,
+                    journey=self.journey,
+                    cargo_num=cargo_num,
+                    place_in_cargo=place_in_cargo,
+                )
+        self.empty_order = Order.objects.create(user=self.user)
+
+    def asgi_export(self, query_string=b""):
+        """Start message and whole body of the export served by the ASGI
+        handler, which iterates streamed content on the event loop"""
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": EXPORT_URL,
+            "raw_path": EXPORT_URL.encode(),
+            "root_path": "",
+            "query_string": query_string,
+            "headers": [
+                (
+                    b"authorization",
+                    f"Bearer {AccessToken.for_user(self.admin)}".encode(),
+                ),
+            ],
+            "server": ("testserver", 80),
+            "client": ("127.0.0.1", 50000),
+        }
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        # The data of the test lives in its transaction, keep the connection
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+        async_to_sync(ASGIHandler())(scope, receive, send)
+
+        return messages[0], b"".join(
+            message.get("body", b"") for message in messages[1:]
+        ).decode()
+
+    def export(self, **params):
+        res = self.client.get(EXPORT_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res, b"".join(res.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        res, content = self.export()
+
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        orders = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [(order["id"], order["user"]) for order in orders],
+            [
+                (self.orders[0].id, "test@test.com"),
+                (self.orders[1].id, "admin@test.com"),
+                (self.empty_order.id, "test@test.com"),
+            ],
+        )
+        price = self.journey.price_trip
+        self.assertEqual(orders[0]["total_price"], round(price * 2, 2))
+        self.assertEqual(
+            orders[0]["tickets"][1],
+            {
+                "id": self.orders[0].tickets.order_by("id").last().id,
+                "journey": self.journey.id,
+                "departure_time": "2024-01-12T08:00:00",
+                "arrival_time": "2024-01-12T14:00:00",
+                "train": "Intercity",
+                "route": "Source:Kiev destination:Lviv",
+                "cargo_num": 1,
+                "place_in_cargo": 2,
+                "price": price,
+            },
+        )
+        self.assertEqual(orders[2]["tickets"], [])
+
+    def test_export_csv(self):
+        res, content = self.export(data_format="csv")
+
+        self.assertEqual(res["Content-Type"], "text/csv")
+        self.assertIn("orders.csv", res["Content-Disposition"])
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(tuple(rows[0]), CSV_COLUMNS)
+        self.assertEqual(
+            [
+                (row["order_id"], row["place_in_cargo"], row["route"])
+                for row in rows
+            ],
+            [
+                (str(self.orders[0].id), "1", "Source:Kiev destination:Lviv"),
+                (str(self.orders[0].id), "2", "Source:Kiev destination:Lviv"),
+                (str(self.orders[1].id), "5", "Source:Kiev destination:Lviv"),
+                (str(self.empty_order.id), "", ""),
+            ],
+        )
+
+    def test_export_under_asgi(self):
+        for data_format in ("ndjson", "csv"):
+            with self.subTest(data_format=data_format):
+                start, content = self.asgi_export(
+                    f"data_format={data_format}".encode()
+                )
+
+                self.assertEqual(start["status"], status.HTTP_200_OK)
+                self.assertIn(
+                    (
+                        b"Content-Disposition",
+                        f'attachment; filename="orders.{data_format}"'
+                        .encode(),
+                    ),
+                    start["headers"],
+                )
+                self.assertEqual(
+                    content, self.export(data_format=data_format)[1]
+                )
+
+    def test_export_invalid_format(self):
+        res = self.client.get(EXPORT_URL, {"data_format": "xml"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("data_format", res.data)
+
+    def test_export_admin_only(self):
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    @modify_settings(
+        MIDDLEWARE={"append": "task.query_budget.QueryBudgetMiddleware"}
+    )
+    def test_export_of_many_chunks_not_over_budget(self):
+        # One query per chunk, no fixed budget fits every export
+        with mock.patch(
+            "task.views.order_chunks",
+            functools.partial(order_chunks, chunk_size=1),
+        ):
+            res = self.client.get(EXPORT_URL)
+            content = b"".join(res.streaming_content).decode()
+
+        self.assertTrue(res.streaming)
+        self.assertEqual(len(content.splitlines()), 3)
+
+    def test_chunk_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            chunks = list(order_chunks(chunk_size=2))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        # Orders once, the tickets once per chunk
+        self.assertEqual(len(queries), 3)
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command("export_orders", stdout=out, chunk_size=1)
+        self.assertEqual(
+            out.getvalue(), self.export()[1]
+        )
+
+        path = os.path.join(tempfile.mkdtemp(), "orders.csv")
+        call_command(
+            "export_orders", format="csv", output=path, stdout=StringIO()
+        )
+        with open(path, newline="", encoding="utf-8") as export_file:
+            self.assertEqual(
+                export_file.read(), self.export(data_format="csv")[1]
+            )
@@ -0,0 +1,381 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+from rest_framework import status
+from task.models import (
+    Station,
+    Route,
+    Journey,
+    TrainType,
+    Train,
+    SeatHold,
+    Ticket,
+)
+from task.seats import hold_seats, release_expired_holds
+
+
+HOLD_URL = reverse("task:seathold-list")
+ORDER_URL = reverse("task:order-list")
+JOURNEY_URL = reverse("task:journey-list")
+
+
+def sample_journey(**params):
+    train_type = TrainType.objects.create(type_name="test_type")
+    defaults = {
+        "departure_time": "2024-01-12T00:00:00",
+        "arrival_time": "2024-01-13T00:00:00",
+        "route": Route.objects.create(
+            source=Station.objects.create(
+                name="Kiev", latitude=50.45, longitude=30.52, service_cost=2
+            ),
+            destination=Station.objects.create(
+                name="Lviv", latitude=49.84, longitude=24.02, service_cost=3
+            ),
+        ),
+        "train": Train.objects.create(
+            name="Test train 215",
+            cargo_num=2,
+            places_in_cargo=3,
+            kilometer_price=1.2,
+            train_type=train_type,
+        ),
+    }
+    defaults.update(params)
+
+    return Journey.objects.create(**defaults)
+
+
+def confirm_url(hold_id):
+    return reverse("task:seathold-confirm", args=[hold_id])
+
+
+def hold_url(hold_id):
+    return reverse("task:seathold-detail", args=[hold_id])
+
+
+def seats_url(journey_id):
+    return reverse("task:journey-seats", args=[journey_id])
+
+
+def hold_payload(journey, *seats, **params):
+    payload = {
+        "journey": journey.id,
+        "seats": [
+            {"cargo_num": cargo_num, "place_in_cargo": place_in_cargo}
+            for cargo_num, place_in_cargo in seats
+        ],
+    }
+    payload.update(params)
+    return payload
+
+
+class UnauthenticatedSeatHoldApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        res = self.client.get(HOLD_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AuthenticatedSeatHoldApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpassword"
+        )
+        self.client.force_authenticate(self.user)
+        self.other_client = APIClient()
+        self.other_client.force_authenticate(
+            get_user_model().objects.create_user(
+                "other@test.com",
+                "testpassword"
+            )
+        )
+        self.journey = sample_journey()
+
+    def test_hold_seats(self):
+        res = self.client.post(
+            HOLD_URL,
+            hold_payload(self.journey, (1, 1), (1, 2)),
+            format="json"
+        )
+
+        self.journey.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.journey.tickets_held, 2)
+
+        res = self.client.get(seats_url(self.journey.id))
+        self.assertEqual(res.data["tickets_available"], 4)
+        self.assertEqual(res.data["cargos"][0]["free_places"], [3])
+
+        res = self.client.get(JOURNEY_URL)
+        self.assertEqual(res.data["results"][0]["tickets_available"], 4)
+
+    def test_held_seats_not_for_others(self):
+        self.client.post(
+            HOLD_URL, hold_payload(self.journey, (1, 1)), format="json"
+        )
+
+        res = self.other_client.post(
+            HOLD_URL, hold_payload(self.journey, (1, 1)), format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.other_client.post(
+            ORDER_URL,
+            {
+                "tickets": [
+                    {
+                        "journey": self.journey.id,
+                        "cargo_num": 1,
+                        "place_in_cargo": 1,
+                    }
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_hold_seat_out_of_range(self):
+        res = self.client.post(
+            HOLD_URL, hold_payload(self.journey, (1, 4)), format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_confirm_hold(self):
+        res = self.client.post(
+            HOLD_URL,
+            hold_payload(self.journey, (2, 1), (2, 2)),
+            format="json"
+        )
+
+        res = self.client.post(confirm_url(res.data["id"]))
+
+        self.journey.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data["tickets"]), 2)
+        self.assertEqual(self.journey.tickets_held, 0)
+        self.assertEqual(self.journey.tickets_sold, 2)
+        self.assertFalse(SeatHold.objects.exists())
+
+    def test_confirm_other_user_hold(self):
+        res = self.client.post(
+            HOLD_URL, hold_payload(self.journey, (1, 1)), format="json"
+        )
+
+        res = self.other_client.post(confirm_url(res.data["id"]))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_release_hold(self):
+        res = self.client.post(
+            HOLD_URL, hold_payload(self.journey, (1, 1)), format="json"
+        )
+
+        res = self.client.delete(hold_url(res.data["id"]))
+
+        self.journey.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.journey.tickets_held, 0)
+        self.assertEqual(bytes(self.journey.seat_map), bytes(1))
+
+    def test_expired_hold_released(self):
+        res = self.client.post(
+            HOLD_URL, hold_payload(self.journey, (1, 1)), format="json"
+        )
+        SeatHold.objects.filter(pk=res.data["id"]).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        res = self.client.get(seats_url(self.journey.id))
+        self.assertEqual(res.data["cargos"][0]["free_places"], [1, 2, 3])
+
+        res = self.other_client.post(
+            HOLD_URL, hold_payload(self.journey, (1, 1)), format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_expired_hold_seat_can_be_ordered(self):
+        self.client.post(
+            HOLD_URL, hold_payload(self.journey, (1, 1)), format="json"
+        )
+        SeatHold.objects.update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        res = self.client.get(JOURNEY_URL)
+        self.assertEqual(res.data["results"][0]["tickets_available"], 6)
+
+        res = self.other_client.post(
+            ORDER_URL,
+            {
+                "tickets": [
+                    {
+                        "journey": self.journey.id,
+                        "cargo_num": 1,
+                        "place_in_cargo": 1,
+                    }
+                ]
+            },
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(SeatHold.objects.exists())
+        self.journey.refresh_from_db()
+        self.assertEqual(self.journey.tickets_held, 0)
+        self.assertEqual(self.journey.tickets_sold, 1)
+
+
+class ExpiredHoldReleaseTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpassword"
+        )
+        journey = sample_journey()
+        self.journeys = [
+            journey,
+            Journey.objects.create(
+                departure_time="2024-01-14T00:00:00",
+                arrival_time="2024-01-15T00:00:00",
+                route=journey.route,
+                train=journey.train,
+            ),
+        ]
+
+    def expired_holds(self, seats_by_journey):
+        for journey, seats in zip(self.journeys, seats_by_journey):
+            for seat in seats:
+                hold_seats(self.user, journey, [seat], minutes=10)
+        SeatHold.objects.update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+    def release_queries(self, count) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(release_expired_holds(), count)
+        return len(queries)
+
+    def test_released_together(self):
+        self.expired_holds([[(1, 1)], [(1, 1)]])
+        few = self.release_queries(2)
+
+        self.expired_holds([[(1, 1), (1, 2), (2, 3)], [(1, 1), (2, 1)]])
+        many = self.release_queries(5)
+
+        self.assertEqual(few, many)
+        self.assertFalse(SeatHold.objects.exists())
+        for journey in self.journeys:
+            journey.refresh_from_db()
+            self.assertEqual(journey.tickets_held, 0)
+            self.assertEqual(bytes(journey.seat_map), bytes(1))
+
+    def test_active_holds_kept(self):
+        self.expired_holds([[(1, 1)], []])
+        hold_seats(self.user, self.journeys[1], [(1, 2)], minutes=10)
+
+        self.assertEqual(release_expired_holds(), 1)
+
+        for journey, held in zip(self.journeys, (0, 1)):
+            journey.refresh_from_db()
+            self.assertEqual(journey.tickets_held, held)
+
+    def test_journey_list_does_not_write(self):
+        self.expired_holds([[(1, 1)], []])
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = client.get(JOURNEY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            [
+                query["sql"] for query in queries
+                if not query["sql"].startswith("SELECT")
+            ]
+        )
+
+
+class SeatHoldContentionTests(TransactionTestCase):
+    threads = 8
+
+    def setUp(self):
+        self.journey = sample_journey()
+        self.users = [
+            get_user_model().objects.create_user(
+                f"user{number}@test.com",
+                "testpassword"
+            )
+            for number in range(self.threads)
+        ]
+
+    def race(self, request):
+        barrier = threading.Barrier(self.threads)
+        results = []
+
+        def worker(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            started = time.perf_counter()
+            try:
+                res = request(client)
+                results.append((res.status_code, time.perf_counter() - started))
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=worker, args=(user,))
+            for user in self.users
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return results
+
+    def test_no_double_sale(self):
+        results = self.race(
+            lambda client: client.post(
+                HOLD_URL,
+                hold_payload(self.journey, (1, 1), (1, 2)),
+                format="json",
+            )
+        )
+        results += self.race(
+            lambda client: client.post(
+                ORDER_URL,
+                {
+                    "tickets": [
+                        {
+                            "journey": self.journey.id,
+                            "cargo_num": 2,
+                            "place_in_cargo": place_in_cargo,
+                        }
+                        for place_in_cargo in (1, 2)
+                    ]
+                },
+                format="json",
+            )
+        )
+
+        statuses = [status_code for status_code, _ in results]
+        self.journey.refresh_from_db()
+        self.assertEqual(statuses.count(status.HTTP_201_CREATED), 2)
+        self.assertEqual(self.journey.tickets_held, 2)
+        self.assertEqual(self.journey.tickets_sold, 2)
+        self.assertEqual(Ticket.objects.count(), 2)
+        self.assertLess(max(elapsed for _, elapsed in results), 5)
@@ -0,0 +1,265 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from task.models import (
+    Crew,
+    DataVersion,
+    Journey,
+    Route,
+    Station,
+    Train,
+    TrainType,
+)
+from task.timetable import TIMETABLE_VERSION_KEY
+
+STATIONS_CSV = (
+    "name,latitude,longitude,service_cost\n"
+    "Kiev,50.45,30.52,2.5\n"
+    "Lviv,49.84,24.03,1.5\n"
+    "Odesa,46.48,30.72,3\n"
+)
+TRAINS_NDJSON = (
+    '{"name": "Intercity", "cargo_num": 5, "places_in_cargo": 40, '
+    '"kilometer_price": 1.2, "train_type": "express"}\n'
+    "\n"
+    '{"name": "Night", "cargo_num": 10, "places_in_cargo": 30, '
+    '"kilometer_price": 0.8, "train_type": "sleeper"}\n'
+)
+ROUTES_CSV = (
+    "source,destination\n"
+    "Kiev,Lviv\n"
+    "Lviv,Odesa\n"
+)
+JOURNEYS_CSV = (
+    "train,source,destination,departure_time,arrival_time\n"
+    "Intercity,Kiev,Lviv,2024-01-12T08:00:00,2024-01-12T14:00:00\n"
+    "Night,Lviv,Odesa,2024-01-12T22:00:00,2024-01-13T08:00:00\n"
+    "Intercity,Kiev,Lviv,2024-01-13T08:00:00,2024-01-13T14:00:00\n"
+)
+CREW_CSV = (
+    "train,departure_time,first_name,last_name\n"
+    "Intercity,2024-01-12T08:00:00,Ivan,Petrenko\n"
+    "Intercity,2024-01-13T08:00:00,Ivan,Petrenko\n"
+    "Night,2024-01-12T22:00:00,Olena,Shevchenko\n"
+)
+
+
+class ImportDataTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def import_data(self, kind, content, extension=".csv", **options):
+        path = os.path.join(self.directory, f"{kind}{extension}")
+        with open(path, "w", encoding="utf-8") as data_file:
+            data_file.write(content)
+        out = StringIO()
+        call_command("import_data", kind, path, stdout=out, **options)
+        return out.getvalue()
+
+    def import_network(self, **options):
+        self.import_data("stations", STATIONS_CSV, **options)
+        self.import_data("trains", TRAINS_NDJSON, ".ndjson", **options)
+        self.import_data("routes", ROUTES_CSV, **options)
+        return self.import_data("journeys", JOURNEYS_CSV, **options)
+
+    def test_import_network(self):
+        output = self.import_network(batch_size=2)
+        self.import_data("crew", CREW_CSV, batch_size=2)
+
+        self.assertIn("journeys: 3 created, 0 updated, 0 unchanged", output)
+        self.assertEqual(
+            set(Station.objects.values_list("name", "name_normalized")),
+            {("Kiev", "kiev"), ("Lviv", "lviv"), ("Odesa", "odesa")},
+        )
+        self.assertEqual(
+            set(Train.objects.values_list("name", "train_type__type_name")),
+            {("Intercity", "express"), ("Night", "sleeper")},
+        )
+        route = Route.objects.get(source__name="Kiev")
+        self.assertEqual(route.distance, route.calculate_distance())
+        journeys = Journey.objects.order_by("departure_time")
+        self.assertEqual(
+            [
+                (journey.train.name, journey.route.destination.name)
+                for journey in journeys
+            ],
+            [("Intercity", "Lviv"), ("Night", "Odesa"), ("Intercity", "Lviv")],
+        )
+        self.assertEqual(
+            [
+                [member.last_name for member in journey.crew.all()]
+                for journey in journeys
+            ],
+            [["Petrenko"], ["Shevchenko"], ["Petrenko"]],
+        )
+        self.assertEqual(Crew.objects.count(), 2)
+
+    def test_timetable_version_bumped_once(self):
+        version = DataVersion.current(TIMETABLE_VERSION_KEY)
+
+        self.import_data("stations", STATIONS_CSV, batch_size=1)
+
+        self.assertEqual(
+            DataVersion.current(TIMETABLE_VERSION_KEY), version + 1
+        )
+
+    def test_import_again_keeps_rows(self):
+        self.import_network()
+        self.import_data("crew", CREW_CSV)
+
+        output = self.import_network()
+        crew_output = self.import_data("crew", CREW_CSV)
+
+        self.assertIn("journeys: 0 created, 0 updated, 3 unchanged", output)
+        self.assertIn("crew: 0 created, 0 updated, 3 unchanged", crew_output)
+        self.assertEqual(Station.objects.count(), 3)
+        self.assertEqual(TrainType.objects.count(), 2)
+        self.assertEqual(Route.objects.count(), 2)
+        self.assertEqual(Journey.objects.count(), 3)
+        self.assertEqual(Journey.crew.through.objects.count(), 3)
+
+    def test_update_existing_rows(self):
+        self.import_network()
+        route = Route.objects.get(source__name="Kiev")
+        distance = route.distance
+
+        output = self.import_data(
+            "stations",
+            "name,latitude,longitude,service_cost\nKiev,50.0,30.52,4\n",
+            update=True,
+        )
+        journey_output = self.import_data(
+            "journeys",
+            "train,source,destination,departure_time,arrival_time\n"
+            "Intercity,Kiev,Lviv,2024-01-12T08:00:00,2024-01-12T16:00:00\n",
+            update=True,
+        )
+
+        self.assertIn("stations: 0 created, 1 updated", output)
+        self.assertIn("journeys: 0 created, 1 updated", journey_output)
+        route.refresh_from_db()
+        self.assertNotEqual(route.distance, distance)
+        self.assertEqual(route.distance, route.calculate_distance())
+        self.assertEqual(
+            Journey.objects.get(departure_time__day=12, train__name="Intercity")
+            .arrival_time.hour,
+            16,
+        )
+
+    def test_overlapping_journeys_import_nothing(self):
+        self.import_network()
+        intercity = Journey.objects.get(
+            departure_time__day=12, train__name="Intercity"
+        )
+
+        with self.assertRaisesMessage(
+            CommandError,
+            f"Nothing imported. Overlapping journeys, train "
+            f"{intercity.train_id}: journey {intercity.id} overlaps journey",
+        ):
+            self.import_data(
+                "journeys",
+                "train,source,destination,departure_time,arrival_time\n"
+                "Night,Lviv,Odesa,2024-01-14T22:00:00,2024-01-15T08:00:00\n"
+                "Intercity,Kiev,Lviv,2024-01-12T12:00:00,2024-01-12T18:00:00\n",
+            )
+        self.assertEqual(Journey.objects.count(), 3)
+
+    def test_overlapping_crew_imports_nothing(self):
+        self.import_network()
+        self.import_data("crew", CREW_CSV)
+        self.import_data(
+            "journeys",
+            "train,source,destination,departure_time,arrival_time\n"
+            "Night,Lviv,Odesa,2024-01-13T10:00:00,2024-01-13T18:00:00\n",
+        )
+
+        with self.assertRaisesMessage(
+            CommandError, "Nothing imported. Overlapping journeys, crew"
+        ):
+            self.import_data(
+                "crew",
+                "train,departure_time,first_name,last_name\n"
+                "Night,2024-01-13T10:00:00,Olena,Shevchenko\n"
+                "Night,2024-01-13T10:00:00,Ivan,Petrenko\n",
+            )
+        self.assertEqual(Journey.crew.through.objects.count(), 3)
+
+    def test_last_duplicate_row_wins(self):
+        self.import_data(
+            "stations",
+            STATIONS_CSV + "Kiev,50.45,30.52,7\n",
+        )
+
+        self.assertEqual(
+            Station.objects.get(name="Kiev").service_cost, 7
+        )
+
+    def test_unknown_reference_imports_nothing(self):
+        self.import_data("stations", STATIONS_CSV)
+        self.import_data("trains", TRAINS_NDJSON, ".ndjson")
+
+        with self.assertRaisesMessage(
+            CommandError, "Line 3: unknown station 'Kharkiv'"
+        ):
+            self.import_data(
+                "routes", ROUTES_CSV.replace("Lviv,Odesa", "Lviv,Kharkiv")
+            )
+        self.assertFalse(Route.objects.exists())
+
+    def test_invalid_values(self):
+        self.import_network()
+
+        for kind, content, message in (
+            (
+                "stations",
+                "name,latitude,longitude,service_cost\nKiev,north,30,1\n",
+                "Line 2: latitude has an invalid value 'north'",
+            ),
+            (
+                "trains",
+                '{"name": "Intercity", "cargo_num": 0}\n',
+                "Line 1: cargo_num has an invalid value 0",
+            ),
+            (
+                "journeys",
+                JOURNEYS_CSV.replace("2024-01-13T14:00:00", "13.01.2024"),
+                "Line 4: arrival_time has an invalid value",
+            ),
+            (
+                "journeys",
+                JOURNEYS_CSV.replace("2024-01-13T14:00:00", "2024-01-13T07:00"),
+                "Line 4: arrival_time must be after departure_time",
+            ),
+            (
+                "journeys",
+                JOURNEYS_CSV.replace("Night,Lviv,Odesa", "Night,Odesa,Lviv"),
+                "Line 3: unknown route between stations",
+            ),
+            (
+                "crew",
+                CREW_CSV.replace("2024-01-13T08", "2024-01-14T08"),
+                "no journey of train id",
+            ),
+        ):
+            with self.subTest(kind=kind, message=message):
+                extension = ".ndjson" if content.startswith("{") else ".csv"
+                with self.assertRaisesMessage(CommandError, message):
+                    self.import_data(kind, content, extension)
+
+    def test_invalid_json(self):
+        with self.assertRaisesMessage(CommandError, "Line 4: invalid JSON"):
+            self.import_data("trains", TRAINS_NDJSON + "{\n", ".ndjson")
+
+    def test_unknown_format(self):
+        with self.assertRaisesMessage(CommandError, "Unknown file format"):
+            self.import_data("stations", STATIONS_CSV, ".txt")
+
+        output = self.import_data(
+            "stations", STATIONS_CSV, ".txt", format="csv"
+        )
+        self.assertIn("stations: 3 created", output)
@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.db.models import Value, IntegerField
 from rest_framework.test import APIClient
@@ -220,6 +222,199 @@ class AuthenticatedJourneyApiTests(TestCase):
         self.assertIn(serializer1.data, res.data["results"])
         self.assertNotIn(serializer2.data, res.data["results"])
 
+    def _journeys_with_prices(self):
+        source = sample_station(name="Kiev", latitude=50.45, longitude=30.52)
+        near = sample_station(name="Zhytomyr", latitude=50.25, longitude=28.65)
+        far = sample_station(name="Lviv", latitude=49.84, longitude=24.02)
+        cheap = Journey.objects.create(
+            departure_time="2024-01-12T00:00:00",
+            arrival_time="2024-01-12T03:00:00",
+            route=sample_route(source=source, destination=near),
+            train=sample_train(),
+        )
+        expensive = Journey.objects.create(
+            departure_time="2024-01-13T00:00:00",
+            arrival_time="2024-01-13T08:00:00",
+            route=sample_route(source=source, destination=far),
+            train=sample_train(),
+        )
+        return cheap, expensive
+
+    def test_annotated_price_matches_property(self):
+        cheap, expensive = self._journeys_with_prices()
+
+        annotated = Journey.objects.with_price_trip().order_by("id")
+
+        self.assertEqual(
+            [journey.price_trip for journey in annotated],
+            [
+                Journey.objects.get(pk=cheap.pk).price_trip,
+                Journey.objects.get(pk=expensive.pk).price_trip,
+            ]
+        )
+
+    def test_list_journey_matches_serializer(self):
+        self._journeys_with_prices()
+
+        res = self.client.get(JOURNEY_URL, {"ordering": "price_trip"})
+        journeys = Journey.objects.with_price_trip().annotate(
+            tickets_available=Value(828, output_field=IntegerField())
+        ).order_by("price_trip")
+        serializer = JourneyListSerializer(journeys, many=True)
+
+        self.assertEqual(res.data["results"], serializer.data)
+
+    def test_list_journey_queries_do_not_grow_with_rows(self):
+        self._journeys_with_prices()
+        with CaptureQueriesContext(connection) as two_journeys:
+            self.client.get(JOURNEY_URL)
+
+        for _ in range(5):
+            self._journeys_with_prices()
+        with CaptureQueriesContext(connection) as twelve_journeys:
+            self.client.get(JOURNEY_URL)
+
+        self.assertEqual(len(twelve_journeys), len(two_journeys))
+
+    def test_filter_journey_by_price(self):
+        cheap, expensive = self._journeys_with_prices()
+        cheap_price = Journey.objects.get(pk=cheap.pk).price_trip
+
+        res = self.client.get(JOURNEY_URL, {"max_price": cheap_price})
+        self.assertEqual(
+            [journey["id"] for journey in res.data["results"]],
+            [cheap.id]
+        )
+
+        res = self.client.get(JOURNEY_URL, {"min_price": cheap_price + 1})
+        self.assertEqual(
+            [journey["id"] for journey in res.data["results"]],
+            [expensive.id]
+        )
+
+    def test_filter_journey_by_invalid_price(self):
+        res = self.client.get(JOURNEY_URL, {"min_price": "cheap"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_order_journey_by_price(self):
+        cheap, expensive = self._journeys_with_prices()
+
+        res = self.client.get(JOURNEY_URL, {"ordering": "price_trip"})
+        self.assertEqual(
+            [journey["id"] for journey in res.data["results"]],
+            [cheap.id, expensive.id]
+        )
+
+        res = self.client.get(JOURNEY_URL, {"ordering": "-price_trip"})
+        self.assertEqual(
+            [journey["id"] for journey in res.data["results"]],
+            [expensive.id, cheap.id]
+        )
+
+    def test_keyset_pagination(self):
+        route = sample_route()
+        for departure_time in (
+            "2024-01-12T00:00:00",
+            "2024-01-14T00:00:00",
+            "2024-01-12T00:00:00",
+            "2024-01-13T00:00:00",
+            "2024-01-12T00:00:00",
+        ):
+            Journey.objects.create(
+                departure_time=departure_time,
+                arrival_time="2024-01-15T00:00:00",
+                route=route,
+                train=sample_train(),
+            )
+        expected = list(
+            Journey.objects.order_by("-departure_time", "id")
+            .values_list("id", flat=True)
+        )
+
+        ids = []
+        url = f"{JOURNEY_URL}?pagination=cursor"
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.get(url)
+            self.assertNotIn("count", res.data)
+            # The page count query, tickets_available counts in a subquery
+            self.assertFalse(
+                any('AS "__count"' in query["sql"] for query in queries)
+            )
+            ids += [journey["id"] for journey in res.data["results"]]
+            url = res.data["next"]
+            last_page = res
+
+        self.assertEqual(ids, expected)
+
+        res = self.client.get(last_page.data["previous"])
+        self.assertEqual(
+            [journey["id"] for journey in res.data["results"]],
+            expected[2:4]
+        )
+
+    def test_search_uses_indexes(self):
+        for day in range(1, 20):
+            Journey.objects.create(
+                departure_time=f"2024-01-{day:02}T10:00:00",
+                arrival_time=f"2024-01-{day:02}T20:00:00",
+                route=sample_route(),
+                train=sample_train(),
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(
+                JOURNEY_URL,
+                {"departure_date": "2024-01-05,2024-01-07"}
+            )
+        search = next(
+            query["sql"] for query in queries
+            if query["sql"].startswith('SELECT "task_journey"."id"')
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {search}")
+            plan = [row[-1] for row in cursor.fetchall()]
+
+        self.assertEqual(len(res.data["results"]), 2)
+        self.assertFalse(
+            [step for step in plan if step.startswith("SCAN")],
+            plan
+        )
+
+    def test_filter_journey_by_invalid_date(self):
+        res = self.client.get(JOURNEY_URL, {"departure_date": "12.01.2024"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_keyset_pagination_rejects_ordering(self):
+        for params in (
+            {"pagination": "cursor", "ordering": "price_trip"},
+            {"cursor": "not-a-cursor", "ordering": "-departure_time"},
+        ):
+            with self.subTest(params=params):
+                res = self.client.get(JOURNEY_URL, params)
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn("ordering", res.data)
+
+    def test_keyset_pagination_invalid_cursor(self):
+        res = self.client.get(JOURNEY_URL, {"cursor": "not-a-cursor"})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_filter_journey_by_source_station_ignores_accents(self):
+        journey = Journey.objects.create(
+            departure_time="2023-01-12T00:00:00",
+            arrival_time="2023-01-13T00:00:00",
+            route=sample_route(source=sample_station(name="Kýiv")),
+            train=sample_train(),
+        )
+
+        res = self.client.get(JOURNEY_URL, {"source_station": "KYI"})
+
+        self.assertEqual(
+            [result["id"] for result in res.data["results"]],
+            [journey.id]
+        )
+
     def test_create_journey_forbidden(self):
         payload = {
             "departure_time": "2024-01-12T00:00:00",
@@ -1,13 +1,80 @@
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
+from task.models import (
+    Station,
+    Route,
+    Journey,
+    TrainType,
+    Train,
+    Order,
+    Ticket,
+)
+from task.serializers import OrderListSerializer
+from task.throttling import throttle_store
 
 
 ORDER_URL = reverse("task:order-list")
 
 
+def sample_station(**params):
+    defaults = {
+        "name": "Sample station",
+        "latitude": 55.3,
+        "longitude": 20.3,
+        "service_cost": 2.3,
+    }
+    defaults.update(params)
+
+    return Station.objects.create(**defaults)
+
+
+def sample_train(**params):
+    train_type, _ = TrainType.objects.get_or_create(type_name="test_type")
+    defaults = {
+        "name": "Test train 215",
+        "cargo_num": 2,
+        "places_in_cargo": 3,
+        "kilometer_price": 1.2,
+        "train_type": train_type
+    }
+    defaults.update(params)
+
+    return Train.objects.create(**defaults)
+
+
+def sample_journey(**params):
+    defaults = {
+        "departure_time": "2024-01-12T00:00:00",
+        "arrival_time": "2024-01-13T00:00:00",
+        "route": Route.objects.create(
+            source=sample_station(name="Kiev", latitude=50.45),
+            destination=sample_station(name="Lviv", latitude=49.84),
+        ),
+        "train": sample_train(),
+    }
+    defaults.update(params)
+
+    return Journey.objects.create(**defaults)
+
+
+def order_url(order_id):
+    return reverse("task:order-detail", args=[order_id])
+
+
+def seats_url(journey_id):
+    return reverse("task:journey-seats", args=[journey_id])
+
+
 class UnauthenticatedOrderApiTests(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -15,3 +82,341 @@ class UnauthenticatedOrderApiTests(TestCase):
     def test_auth_required(self):
         res = self.client.get(ORDER_URL)
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AuthenticatedOrderApiTests(TestCase):
+    def setUp(self):
+        # Orders created here must not reach the limit of other tests
+        self.addCleanup(throttle_store().clear)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpassword"
+        )
+        self.client.force_authenticate(self.user)
+        self.journey = sample_journey()
+
+    def create_order(self, *seats, journey=None):
+        journey = journey or self.journey
+        return self.client.post(
+            ORDER_URL,
+            {
+                "tickets": [
+                    {
+                        "journey": journey.id,
+                        "cargo_num": cargo_num,
+                        "place_in_cargo": place_in_cargo,
+                    }
+                    for cargo_num, place_in_cargo in seats
+                ]
+            },
+            format="json",
+        )
+
+    def test_create_order_counts_sold_tickets(self):
+        res = self.create_order((1, 1), (1, 2))
+
+        self.journey.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.journey.tickets_sold, 2)
+
+    def test_cancel_order_returns_tickets(self):
+        res = self.create_order((1, 1), (1, 2))
+
+        self.client.delete(order_url(res.data["id"]))
+
+        self.journey.refresh_from_db()
+        self.assertEqual(self.journey.tickets_sold, 0)
+
+    def test_create_order_stores_prices(self):
+        res = self.create_order((1, 1), (1, 2))
+
+        price = self.journey.price_trip
+        order = Order.objects.get(pk=res.data["id"])
+        self.assertEqual(res.data["total_price"], round(price * 2, 2))
+        self.assertEqual(order.total_price, round(price * 2, 2))
+        self.assertEqual(
+            list(order.tickets.values_list("price", flat=True)),
+            [price, price],
+        )
+
+    def test_order_prices_stable_after_tariff_change(self):
+        res = self.create_order((1, 1))
+        price = self.journey.price_trip
+
+        Train.objects.filter(pk=self.journey.train_id).update(
+            kilometer_price=10
+        )
+
+        detail = self.client.get(order_url(res.data["id"]))
+        listed = self.client.get(ORDER_URL).data["results"][0]
+        self.assertEqual(detail.data["total_price"], price)
+        self.assertEqual(detail.data["tickets"][0]["price_trip"], price)
+        self.assertEqual(listed["total_price"], price)
+        self.assertEqual(listed["tickets"][0]["price_trip"], price)
+
+    def test_deleted_journey_leaves_order_total(self):
+        other_journey = sample_journey()
+        res = self.client.post(
+            ORDER_URL,
+            {
+                "tickets": [
+                    {"journey": self.journey.id, "cargo_num": 1,
+                     "place_in_cargo": 1},
+                    {"journey": other_journey.id, "cargo_num": 1,
+                     "place_in_cargo": 1},
+                ]
+            },
+            format="json",
+        )
+
+        admin = get_user_model().objects.create_superuser(
+            "admin@test.com", "testpassword"
+        )
+        self.client.force_authenticate(admin)
+        self.client.delete(
+            reverse("task:journey-detail", args=[other_journey.id])
+        )
+
+        order = Order.objects.get(pk=res.data["id"])
+        self.assertEqual(order.total_price, self.journey.price_trip)
+
+    def test_admin_ticket_priced_on_save(self):
+        res = self.create_order((1, 1))
+        order = Order.objects.get(pk=res.data["id"])
+
+        Ticket.objects.create(
+            order=order, journey=self.journey, cargo_num=2, place_in_cargo=1
+        )
+
+        order.refresh_from_db()
+        self.assertEqual(
+            order.total_price, round(self.journey.price_trip * 2, 2)
+        )
+
+    def test_move_ticket_to_other_journey(self):
+        other_journey = sample_journey()
+        res = self.create_order((1, 1))
+        ticket = Ticket.objects.get(order_id=res.data["id"])
+
+        ticket.journey = other_journey
+        ticket.save()
+
+        self.journey.refresh_from_db()
+        other_journey.refresh_from_db()
+        self.assertEqual(self.journey.tickets_sold, 0)
+        self.assertEqual(other_journey.tickets_sold, 1)
+
+    def test_journey_list_tickets_available(self):
+        self.create_order((1, 1), (2, 3))
+
+        res = self.client.get(reverse("task:journey-list"))
+
+        self.assertEqual(res.data["results"][0]["tickets_available"], 4)
+
+    def test_list_orders(self):
+        self.create_order((1, 1), (2, 3))
+        self.create_order(
+            (1, 1),
+            journey=sample_journey(
+                route=Route.objects.create(
+                    source=sample_station(name="Odesa", service_cost=1.5),
+                    destination=sample_station(name="Kharkiv"),
+                )
+            ),
+        )
+
+        res = self.client.get(ORDER_URL)
+        serializer = OrderListSerializer(
+            Order.objects.filter(user=self.user), many=True
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"], serializer.data)
+
+    def test_list_orders_queries_do_not_grow_with_tickets(self):
+        self.create_order((1, 1))
+
+        with CaptureQueriesContext(connection) as one_ticket:
+            self.client.get(ORDER_URL)
+        self.create_order((1, 2), (1, 3), (2, 1))
+        self.create_order((2, 2), (2, 3))
+
+        with CaptureQueriesContext(connection) as six_tickets:
+            self.client.get(ORDER_URL)
+
+        self.assertEqual(len(six_tickets), len(one_ticket))
+
+    def test_benchmark_lists_same_output(self):
+        out = StringIO()
+
+        call_command("benchmark_lists", page_size=5, repeat=1, stdout=out)
+
+        self.assertEqual(out.getvalue().count("same output: True"), 2)
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_reconcile_seats_repairs_drift(self):
+        self.create_order((1, 1), (1, 2))
+        Journey.objects.filter(pk=self.journey.pk).update(
+            tickets_sold=5,
+            seat_map=b"",
+        )
+
+        call_command("reconcile_seats", stdout=StringIO())
+
+        self.journey.refresh_from_db()
+        self.assertEqual(self.journey.tickets_sold, 2)
+        self.assertEqual(bytes(self.journey.seat_map), bytes([0b11]))
+
+    def test_free_seats(self):
+        self.create_order((1, 2), (2, 1))
+
+        res = self.client.get(seats_url(self.journey.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["tickets_available"], 4)
+        self.assertEqual(
+            res.data["cargos"],
+            [
+                {"cargo_num": 1, "free_places": [1, 3]},
+                {"cargo_num": 2, "free_places": [2, 3]},
+            ]
+        )
+
+    def test_train_layout_change_keeps_sold_seats(self):
+        self.create_order((2, 1))
+        self.user.is_staff = True
+        self.user.save()
+
+        res = self.client.patch(
+            reverse("task:train-detail", args=[self.journey.train_id]),
+            {"places_in_cargo": 4},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(seats_url(self.journey.id))
+        self.assertEqual(
+            res.data["cargos"],
+            [
+                {"cargo_num": 1, "free_places": [1, 2, 3, 4]},
+                {"cargo_num": 2, "free_places": [2, 3, 4]},
+            ]
+        )
+        res = self.create_order((1, 4))
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        # Imports with --update change trains in bulk
+        train = Train.objects.get(pk=self.journey.train_id)
+        train.places_in_cargo = 2
+        Train.objects.bulk_update([train], ["places_in_cargo"])
+
+        res = self.client.get(seats_url(self.journey.id))
+        self.assertEqual(
+            res.data["cargos"],
+            [
+                {"cargo_num": 1, "free_places": [1, 2]},
+                {"cargo_num": 2, "free_places": [2]},
+            ]
+        )
+
+    def test_free_seats_after_cancel(self):
+        res = self.create_order((1, 2))
+        self.client.delete(order_url(res.data["id"]))
+
+        res = self.client.get(seats_url(self.journey.id))
+
+        self.assertEqual(
+            res.data["cargos"][0],
+            {"cargo_num": 1, "free_places": [1, 2, 3]}
+        )
+
+    def test_create_order_queries_do_not_grow_with_tickets(self):
+        seats = [(cargo, place) for cargo in (1, 2) for place in (1, 2, 3)]
+
+        with CaptureQueriesContext(connection) as one_ticket:
+            self.create_order(seats[0])
+        Order.objects.all().delete()
+
+        with CaptureQueriesContext(connection) as six_tickets:
+            res = self.create_order(*seats)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(six_tickets), len(one_ticket))
+        self.assertEqual(Ticket.objects.count(), 6)
+
+    def test_create_order_seat_out_of_range(self):
+        res = self.create_order((1, 1), (3, 1))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["tickets"][0], {})
+        self.assertEqual(
+            res.data["tickets"][1]["cargo_num"],
+            [
+                "cargo_num number must be in available range: "
+                "(1, cargo_num): (1, 2)"
+            ]
+        )
+        self.assertFalse(Ticket.objects.exists())
+
+    def test_create_order_seat_taken(self):
+        self.create_order((1, 1))
+
+        res = self.create_order((1, 1))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("non_field_errors", res.data["tickets"][0])
+
+    def test_create_order_same_seat_twice(self):
+        res = self.create_order((1, 1), (1, 1))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Ticket.objects.exists())
+
+    def test_create_order_unknown_journey(self):
+        res = self.client.post(
+            ORDER_URL,
+            {
+                "tickets": [
+                    {"journey": 999, "cargo_num": 1, "place_in_cargo": 1}
+                ]
+            },
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("journey", res.data["tickets"][0])
+
+    def test_keyset_pagination(self):
+        for place_in_cargo in (1, 2, 3):
+            self.create_order((1, place_in_cargo))
+        expected = list(
+            Order.objects.order_by("-created_at", "id")
+            .values_list("id", flat=True)
+        )
+
+        res = self.client.get(ORDER_URL, {"cursor": "", "page_size": 2})
+        ids = [order["id"] for order in res.data["results"]]
+        res = self.client.get(res.data["next"])
+        ids += [order["id"] for order in res.data["results"]]
+
+        self.assertIsNone(res.data["next"])
+        self.assertEqual(ids, expected)
+
+
+class SampleFixtureTests(TestCase):
+    def test_load_sample_data(self):
+        call_command("loaddata", settings.BASE_DIR / "db.json", verbosity=0)
+        call_command("reconcile_seats", stdout=StringIO())
+
+        prices = Journey.objects.prices()
+        for ticket in Ticket.objects.all():
+            self.assertEqual(ticket.price, prices[ticket.journey_id])
+        totals = dict(Order.objects.values_list("id", "total_price"))
+        Order.objects.refresh_total()
+        self.assertEqual(
+            dict(Order.objects.values_list("id", "total_price")), totals
+        )
+        self.assertEqual(
+            dict(Journey.objects.values_list("id", "tickets_sold")),
+            {1: 6, 2: 3, 3: 0, 4: 0},
+        )
@@ -0,0 +1,549 @@
+import itertools
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+from task.models import (
+    Crew,
+    Station,
+    Route,
+    Journey,
+    Order,
+    Ticket,
+    TimetableTemplate,
+    TrainType,
+    Train,
+)
+from task.query_budget import (
+    QueryBudgetExceeded,
+    assert_query_budget,
+    fingerprint,
+)
+from task.seats import hold_seats
+from task.throttling import throttle_store
+from task.views import OrderViewSet
+
+
+ORDER_URL = reverse("task:order-list")
+JOURNEY_URL = reverse("task:journey-list")
+HOLD_URL = reverse("task:seathold-list")
+
+
+def sample_journey(crew, **params):
+    train_type, _ = TrainType.objects.get_or_create(type_name="test_type")
+    defaults = {
+        "departure_time": "2030-01-12T00:00:00",
+        "arrival_time": "2030-01-13T00:00:00",
+        "route": Route.objects.create(
+            source=Station.objects.create(
+                name="Kiev", latitude=50.45, longitude=30.52, service_cost=2
+            ),
+            destination=Station.objects.create(
+                name="Lviv", latitude=49.84, longitude=24.02, service_cost=3
+            ),
+        ),
+        "train": Train.objects.create(
+            name="Test train 215",
+            cargo_num=3,
+            places_in_cargo=4,
+            kilometer_price=1.2,
+            train_type=train_type,
+        ),
+    }
+    defaults.update(params)
+    journey = Journey.objects.create(**defaults)
+    journey.crew.set(crew)
+    return journey
+
+
+class FingerprintTests(TestCase):
+    def test_fingerprint_collapses_literals(self):
+        self.assertEqual(
+            fingerprint(
+                "SELECT * FROM t WHERE id = 15 AND name = 'it''s'\n"
+                "AND pk IN (%s, %s, %s)"
+            ),
+            "SELECT * FROM t WHERE id = ? AND name = ? AND pk IN (...)"
+        )
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        # Orders created here must not reach the limit of other tests
+        self.addCleanup(throttle_store().clear)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpassword",
+            is_staff=True,
+        )
+        self.client.force_authenticate(self.user)
+        crew = [
+            Crew.objects.create(first_name=f"Adam{number}", last_name="Test")
+            for number in range(4)
+        ]
+        self.journeys = [sample_journey(crew) for _ in range(3)]
+
+    def create_order(self, tickets):
+        return assert_query_budget(
+            self.client,
+            "post",
+            ORDER_URL,
+            {
+                "tickets": [
+                    {
+                        "journey": journey.id,
+                        "cargo_num": cargo_num,
+                        "place_in_cargo": place_in_cargo,
+                    }
+                    for journey, cargo_num, place_in_cargo in tickets
+                ]
+            },
+            format="json",
+        )
+
+    def test_order_endpoints(self):
+        first, second, _ = self.journeys
+        for place_in_cargo in (1, 2):
+            self.create_order(
+                [
+                    (journey, cargo_num, place_in_cargo)
+                    for journey in (first, second)
+                    for cargo_num in (1, 2, 3)
+                ]
+            )
+        res = self.create_order([(first, 3, 4)])
+        order_url = reverse("task:order-detail", args=[res.data["id"]])
+
+        assert_query_budget(self.client, "get", ORDER_URL)
+        assert_query_budget(self.client, "get", order_url)
+        assert_query_budget(self.client, "delete", order_url)
+
+    def test_journey_endpoints(self):
+        journey = self.journeys[0]
+        self.create_order([(journey, 1, 1), (journey, 1, 2)])
+        journey_url = reverse("task:journey-detail", args=[journey.id])
+
+        assert_query_budget(self.client, "get", JOURNEY_URL)
+        assert_query_budget(
+            self.client, "get", JOURNEY_URL, {"pagination": "cursor"}
+        )
+        assert_query_budget(self.client, "get", journey_url)
+        assert_query_budget(
+            self.client,
+            "get",
+            reverse("task:journey-seats", args=[journey.id]),
+        )
+        assert_query_budget(
+            self.client,
+            "patch",
+            journey_url,
+            {"crew": list(Crew.objects.values_list("id", flat=True))},
+            format="json",
+        )
+        assert_query_budget(self.client, "delete", journey_url)
+
+    def test_hold_endpoints(self):
+        journey = self.journeys[0]
+        res = assert_query_budget(
+            self.client,
+            "post",
+            HOLD_URL,
+            {
+                "journey": journey.id,
+                "seats": [
+                    {"cargo_num": 1, "place_in_cargo": place_in_cargo}
+                    for place_in_cargo in (1, 2, 3, 4)
+                ],
+            },
+            format="json",
+        )
+        other = hold_seats(self.user, journey, [(2, 1), (2, 2)], minutes=5)
+
+        assert_query_budget(self.client, "get", HOLD_URL)
+        assert_query_budget(
+            self.client,
+            "post",
+            reverse("task:seathold-confirm", args=[res.data["id"]]),
+        )
+        assert_query_budget(
+            self.client,
+            "delete",
+            reverse("task:seathold-detail", args=[other.id]),
+        )
+
+    def test_reference_endpoints(self):
+        journey = self.journeys[0]
+        for name, pk in (
+            ("train", journey.train_id),
+            ("route", journey.route_id),
+            ("station", journey.route.source_id),
+            ("crew", journey.crew.first().id),
+        ):
+            assert_query_budget(self.client, "get", reverse(f"task:{name}-list"))
+            assert_query_budget(
+                self.client, "get", reverse(f"task:{name}-detail", args=[pk])
+            )
+
+        assert_query_budget(
+            self.client,
+            "delete",
+            reverse("task:train-detail", args=[journey.train_id]),
+        )
+        assert_query_budget(self.client, "get", reverse("user:manage"))
+
+    def test_budget_exceeded(self):
+        self.create_order([(self.journeys[0], 1, 1)])
+
+        with mock.patch.dict(OrderViewSet.query_budgets, {"list": 1}):
+            with self.assertRaises(QueryBudgetExceeded) as error:
+                assert_query_budget(self.client, "get", ORDER_URL)
+
+        self.assertIn("budget is 1", str(error.exception))
+        self.assertIn('FROM "task_ticket"', str(error.exception))
+
+    @modify_settings(
+        MIDDLEWARE={"append": "task.query_budget.QueryBudgetMiddleware"}
+    )
+    def test_middleware_logs_exceeded_budget(self):
+        self.create_order([(self.journeys[0], 1, 1)])
+
+        with mock.patch.dict(OrderViewSet.query_budgets, {"list": 1}):
+            with self.assertLogs("task.query_budget", "WARNING") as logs:
+                self.client.get(ORDER_URL)
+
+        self.assertIn(f"GET {ORDER_URL}", logs.output[0])
+
+    @modify_settings(
+        MIDDLEWARE={"append": "task.query_budget.QueryBudgetMiddleware"}
+    )
+    def test_middleware_counts_streamed_queries(self):
+        self.create_order([(self.journeys[0], 1, 1)])
+        export_url = reverse("task:order-export")
+
+        with mock.patch.dict(OrderViewSet.query_budgets, {"export": 1}):
+            res = self.client.get(export_url)
+            with self.assertLogs("task.query_budget", "WARNING") as logs:
+                b"".join(res.streaming_content)
+
+        self.assertIn(
+            f"GET {export_url} ran 2 queries, budget is 1", logs.output[0]
+        )
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    @modify_settings(
+        MIDDLEWARE={"append": "task.query_budget.QueryBudgetMiddleware"}
+    )
+    def test_middleware_raises_exceeded_budget(self):
+        self.create_order([(self.journeys[0], 1, 1)])
+
+        with mock.patch.dict(OrderViewSet.query_budgets, {"list": 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(ORDER_URL)
+
+
+class DataSizeQueryTests(TestCase):
+    """Write actions run the same queries whatever the amount of data
+    they touch, so their budgets hold in production as in the tests.
+    Every action runs on a network of one and of four of everything"""
+    sizes = (1, 4)
+
+    def setUp(self):
+        self.addCleanup(throttle_store().clear)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_superuser(
+            "admin@test.com", "testpassword"
+        )
+        self.client.force_authenticate(self.user)
+        self.crew = [
+            Crew.objects.create(first_name=f"Adam{number}", last_name="Test")
+            for number in range(2 * max(self.sizes))
+        ]
+        self.network_numbers = itertools.count()
+
+    def network(self, size):
+        """A train and a route with size journeys, each one with
+        size crew, size sold tickets in separate orders
+        and size held seats"""
+        # Networks share the crew, their journeys must not overlap
+        departure_time = datetime(2030, 1, 1) + timedelta(
+            days=10 * next(self.network_numbers)
+        )
+        journeys = [
+            sample_journey(
+                [],
+                departure_time=departure_time,
+                arrival_time=departure_time + timedelta(hours=20),
+            )
+        ]
+        journeys += [
+            Journey.objects.create(
+                route=journeys[0].route,
+                train=journeys[0].train,
+                departure_time=departure_time + timedelta(days=number),
+                arrival_time=(
+                    departure_time + timedelta(days=number, hours=20)
+                ),
+            )
+            for number in range(1, size)
+        ]
+        for journey in journeys:
+            journey.crew.set(self.crew[:size])
+            for place_in_cargo in range(1, size + 1):
+                Ticket.objects.create(
+                    journey=journey,
+                    order=Order.objects.create(user=self.user),
+                    cargo_num=1,
+                    place_in_cargo=place_in_cargo,
+                )
+            hold_seats(
+                self.user,
+                journey,
+                [(2, place) for place in range(1, size + 1)],
+                minutes=5,
+            )
+        return journeys
+
+    def assert_size_independent(self, request):
+        counts = []
+        for size in self.sizes:
+            method, url, data = request(self.network(size), size)
+            with CaptureQueriesContext(connection) as queries:
+                res = assert_query_budget(
+                    self.client, method, url, data, format="json"
+                )
+            self.assertLess(res.status_code, 400, getattr(res, "data", None))
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1], f"{method.upper()} {url}")
+
+    def test_train_endpoints(self):
+        self.assert_size_independent(
+            lambda journeys, size: (
+                "patch",
+                reverse("task:train-detail", args=[journeys[0].train_id]),
+                {"kilometer_price": 1.5},
+            )
+        )
+        self.assert_size_independent(
+            lambda journeys, size: (
+                "delete",
+                reverse("task:train-detail", args=[journeys[0].train_id]),
+                None,
+            )
+        )
+
+    def test_station_and_route_endpoints(self):
+        def move_station(journeys, size):
+            source = journeys[0].route.source
+            for number in range(1, size):
+                Route.objects.create(
+                    source=source,
+                    destination=Station.objects.create(
+                        name=f"Odesa {number}",
+                        latitude=46.48,
+                        longitude=30.72,
+                        service_cost=1,
+                    ),
+                )
+            return (
+                "patch",
+                reverse("task:station-detail", args=[source.id]),
+                {"latitude": 50.5},
+            )
+
+        self.assert_size_independent(move_station)
+        self.assert_size_independent(
+            lambda journeys, size: (
+                "delete",
+                reverse("task:route-detail", args=[journeys[0].route_id]),
+                None,
+            )
+        )
+
+    def test_journey_endpoints(self):
+        def create(journeys, size):
+            journey = journeys[-1]
+            return (
+                "post",
+                JOURNEY_URL,
+                {
+                    "route": journey.route_id,
+                    "train": journey.train_id,
+                    # Later networks reuse the crew
+                    "departure_time": f"2031-01-{size:02}T08:00",
+                    "arrival_time": f"2031-01-{size:02}T12:00",
+                    "crew": [member.id for member in self.crew[:size]],
+                },
+            )
+
+        def update(journeys, size):
+            _, _, data = create(journeys, size)
+            return (
+                "put",
+                reverse("task:journey-detail", args=[journeys[0].id]),
+                {
+                    **data,
+                    "departure_time": f"2032-01-{size:02}T08:00",
+                    "arrival_time": f"2032-01-{size:02}T12:00",
+                    # Replaces the whole crew of the journey
+                    "crew": [member.id for member in self.crew[-size:]],
+                },
+            )
+
+        self.assert_size_independent(create)
+        self.assert_size_independent(update)
+        self.assert_size_independent(
+            lambda journeys, size: (
+                "patch",
+                reverse("task:journey-detail", args=[journeys[0].id]),
+                {"crew": [member.id for member in self.crew[-size:]]},
+            )
+        )
+        self.assert_size_independent(
+            lambda journeys, size: (
+                "delete",
+                reverse("task:journey-detail", args=[journeys[0].id]),
+                None,
+            )
+        )
+
+    def test_crew_destroy(self):
+        def destroy(journeys, size):
+            member = Crew.objects.create(first_name="Eva", last_name="Test")
+            member.journeys.add(*journeys)
+            return (
+                "delete",
+                reverse("task:crew-detail", args=[member.id]),
+                None,
+            )
+
+        self.assert_size_independent(destroy)
+
+    def test_order_endpoints(self):
+        self.assert_size_independent(
+            lambda journeys, size: (
+                "post",
+                ORDER_URL,
+                {
+                    "tickets": [
+                        {
+                            "journey": journeys[0].id,
+                            "cargo_num": 3,
+                            "place_in_cargo": place_in_cargo,
+                        }
+                        for place_in_cargo in range(1, size + 1)
+                    ]
+                },
+            )
+        )
+
+        def destroy(journeys, size):
+            order = Order.objects.create(user=self.user)
+            for journey in journeys:
+                Ticket.objects.create(
+                    journey=journey, order=order, cargo_num=3, place_in_cargo=1
+                )
+            return (
+                "delete",
+                reverse("task:order-detail", args=[order.id]),
+                None,
+            )
+
+        self.assert_size_independent(destroy)
+
+    def test_hold_endpoints(self):
+        self.assert_size_independent(
+            lambda journeys, size: (
+                "post",
+                HOLD_URL,
+                {
+                    "journey": journeys[0].id,
+                    "seats": [
+                        {"cargo_num": 3, "place_in_cargo": place_in_cargo}
+                        for place_in_cargo in range(1, size + 1)
+                    ],
+                },
+            )
+        )
+        self.assert_size_independent(
+            lambda journeys, size: (
+                "post",
+                reverse(
+                    "task:seathold-confirm",
+                    args=[journeys[0].holds.get().id],
+                ),
+                None,
+            )
+        )
+        self.assert_size_independent(
+            lambda journeys, size: (
+                "delete",
+                reverse(
+                    "task:seathold-detail",
+                    args=[journeys[0].holds.get().id],
+                ),
+                None,
+            )
+        )
+
+    def test_template_endpoints(self):
+        def valid_from(journeys):
+            # Days after the journeys of the network, before the next one
+            return journeys[0].departure_time.date() + timedelta(days=5)
+
+        def create(journeys, size):
+            return (
+                "post",
+                reverse("task:timetabletemplate-list"),
+                {
+                    "route": journeys[0].route_id,
+                    "train": journeys[0].train_id,
+                    "departure_time": "08:30",
+                    "duration": "06:00:00",
+                    "weekdays": [1, 2, 3, 4, 5, 6, 7],
+                    "valid_from": valid_from(journeys).isoformat(),
+                    "valid_until": (
+                        valid_from(journeys) + timedelta(days=size - 1)
+                    ).isoformat(),
+                    "crew": [member.id for member in self.crew[:size]],
+                },
+            )
+
+        def template(journeys, size):
+            method, url, data = create(journeys, size)
+            res = self.client.post(url, data, format="json")
+            return TimetableTemplate.objects.get(pk=res.data["id"])
+
+        self.assert_size_independent(create)
+        self.assert_size_independent(
+            lambda journeys, size: (
+                "post",
+                reverse(
+                    "task:timetabletemplate-generate",
+                    args=[template(journeys, size).id],
+                ),
+                {"date_from": valid_from(journeys).isoformat()},
+            )
+        )
+
+        def destroy(journeys, size):
+            template_id = template(journeys, size).id
+            self.client.post(
+                reverse("task:timetabletemplate-generate", args=[template_id]),
+                {"date_from": valid_from(journeys).isoformat()},
+                format="json",
+            )
+            return (
+                "delete",
+                reverse("task:timetabletemplate-detail", args=[template_id]),
+                None,
+            )
+
+        self.assert_size_independent(destroy)
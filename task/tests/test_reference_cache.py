@@ -0,0 +1,123 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import F, QuerySet
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+from rest_framework import status
+from task.caching import version_key
+from task.models import (
+    DataVersion,
+    Station,
+    Route,
+    TrainType,
+    Train,
+)
+
+
+STATION_URL = reverse("task:station-list")
+ROUTE_URL = reverse("task:route-list")
+TRAIN_URL = reverse("task:train-list")
+
+
+def station_detail_url(station_id):
+    return reverse("task:station-detail", args=[station_id])
+
+
+class ReferenceCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpassword"
+        )
+        self.client.force_authenticate(self.user)
+
+        self.kiev = Station.objects.create(
+            name="Kiev", latitude=50.45, longitude=30.52, service_cost=2
+        )
+        self.lviv = Station.objects.create(
+            name="Lviv", latitude=49.84, longitude=24.02, service_cost=3
+        )
+        Route.objects.create(source=self.kiev, destination=self.lviv)
+        self.train_type = TrainType.objects.create(type_name="test_type")
+        Train.objects.create(
+            name="Test train 215",
+            cargo_num=2,
+            places_in_cargo=3,
+            kilometer_price=1.2,
+            train_type=self.train_type,
+        )
+
+    def test_not_modified_with_version_query(self):
+        res = self.client.get(STATION_URL)
+        etag = res["ETag"]
+
+        with self.assertNumQueries(1):
+            res = self.client.get(STATION_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+        self.assertFalse(res.content)
+
+    def test_cached_response_with_version_query(self):
+        first = self.client.get(station_detail_url(self.kiev.id))
+
+        with self.assertNumQueries(1):
+            res = self.client.get(station_detail_url(self.kiev.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, first.data)
+        self.assertEqual(res["ETag"], first["ETag"])
+
+    def test_other_etag_gets_content(self):
+        res = self.client.get(STATION_URL, HTTP_IF_NONE_MATCH='"other"')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 2)
+
+    def test_save_invalidates(self):
+        res = self.client.get(station_detail_url(self.kiev.id))
+        etag = res["ETag"]
+
+        self.kiev.name = "Kyiv"
+        self.kiev.save()
+        res = self.client.get(
+            station_detail_url(self.kiev.id), HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["name"], "Kyiv")
+        self.assertNotEqual(res["ETag"], etag)
+
+    def test_other_worker_change_invalidates(self):
+        self.client.get(station_detail_url(self.kiev.id))
+
+        # Another worker writes the row and bumps the shared version,
+        # nothing reaches the cache of this one
+        QuerySet.update(Station.objects.filter(pk=self.kiev.pk), name="Kyiv")
+        DataVersion.objects.filter(key=version_key(Station)).update(
+            version=F("version") + 1
+        )
+        res = self.client.get(station_detail_url(self.kiev.id))
+
+        self.assertEqual(res.data["name"], "Kyiv")
+
+    def test_bulk_update_invalidates_dependent_lists(self):
+        self.client.get(ROUTE_URL)
+
+        self.lviv.name = "Lwow"
+        Station.objects.bulk_update([self.lviv], ["name"])
+        res = self.client.get(ROUTE_URL)
+
+        self.assertIn("Lwow", str(res.data))
+
+    def test_queryset_update_invalidates_dependent_lists(self):
+        self.client.get(TRAIN_URL)
+
+        TrainType.objects.update(type_name="express")
+        res = self.client.get(TRAIN_URL)
+
+        self.assertIn("express", str(res.data))
@@ -1,4 +1,9 @@
+import json
+import os
+import tempfile
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 from django.urls import reverse
 
@@ -133,3 +138,93 @@ class AdminRouteApiTests(TestCase):
         res = self.client.delete(url)
 
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class RouteDistanceTests(TestCase):
+    def setUp(self):
+        self.station1 = sample_station(name="Kiev", latitude=50.45)
+        self.station2 = sample_station(name="Lviv", latitude=49.84)
+        self.route = Route.objects.create(
+            source=self.station1,
+            destination=self.station2
+        )
+
+    def test_distance_stored_on_create(self):
+        self.assertEqual(
+            Route.objects.get(pk=self.route.pk).distance,
+            self.route.calculate_distance()
+        )
+
+    def test_station_save_updates_distance(self):
+        self.station2.latitude = 46.48
+        self.station2.save()
+
+        route = Route.objects.get(pk=self.route.pk)
+
+        self.assertEqual(route.distance, route.calculate_distance())
+
+    def test_station_bulk_update_updates_distance(self):
+        Station.objects.filter(pk=self.station1.pk).update(longitude=30.52)
+        route = Route.objects.get(pk=self.route.pk)
+        self.assertEqual(route.distance, route.calculate_distance())
+
+        self.station2.latitude = 48.0
+        Station.objects.bulk_update([self.station2], ["latitude"])
+        route = Route.objects.get(pk=self.route.pk)
+        self.assertEqual(route.distance, route.calculate_distance())
+
+    def test_distance_of_loaded_fixture(self):
+        fixture = [
+            {
+                "model": "task.route",
+                "pk": 10,
+                "fields": {"source": 20, "destination": 21},
+            },
+            {
+                "model": "task.station",
+                "pk": 20,
+                "fields": {
+                    "name": "Odesa",
+                    "latitude": 46.48,
+                    "longitude": 30.72,
+                    "service_cost": 1,
+                },
+            },
+            {
+                "model": "task.station",
+                "pk": 21,
+                "fields": {
+                    "name": "Lviv",
+                    "latitude": 49.84,
+                    "longitude": 24.03,
+                    "service_cost": 1,
+                },
+            },
+        ]
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".json", delete=False
+        ) as file:
+            json.dump(fixture, file)
+        self.addCleanup(os.remove, file.name)
+
+        call_command("loaddata", file.name, verbosity=0)
+
+        route = Route.objects.get(pk=10)
+        self.assertGreater(route.distance, 0)
+        self.assertEqual(route.distance, route.calculate_distance())
+
+    def test_filter_and_order_by_distance(self):
+        station3 = sample_station(name="Odesa", latitude=46.48)
+        far_route = Route.objects.create(
+            source=self.station1,
+            destination=station3
+        )
+
+        self.assertEqual(
+            list(Route.objects.order_by("-distance")),
+            [far_route, self.route]
+        )
+        self.assertEqual(
+            list(Route.objects.filter(distance__lt=far_route.distance)),
+            [self.route]
+        )
@@ -1,10 +1,16 @@
+import json
+import os
+import tempfile
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
-from task.models import Station
+from task.distance_matrix import distance_matrix
+from task.models import Station, Train, TrainType, station_distance
 from task.serializers import (
     StationListSerializer,
     StationSerializer,
@@ -12,6 +18,8 @@ from task.serializers import (
 
 
 STATION_URL = reverse("task:station-list")
+DISTANCE_MATRIX_URL = reverse("task:station-distance-matrix")
+AUTOCOMPLETE_URL = reverse("task:station-autocomplete")
 
 
 def sample_station(**params):
@@ -71,6 +79,80 @@ class AuthenticatedStationApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    def test_autocomplete(self):
+        kiev = sample_station(name="Kiev")
+        kyiv = sample_station(name="Kýiv-Pasazhyrskyi")
+        sample_station(name="Lviv")
+        sample_station(name="Nizhyn-Kiev")
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "KI"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [station["id"] for station in res.data],
+            [kiev.id]
+        )
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "ky"})
+        self.assertEqual(res.data, [{"id": kyiv.id, "name": kyiv.name}])
+
+    def test_autocomplete_limit(self):
+        for number in range(5):
+            sample_station(name=f"Odesa {number}")
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "od", "limit": 3})
+
+        self.assertEqual(len(res.data), 3)
+
+    def test_normalized_name_follows_bulk_writes(self):
+        Station.objects.bulk_create(
+            [
+                Station(
+                    name="Ódesa",
+                    latitude=46.48,
+                    longitude=30.72,
+                    service_cost=2.3,
+                )
+            ]
+        )
+        self.assertTrue(Station.objects.name_startswith("odes").exists())
+
+        Station.objects.filter(name="Ódesa").update(name="Chernihiv")
+        self.assertTrue(Station.objects.name_startswith("cher").exists())
+        self.assertFalse(Station.objects.name_startswith("odes").exists())
+
+    def test_normalized_name_of_loaded_fixture(self):
+        fixture = [
+            {
+                "model": "task.station",
+                "pk": 20,
+                "fields": {
+                    "name": "Ódesa",
+                    "latitude": 46.48,
+                    "longitude": 30.72,
+                    "service_cost": 1,
+                },
+            },
+        ]
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".json", delete=False
+        ) as file:
+            json.dump(fixture, file)
+        self.addCleanup(os.remove, file.name)
+
+        call_command("loaddata", file.name, verbosity=0)
+
+        self.assertEqual(
+            list(Station.objects.name_startswith("odes").values_list(
+                "pk", flat=True
+            )),
+            [20],
+        )
+
+    def test_distance_matrix_forbidden(self):
+        res = self.client.get(DISTANCE_MATRIX_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
     def test_create_station_forbidden(self):
         payload = {
             "name": "Sample station",
@@ -117,3 +199,55 @@ class AdminStationApiTests(TestCase):
         res = self.client.delete(url)
 
         self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_distance_matrix(self):
+        kiev = sample_station(name="Kiev", latitude=50.45, longitude=30.52)
+        lviv = sample_station(name="Lviv", latitude=49.84, longitude=24.02)
+        sample_station(name="Odesa", latitude=46.48, longitude=30.72)
+        train = Train.objects.create(
+            name="Express",
+            cargo_num=10,
+            places_in_cargo=40,
+            kilometer_price=1.2,
+            train_type=TrainType.objects.create(type_name="express"),
+        )
+
+        res = self.client.get(
+            DISTANCE_MATRIX_URL,
+            {"stations": f"{kiev.id},{lviv.id}", "train": train.id}
+        )
+        distance = station_distance(
+            kiev.latitude, kiev.longitude, lviv.latitude, lviv.longitude
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["stations"], [kiev.id, lviv.id])
+        self.assertEqual(res.data["distances"], [[0, distance], [distance, 0]])
+        self.assertEqual(
+            res.data["fares"][0][1],
+            (distance * 1.2 + 2.3 + 2.3) * 100 // 1 / 100
+        )
+
+    def test_distance_matrix_invalid_train(self):
+        res = self.client.get(DISTANCE_MATRIX_URL, {"train": "express"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DistanceMatrixTests(TestCase):
+    def test_matches_station_distance(self):
+        points = [
+            (50.45, 30.52),
+            (49.84, 24.02),
+            (46.48, 30.72),
+            (-33.86, 151.2),
+            (40.71, -74.0),
+        ]
+
+        matrix = distance_matrix(*zip(*points))
+
+        for row, (lat1, lon1) in enumerate(points):
+            for column, (lat2, lon2) in enumerate(points):
+                self.assertEqual(
+                    matrix[row, column],
+                    station_distance(lat1, lon1, lat2, lon2)
+                )
@@ -0,0 +1,191 @@
+import shutil
+import tempfile
+from unittest import mock, skipIf
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework.throttling import SimpleRateThrottle
+
+from task.throttling import (
+    RedisBucketStore,
+    SQLiteBucketStore,
+    throttle_keys,
+    throttle_store,
+)
+
+try:
+    import fakeredis
+    import lupa  # noqa: F401, fakeredis runs Lua scripts with it
+except ImportError:
+    fakeredis = None
+
+CREATE_USER_URL = reverse("user:create")
+ME_URL = reverse("user:manage")
+
+
+class BucketStoreTestMixin:
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch(
+            "task.throttling.time.time", side_effect=lambda: self.now
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.store = self.make_store()
+
+    def test_capacity_then_wait(self):
+        waits = [self.store.take("user_1", 3, 60) for _ in range(4)]
+
+        self.assertEqual(waits[:3], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(waits[3], 20.0)
+
+    def test_tokens_refill(self):
+        for _ in range(3):
+            self.store.take("user_1", 3, 60)
+
+        self.now += 19
+        self.assertAlmostEqual(self.store.take("user_1", 3, 60), 1.0)
+        self.now += 1
+        self.assertEqual(self.store.take("user_1", 3, 60), 0.0)
+        self.assertGreater(self.store.take("user_1", 3, 60), 0)
+
+    def test_keys_are_separate(self):
+        self.store.take("user_1", 1, 60)
+
+        self.assertGreater(self.store.take("user_1", 1, 60), 0)
+        self.assertEqual(self.store.take("user_2", 1, 60), 0.0)
+
+    def test_delete_and_clear(self):
+        self.store.take("user_1", 1, 60)
+        self.store.take("user_2", 1, 60)
+
+        self.store.delete(["user_1"])
+
+        self.assertEqual(self.store.take("user_1", 1, 60), 0.0)
+        self.assertGreater(self.store.take("user_2", 1, 60), 0)
+
+        self.store.clear()
+
+        self.assertEqual(self.store.take("user_2", 1, 60), 0.0)
+
+
+class SQLiteBucketStoreTests(BucketStoreTestMixin, SimpleTestCase):
+    def make_store(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.location = f"{directory}/throttle.sqlite3"
+        return SQLiteBucketStore(self.location)
+
+    def test_shared_by_stores_of_one_file(self):
+        other = SQLiteBucketStore(self.location)
+        self.store.take("user_1", 2, 60)
+        other.take("user_1", 2, 60)
+
+        self.assertGreater(self.store.take("user_1", 2, 60), 0)
+
+    def test_full_buckets_purged(self):
+        self.store.purge_every = 2
+        self.store.take("user_1", 2, 60)
+        self.now += 60
+
+        self.store.take("user_2", 2, 60)
+
+        self.assertEqual(
+            self.store.connection.execute(
+                "SELECT key FROM throttle_bucket"
+            ).fetchall(),
+            [("user_2",)],
+        )
+
+
+@skipIf(fakeredis is None, "fakeredis[lua] is not installed")
+class RedisBucketStoreTests(BucketStoreTestMixin, SimpleTestCase):
+    """Runs the Lua script of the store in fakeredis"""
+
+    def make_store(self):
+        self.client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+        return RedisBucketStore(None, client=self.client)
+
+    def test_keys_expire_when_full(self):
+        self.store.take("user_1", 2, 60)
+
+        # Full again 30 seconds later, when the key expires
+        self.assertEqual(self.client.keys(), [b"throttle:user_1"])
+        self.assertEqual(float(self.client.get("throttle:user_1")), 1030.0)
+        self.assertEqual(self.client.pttl("throttle:user_1"), 30000)
+
+
+@mock.patch.object(
+    SimpleRateThrottle,
+    "THROTTLE_RATES",
+    {"anon": "100/minute", "user": "3/minute", "register": "2/minute"},
+)
+class RateThrottleApiTests(TestCase):
+    def setUp(self):
+        self.addCleanup(throttle_store().clear)
+        self.client = APIClient()
+
+    def test_scoped_limit(self):
+        statuses = [
+            self.client.post(
+                CREATE_USER_URL,
+                {"email": f"user{number}@test.com", "password": "test12345"},
+            ).status_code
+            for number in range(3)
+        ]
+
+        self.assertEqual(
+            statuses,
+            [
+                status.HTTP_201_CREATED,
+                status.HTTP_201_CREATED,
+                status.HTTP_429_TOO_MANY_REQUESTS,
+            ],
+        )
+
+    def test_user_limit_shared_by_clients(self):
+        user = get_user_model().objects.create_user(
+            "test@test.com", "testpassword"
+        )
+        clients = [APIClient(), APIClient()]
+        for client in clients:
+            client.force_authenticate(user)
+
+        for client in (*clients, clients[0]):
+            self.assertEqual(client.get(ME_URL).status_code, status.HTTP_200_OK)
+        res = clients[1].get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res["Retry-After"], "20")
+
+    def test_reset_keys(self):
+        user = get_user_model().objects.create_user(
+            "test@test.com", "testpassword"
+        )
+        self.client.force_authenticate(user)
+        for _ in range(3):
+            self.client.get(ME_URL)
+
+        throttle_store().delete(throttle_keys([user.pk]))
+
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_200_OK)
+
+
+class ThrottleStoreSettingTests(SimpleTestCase):
+    def test_store_follows_setting(self):
+        with override_settings(
+            THROTTLE_STORE={"BACKEND": "task.throttling.NullBucketStore"}
+        ):
+            store = throttle_store()
+            self.assertEqual(
+                [store.take("user_1", 1, 60) for _ in range(3)],
+                [0.0, 0.0, 0.0],
+            )
+
+        self.assertIsInstance(throttle_store(), SQLiteBucketStore)
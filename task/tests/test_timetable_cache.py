@@ -0,0 +1,185 @@
+from datetime import timedelta
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+from rest_framework import status
+from task.models import (
+    DataVersion,
+    Station,
+    Route,
+    Journey,
+    TrainType,
+    Train,
+)
+from task.seats import occupy_seats
+from task.timetable import TIMETABLE_VERSION_KEY, timetable_cache
+
+
+CONNECTIONS_URL = reverse("task:journey-connections")
+TIMETABLE_STATS_URL = reverse("task:journey-timetable-stats")
+
+
+def sample_train(**params):
+    train_type, _ = TrainType.objects.get_or_create(type_name="test_type")
+    defaults = {
+        "name": "Test train 215",
+        "cargo_num": 2,
+        "places_in_cargo": 3,
+        "kilometer_price": 1.2,
+        "train_type": train_type
+    }
+    defaults.update(params)
+
+    return Train.objects.create(**defaults)
+
+
+class TimetableCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpassword"
+        )
+        self.client.force_authenticate(self.user)
+
+        self.kiev = Station.objects.create(
+            name="Kiev", latitude=50.45, longitude=30.52, service_cost=2
+        )
+        self.lviv = Station.objects.create(
+            name="Lviv", latitude=49.84, longitude=24.02, service_cost=3
+        )
+        self.route = Route.objects.create(
+            source=self.kiev, destination=self.lviv
+        )
+        self.train = sample_train()
+        self.departure_time = timezone.now().replace(microsecond=0)
+        self.journey = self.sample_journey(hours=2)
+
+    def sample_journey(self, hours):
+        departure_time = self.departure_time + timedelta(hours=hours)
+        return Journey.objects.create(
+            route=self.route,
+            train=self.train,
+            departure_time=departure_time,
+            arrival_time=departure_time + timedelta(hours=8),
+        )
+
+    def search(self):
+        return self.client.get(
+            CONNECTIONS_URL,
+            {
+                "source": self.kiev.id,
+                "destination": self.lviv.id,
+                "departure_time": self.departure_time.isoformat(),
+            },
+        )
+
+    def test_search_uses_cache(self):
+        res = self.search()
+        rebuild_count = timetable_cache.rebuild_count
+
+        with self.assertNumQueries(1):
+            timetable_cache.get()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]["legs"][0]["journey"], self.journey.id)
+        self.assertEqual(timetable_cache.rebuild_count, rebuild_count)
+
+    def test_journey_create_rebuilds(self):
+        self.search()
+        journey = self.sample_journey(hours=1)
+
+        res = self.search()
+
+        self.assertEqual(res.data[0]["legs"][0]["journey"], journey.id)
+
+    def test_station_bulk_update_rebuilds(self):
+        timetable_cache.get()
+        self.kiev.latitude = 48.0
+        Station.objects.bulk_update([self.kiev], ["latitude"])
+        rebuild_count = timetable_cache.rebuild_count
+
+        timetable = timetable_cache.get()
+
+        self.assertEqual(timetable_cache.rebuild_count, rebuild_count + 1)
+        self.assertEqual(timetable.stations[self.kiev.id][0], 48.0)
+
+    def test_other_worker_change_rebuilds(self):
+        timetable_cache.get()
+        rebuild_count = timetable_cache.rebuild_count
+
+        DataVersion.objects.filter(key=TIMETABLE_VERSION_KEY).update(
+            version=DataVersion.current(TIMETABLE_VERSION_KEY) + 1
+        )
+        timetable_cache.get()
+
+        self.assertEqual(timetable_cache.rebuild_count, rebuild_count + 1)
+
+    def test_ticket_sale_keeps_cache(self):
+        timetable_cache.get()
+        rebuild_count = timetable_cache.rebuild_count
+
+        occupy_seats(self.journey.id, [(1, 1)])
+        timetable_cache.get()
+
+        self.assertEqual(timetable_cache.rebuild_count, rebuild_count)
+
+    def test_timetable_stats_admin_only(self):
+        res = self.client.get(TIMETABLE_STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(TIMETABLE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["journeys"], 1)
+        self.assertGreater(res.data["memory_bytes"], 0)
+        self.assertGreaterEqual(res.data["rebuild_count"], 1)
+
+    def version_change(self, delete):
+        version = DataVersion.current(TIMETABLE_VERSION_KEY)
+        delete()
+        return DataVersion.current(TIMETABLE_VERSION_KEY) - version
+
+    def test_cascading_destroy_bumps_once(self):
+        self.user.is_staff = True
+        self.user.save()
+        for hours in range(3, 6):
+            self.sample_journey(hours=hours)
+        other_train = sample_train(name="Test train 216")
+        Journey.objects.create(
+            route=self.route,
+            train=other_train,
+            departure_time=self.departure_time,
+            arrival_time=self.departure_time + timedelta(hours=8),
+        )
+
+        changes = [
+            self.version_change(
+                lambda: self.client.delete(
+                    reverse("task:train-detail", args=[train.id])
+                )
+            )
+            for train in (self.train, other_train)
+        ]
+
+        self.assertEqual(changes, [1, 1])
+        self.assertFalse(Journey.objects.exists())
+
+    def test_cascading_admin_delete_bumps_once(self):
+        for hours in range(3, 6):
+            self.sample_journey(hours=hours)
+        route_admin = admin.site._registry[Route]
+
+        change = self.version_change(
+            lambda: route_admin.delete_queryset(None, Route.objects.all())
+        )
+
+        self.assertEqual(change, 1)
+        self.assertFalse(Journey.objects.exists())
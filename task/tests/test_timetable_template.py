@@ -0,0 +1,361 @@
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from task.conflicts import ScheduleConflict
+from task.models import (
+    Crew,
+    DataVersion,
+    Journey,
+    Order,
+    Route,
+    Station,
+    Ticket,
+    TimetableTemplate,
+    Train,
+    TrainType,
+)
+from task.query_budget import assert_query_budget
+from task.recurring import generate_journeys
+from task.timetable import TIMETABLE_VERSION_KEY
+from task.throttling import throttle_store
+
+TEMPLATE_URL = reverse("task:timetabletemplate-list")
+
+# Monday and Friday
+MONDAY_FRIDAY = 0b10001
+
+
+def sample_route():
+    return Route.objects.create(
+        source=Station.objects.create(
+            name="Kiev", latitude=50.45, longitude=30.52, service_cost=2
+        ),
+        destination=Station.objects.create(
+            name="Lviv", latitude=49.84, longitude=24.03, service_cost=1
+        ),
+    )
+
+
+def sample_train(**params):
+    train_type, _ = TrainType.objects.get_or_create(type_name="test_type")
+    defaults = {
+        "name": "Intercity",
+        "cargo_num": 2,
+        "places_in_cargo": 10,
+        "kilometer_price": 1.2,
+        "train_type": train_type,
+    }
+    defaults.update(params)
+    return Train.objects.create(**defaults)
+
+
+def generate_url(template_id):
+    return reverse("task:timetabletemplate-generate", args=[template_id])
+
+
+class TimetableTemplateTests(TestCase):
+    def setUp(self):
+        self.crew = [
+            Crew.objects.create(first_name="Ivan", last_name="Petrenko"),
+            Crew.objects.create(first_name="Olena", last_name="Shevchenko"),
+        ]
+        # 2024-01-01 is a Monday
+        self.template = TimetableTemplate.objects.create(
+            route=sample_route(),
+            train=sample_train(),
+            departure_time=time(8, 30),
+            duration=timedelta(hours=6),
+            weekdays=MONDAY_FRIDAY,
+            valid_from=date(2024, 1, 1),
+            valid_until=date(2024, 1, 14),
+        )
+        self.template.crew.set(self.crew)
+
+    def generate(self, date_from=date(2024, 1, 1), date_to=None):
+        return generate_journeys(
+            TimetableTemplate.objects.all(), date_from, date_to
+        )
+
+    def departures(self):
+        return [
+            journey.departure_time
+            for journey in Journey.objects.order_by("departure_time")
+        ]
+
+    def test_generate_journeys(self):
+        counts = self.generate()
+
+        self.assertEqual(counts["created"], 4)
+        self.assertEqual(
+            self.departures(),
+            [
+                datetime(2024, 1, day, 8, 30)
+                for day in (1, 5, 8, 12)
+            ],
+        )
+        journey = Journey.objects.first()
+        self.assertEqual(journey.arrival_time - journey.departure_time,
+                         timedelta(hours=6))
+        self.assertEqual(journey.template, self.template)
+        self.assertEqual(
+            set(journey.crew.values_list("id", flat=True)),
+            {member.id for member in self.crew},
+        )
+
+    def test_generate_again_changes_nothing(self):
+        self.generate()
+
+        counts = self.generate()
+
+        self.assertEqual(
+            counts,
+            {"created": 0, "updated": 0, "deleted": 0,
+             "unchanged": 4, "kept": 0},
+        )
+        self.assertEqual(Journey.objects.count(), 4)
+        self.assertEqual(Journey.crew.through.objects.count(), 8)
+
+    def test_regenerate_window_only(self):
+        self.generate()
+        self.template.departure_time = time(9, 0)
+        self.template.duration = timedelta(hours=5)
+        self.template.save()
+        self.template.crew.set(self.crew[:1])
+        version = DataVersion.current(TIMETABLE_VERSION_KEY)
+
+        counts = self.generate(date(2024, 1, 8), date(2024, 1, 14))
+
+        # Deleted and created journeys bump the timetable version once
+        self.assertEqual(
+            DataVersion.current(TIMETABLE_VERSION_KEY), version + 1
+        )
+        self.assertEqual(counts["created"], 2)
+        self.assertEqual(counts["deleted"], 2)
+        self.assertEqual(
+            self.departures(),
+            [
+                datetime(2024, 1, 1, 8, 30),
+                datetime(2024, 1, 5, 8, 30),
+                datetime(2024, 1, 8, 9, 0),
+                datetime(2024, 1, 12, 9, 0),
+            ],
+        )
+        self.assertEqual(
+            [journey.crew.count() for journey in Journey.objects.order_by(
+                "departure_time"
+            )],
+            [2, 2, 1, 1],
+        )
+
+    def test_update_changed_train_and_crew(self):
+        self.generate()
+        self.template.train = sample_train(name="Night")
+        self.template.save()
+        self.template.crew.set(self.crew[1:])
+
+        counts = self.generate()
+
+        self.assertEqual(counts["updated"], 4)
+        self.assertEqual(
+            set(Journey.objects.values_list("train__name", flat=True)),
+            {"Night"},
+        )
+        self.assertEqual(
+            set(
+                Journey.crew.through.objects.values_list("crew_id", flat=True)
+            ),
+            {self.crew[1].id},
+        )
+
+    def test_journeys_with_tickets_are_kept(self):
+        self.generate()
+        journey = Journey.objects.order_by("departure_time").first()
+        user = get_user_model().objects.create_user(
+            "test@test.com", "testpassword"
+        )
+        Ticket.objects.create(
+            order=Order.objects.create(user=user),
+            journey=journey,
+            cargo_num=1,
+            place_in_cargo=1,
+        )
+        self.template.weekdays = 0b10000
+        self.template.save()
+
+        counts = self.generate()
+
+        self.assertEqual(counts["kept"], 1)
+        self.assertEqual(counts["deleted"], 1)
+        self.assertEqual(
+            self.departures(),
+            [journey.departure_time] + [
+                datetime(2024, 1, day, 8, 30) for day in (5, 12)
+            ],
+        )
+
+    def test_shortened_validity_deletes_journeys(self):
+        self.generate()
+        self.template.valid_until = date(2024, 1, 7)
+        self.template.save()
+
+        counts = self.generate()
+
+        self.assertEqual(counts["deleted"], 2)
+        self.assertEqual(Journey.objects.count(), 2)
+
+    def test_overlapping_generation_writes_nothing(self):
+        # Created directly, the validation of the API is skipped
+        journey = Journey.objects.create(
+            route=self.template.route,
+            train=sample_train(name="Regional"),
+            departure_time=datetime(2024, 1, 8, 12),
+            arrival_time=datetime(2024, 1, 8, 16),
+        )
+        journey.crew.add(self.crew[1])
+
+        with self.assertRaisesMessage(
+            ScheduleConflict, f"Overlapping journeys, crew {self.crew[1].id}"
+        ):
+            self.generate()
+        self.assertEqual(Journey.objects.count(), 1)
+
+        with self.assertRaisesMessage(CommandError, "Nothing generated."):
+            call_command("generate_timetable", "--from", "2024-01-01")
+        self.assertEqual(Journey.objects.count(), 1)
+
+        # Journeys of the window not running during the conflict are fine
+        self.assertEqual(self.generate(date_to=date(2024, 1, 7))["created"], 2)
+
+    def test_generate_command(self):
+        out = StringIO()
+
+        call_command(
+            "generate_timetable",
+            "--from", "2024-01-01",
+            "--to", "2024-01-07",
+            stdout=out,
+        )
+
+        self.assertIn("journeys: 2 created", out.getvalue())
+        with self.assertRaisesMessage(CommandError, "Unknown templates 0"):
+            call_command("generate_timetable", "--template", "0")
+
+
+class TimetableTemplateApiTests(TestCase):
+    def setUp(self):
+        # Throttle history of the many requests must not reach other tests
+        self.addCleanup(throttle_store().clear)
+        self.admin = get_user_model().objects.create_superuser(
+            "admin@test.com", "testpassword"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.crew = Crew.objects.create(first_name="Ivan", last_name="Petrenko")
+        self.payload = {
+            "route": sample_route().id,
+            "train": sample_train().id,
+            "departure_time": "08:30",
+            "duration": "06:00:00",
+            "weekdays": [1, 5],
+            "valid_from": "2024-01-01",
+            "valid_until": "2024-01-14",
+            "crew": [self.crew.id],
+        }
+
+    def test_create_and_generate(self):
+        res = assert_query_budget(
+            self.client, "post", TEMPLATE_URL, self.payload, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["weekdays"], [1, 5])
+        self.assertEqual(
+            TimetableTemplate.objects.get().weekdays, MONDAY_FRIDAY
+        )
+
+        res = assert_query_budget(
+            self.client,
+            "post",
+            generate_url(res.data["id"]),
+            {"date_from": "2024-01-01"},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data,
+            {"created": 4, "updated": 0, "deleted": 0,
+             "unchanged": 0, "kept": 0},
+        )
+        self.assertEqual(Journey.crew.through.objects.count(), 4)
+
+    def test_invalid_template(self):
+        for field, value in (
+            ("weekdays", [0]),
+            ("weekdays", []),
+            ("valid_until", "2023-12-31"),
+            ("duration", "00:00:00"),
+        ):
+            with self.subTest(field=field, value=value):
+                res = self.client.post(
+                    TEMPLATE_URL,
+                    {**self.payload, field: value},
+                    format="json",
+                )
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn(field, res.data)
+
+    def test_invalid_window(self):
+        template_id = self.client.post(
+            TEMPLATE_URL, self.payload, format="json"
+        ).data["id"]
+
+        res = self.client.post(
+            generate_url(template_id),
+            {"date_from": "2024-01-10", "date_to": "2024-01-01"},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Journey.objects.exists())
+
+    def test_generate_overlapping_journeys_rejected(self):
+        template_id = self.client.post(
+            TEMPLATE_URL, self.payload, format="json"
+        ).data["id"]
+        Journey.objects.create(
+            route_id=self.payload["route"],
+            train_id=self.payload["train"],
+            departure_time=datetime(2024, 1, 5, 6),
+            arrival_time=datetime(2024, 1, 5, 9),
+        )
+
+        res = self.client.post(
+            generate_url(template_id), {"date_from": "2024-01-01"},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Overlapping journeys, train", str(res.data))
+        self.assertEqual(Journey.objects.count(), 1)
+
+    def test_generate_admin_only(self):
+        template_id = self.client.post(
+            TEMPLATE_URL, self.payload, format="json"
+        ).data["id"]
+        user = get_user_model().objects.create_user(
+            "test@test.com", "testpassword"
+        )
+        self.client.force_authenticate(user)
+
+        res = self.client.post(generate_url(template_id))
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,254 @@
+import itertools
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.throttling import (
+    AnonRateThrottle,
+    SimpleRateThrottle,
+    UserRateThrottle,
+)
+
+# A bucket of N requests per period refills one token every period / N.
+# It is kept as the single time at which it is full again: taking a token
+# moves that time one interval later, and a token is available while it
+# stays within one period from now. Checks are O(1) in every store.
+
+SQLITE_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS throttle_bucket (
+        key TEXT PRIMARY KEY,
+        full_at REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS throttle_bucket_full_at
+    ON throttle_bucket (full_at)
+    """,
+)
+
+SQLITE_TAKE = """
+    INSERT INTO throttle_bucket (key, full_at) VALUES (:key, :now + :interval)
+    ON CONFLICT (key) DO UPDATE SET full_at = max(full_at, :now) + :interval
+    WHERE max(full_at, :now) + :interval - :now <= :period
+    RETURNING full_at
+"""
+
+REDIS_TAKE = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local period = tonumber(ARGV[3])
+local full_at = math.max(tonumber(redis.call("GET", KEYS[1])) or now, now)
+full_at = full_at + interval
+if full_at - now > period then
+    return tostring(full_at - period - now)
+end
+redis.call(
+    "SET", KEYS[1], tostring(full_at),
+    "PX", math.ceil((full_at - now) * 1000)
+)
+return "0"
+"""
+
+
+class SQLiteBucketStore:
+    """Buckets in a SQLite file shared by the workers of one host.
+    Taking a token is one upsert on the primary key,
+    full buckets are purged every purge_every checks"""
+    purge_every = 1000
+
+    def __init__(self, location):
+        self.location = str(location)
+        self._local = threading.local()
+        self._checks = itertools.count(1)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.location, timeout=5, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            # Losing the last limits on a crash is fine
+            connection.execute("PRAGMA synchronous=OFF")
+            for statement in SQLITE_SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, capacity, period) -> float:
+        """Seconds to wait for a token, 0 when one was taken"""
+        now = time.time()
+        interval = period / capacity
+        if next(self._checks) % self.purge_every == 0:
+            self.connection.execute(
+                "DELETE FROM throttle_bucket WHERE full_at < ?", (now,)
+            )
+        # fetchall steps the statement to the end, releasing the write lock
+        taken = self.connection.execute(
+            SQLITE_TAKE,
+            {"key": key, "now": now, "interval": interval, "period": period},
+        ).fetchall()
+        if taken:
+            return 0.0
+        row = self.connection.execute(
+            "SELECT full_at FROM throttle_bucket WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return 0.0
+        return max(row[0] + interval - period - now, 0.0)
+
+    def delete(self, keys) -> None:
+        self.connection.executemany(
+            "DELETE FROM throttle_bucket WHERE key = ?",
+            [(key,) for key in keys],
+        )
+
+    def clear(self) -> None:
+        self.connection.execute("DELETE FROM throttle_bucket")
+
+
+class RedisBucketStore:
+    """Buckets in Redis, shared by the workers of every host.
+    Taking a token is one script run atomically by the server,
+    keys expire when their bucket is full again"""
+    prefix = "throttle:"
+
+    def __init__(self, location, client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImproperlyConfigured(
+                    "RedisBucketStore needs the redis package"
+                )
+            client = redis.Redis.from_url(location)
+        self.client = client
+
+    def take(self, key, capacity, period) -> float:
+        wait = self.client.eval(
+            REDIS_TAKE, 1, self.prefix + key, time.time(),
+            period / capacity, period,
+        )
+        return float(wait)
+
+    def delete(self, keys) -> None:
+        keys = [self.prefix + key for key in keys]
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=f"{self.prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+class NullBucketStore:
+    """Never throttles"""
+
+    def __init__(self, location=None):
+        pass
+
+    def take(self, key, capacity, period) -> float:
+        return 0.0
+
+    def delete(self, keys) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def throttle_store():
+    """Store configured by the THROTTLE_STORE setting"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            config = settings.THROTTLE_STORE
+            _store = import_string(config["BACKEND"])(config.get("LOCATION"))
+        return _store
+
+
+@receiver(setting_changed)
+def reset_throttle_store(setting, **kwargs):
+    global _store
+    if setting == "THROTTLE_STORE":
+        with _store_lock:
+            _store = None
+
+
+def throttle_keys(idents) -> list:
+    """Keys of the buckets of every configured rate for the idents,
+    user ids or client addresses"""
+    return [
+        SimpleRateThrottle.cache_format % {"scope": scope, "ident": ident}
+        for scope in SimpleRateThrottle.THROTTLE_RATES
+        for ident in idents
+    ]
+
+
+class BucketRateThrottle(SimpleRateThrottle):
+    """SimpleRateThrottle taking tokens from a bucket in the shared
+    store instead of keeping the request history in the local cache,
+    so the limits hold across the workers"""
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.wait_seconds = throttle_store().take(
+            self.key, self.num_requests, self.duration
+        )
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds or None
+
+
+class AnonBucketThrottle(BucketRateThrottle, AnonRateThrottle):
+    pass
+
+
+class UserBucketThrottle(BucketRateThrottle, UserRateThrottle):
+    pass
+
+
+class ScopedBucketThrottle(BucketRateThrottle):
+    """Stricter limits of single endpoints on top of the anon and user
+    ones. Viewsets declare throttle_scopes by action, other views
+    by method name, the rates are those of DEFAULT_THROTTLE_RATES"""
+
+    def __init__(self):
+        # The scope and the rate depend on the view
+        pass
+
+    def allow_request(self, request, view):
+        scopes = getattr(view, "throttle_scopes", None) or {}
+        if hasattr(view, "action"):
+            self.scope = scopes.get(view.action)
+        else:
+            self.scope = scopes.get(request.method.lower())
+        if self.scope is None:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {"scope": self.scope, "ident": ident}
@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.utils import timezone
+
+from task.caching import deferred_version_bumps
+from task.models import DataVersion
+from task.planner import Timetable
+
+
+logger = logging.getLogger(__name__)
+
+TIMETABLE_VERSION_KEY = "timetable"
+
+# Journey columns changed by ticket sales and holds,
+# they do not affect the timetable
+SEAT_FIELDS = frozenset(("tickets_sold", "tickets_held", "seat_map"))
+
+_deferred_change = ContextVar("deferred_timetable_change", default=None)
+
+
+def timetable_changed() -> None:
+    """Bump the shared version so every worker rebuilds its timetable"""
+    deferred = _deferred_change.get()
+    if deferred is not None:
+        deferred.append(True)
+        return
+    DataVersion.bump(TIMETABLE_VERSION_KEY)
+    timetable_cache.invalidate()
+
+
+@contextmanager
+def deferred_timetable_change():
+    """Bump the timetable version once at the end of the block
+    instead of once per journey saved or deleted in it,
+    the versions of the reference models likewise"""
+    changes = []
+    token = _deferred_change.set(changes)
+    try:
+        with deferred_version_bumps():
+            yield
+    finally:
+        _deferred_change.reset(token)
+        if changes:
+            timetable_changed()
+
+
+class TimetableCache:
+    """Process level timetable of journeys departing from a day ago on.
+    Every get() compares the cached version with the DataVersion row,
+    so changes made by other workers are picked up on the next request"""
+    history = timedelta(days=1)
+    max_age = timedelta(hours=1)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timetable = None
+        self._version = None
+        self._built_at = None
+        self.departure_from = None
+        self.rebuild_count = 0
+        self.last_rebuild_seconds = 0.0
+
+    def invalidate(self) -> None:
+        self._version = None
+
+    def get(self) -> Timetable:
+        version = DataVersion.current(TIMETABLE_VERSION_KEY)
+        with self._lock:
+            now = timezone.now()
+            if (
+                self._timetable is None
+                or self._version != version
+                or now - self._built_at > self.max_age
+            ):
+                self._rebuild(version, now)
+            return self._timetable
+
+    def covers(self, departure_time) -> bool:
+        """Whether journeys from departure_time on are all in the cache"""
+        return (
+            self.departure_from is not None
+            and departure_time >= self.departure_from
+        )
+
+    def _rebuild(self, version, now) -> None:
+        started = time.perf_counter()
+        departure_from = now - self.history
+        self._timetable = Timetable.from_db(departure_from=departure_from)
+        self.last_rebuild_seconds = time.perf_counter() - started
+        self.rebuild_count += 1
+        self.departure_from = departure_from
+        self._built_at = now
+        self._version = version
+        logger.info(
+            "Timetable rebuilt: %d journeys, %d bytes in %.3fs",
+            len(self._timetable.journey_ids),
+            self._timetable.nbytes,
+            self.last_rebuild_seconds,
+        )
+
+    def stats(self) -> dict:
+        timetable = self._timetable
+        return {
+            "version": self._version,
+            "built_at": self._built_at,
+            "departure_from": self.departure_from,
+            "journeys": len(timetable.journey_ids) if timetable else 0,
+            "stations": len(timetable.by_source) if timetable else 0,
+            "memory_bytes": timetable.nbytes if timetable else 0,
+            "rebuild_count": self.rebuild_count,
+            "last_rebuild_seconds": round(self.last_rebuild_seconds, 6),
+        }
+
+
+timetable_cache = TimetableCache()
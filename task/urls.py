@@ -1,5 +1,11 @@
 from django.urls import path, include
 from rest_framework import routers
+from task.async_views import (
+    JourneyDetailView,
+    JourneyListView,
+    OrderListView,
+    StationListView,
+)
 from task.views import (
     TrainTypeViewSet,
     TrainViewSet,
@@ -8,6 +14,8 @@ from task.views import (
     RouteViewSet,
     JourneyViewSet,
     OrderViewSet,
+    SeatHoldViewSet,
+    TimetableTemplateViewSet,
 )
 
 router = routers.DefaultRouter()
@@ -18,9 +26,29 @@ router.register("station", StationViewSet)
 router.register("route", RouteViewSet)
 router.register("journey", JourneyViewSet)
 router.register("order", OrderViewSet)
+router.register("hold", SeatHoldViewSet)
+router.register("timetable_template", TimetableTemplateViewSet)
 
 
-urlpatterns = [path("", include(router.urls))]
+urlpatterns = [
+    path(
+        "async/journey/",
+        JourneyListView.as_view(),
+        name="async-journey-list",
+    ),
+    path(
+        "async/journey/<int:pk>/",
+        JourneyDetailView.as_view(),
+        name="async-journey-detail",
+    ),
+    path(
+        "async/station/",
+        StationListView.as_view(),
+        name="async-station-list",
+    ),
+    path("async/order/", OrderListView.as_view(), name="async-order-list"),
+    path("", include(router.urls)),
+]
 
 
 app_name = "task"
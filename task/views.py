@@ -1,10 +1,33 @@
-from rest_framework.pagination import PageNumberPagination
 from rest_framework import viewsets, mixins, status
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
-from django.db.models import F, Count
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import F, Prefetch, Q
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from task.caching import CachedResponseMixin
+from task.conflicts import ScheduleConflict
+from task.distance_matrix import station_matrices
+from task.export import EXPORT_FORMATS, order_chunks, spooled_file
+from task.pagination import KeysetSelectablePagination
+from task.planner import ConnectionPlanner, Timetable
+from task.recurring import generate_journeys
+from task.timetable import deferred_timetable_change, timetable_cache
 from task.permissions import IsAdminOrIfAuthenticatedReadOnly
+from task.seats import (
+    HoldExpired,
+    SeatMap,
+    confirm_hold,
+    deferred_seat_release,
+    release_expired_holds,
+    release_hold,
+)
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from task.models import (
     TrainType,
@@ -14,6 +37,10 @@ from task.models import (
     Route,
     Station,
     Order,
+    Ticket,
+    SeatHold,
+    TimetableTemplate,
+    normalize_name,
 )
 from task.serializers import (
     TrainTypeSerializer,
@@ -30,15 +57,68 @@ from task.serializers import (
     RouteDetailSerializer,
     JourneySerializer,
     JourneyListSerializer,
+    JourneyListValuesSerializer,
     JourneyDetailSerializer,
     OrderSerializer,
     OrderCreateSerializer,
     OrderListSerializer,
+    OrderListValuesSerializer,
     OrderDetailSerializer,
+    SeatHoldSerializer,
+    ConnectionSearchSerializer,
+    ConnectionSerializer,
+    TimetableTemplateSerializer,
+    TimetableGenerateSerializer,
+    TimetableGenerateResultSerializer,
+)
+
+
+# Tickets with everything TicketDetailSerializer reads
+ORDER_TICKETS = Prefetch(
+    "tickets",
+    queryset=Ticket.objects.select_related(
+        "journey__train",
+        "journey__route__source",
+        "journey__route__destination",
+    ),
 )
 
 
+def values_list_response(view, serializer_class, queryset):
+    """List response rendered from values() rows of the paginated queryset"""
+    queryset = serializer_class.queryset(queryset)
+    rows = view.paginate_queryset(queryset)
+    if rows is None:
+        return Response(serializer_class(queryset).data)
+    return view.get_paginated_response(serializer_class(rows).data)
+
+
+class DeferredSeatReleaseMixin:
+    """Deletes cascading to tickets release the seats
+    with one update per journey, and cascading to journeys
+    bump the timetable version once"""
+
+    def perform_destroy(self, instance):
+        with deferred_seat_release(), deferred_timetable_change():
+            instance.delete()
+
+
+class DeferredTimetableChangeMixin:
+    """Creates and updates saving several timetable rows bump
+    the timetable and model versions once"""
+
+    def perform_create(self, serializer):
+        with deferred_timetable_change():
+            super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        with deferred_timetable_change():
+            super().perform_update(serializer)
+
+
 class TrainTypeViewSet(
+    CachedResponseMixin,
+    DeferredTimetableChangeMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.UpdateModelMixin,
@@ -49,14 +129,36 @@ class TrainTypeViewSet(
     queryset = TrainType.objects.all()
     serializer_class = TrainTypeSerializer
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
-
-
-class TrainViewSet(viewsets.ModelViewSet):
+    # Most queries a request may run, the JWT user lookup included
+    query_budgets = {
+        "list": 2,
+        "retrieve": 2,
+        "create": 3,
+        "update": 4,
+        "partial_update": 4,
+    }
+
+
+class TrainViewSet(
+    CachedResponseMixin,
+    DeferredTimetableChangeMixin,
+    DeferredSeatReleaseMixin,
+    viewsets.ModelViewSet,
+):
     """Name of the train with car number
     and number of seats in the car"""
     queryset = Train.objects.select_related("train_type")
     serializer_class = TrainSerializer
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
+    query_budgets = {
+        "list": 2,
+        "retrieve": 2,
+        "create": 4,
+        "update": 5,
+        "partial_update": 5,
+        "destroy": 22,
+    }
+    cache_models = (Train, TrainType)
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -71,6 +173,15 @@ class CrewViewSet(viewsets.ModelViewSet):
     queryset = Crew.objects.all()
     serializer_class = CrewSerializer
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
+    query_budgets = {
+        "list": 2,
+        "retrieve": 2,
+        "create": 2,
+        "update": 3,
+        "partial_update": 3,
+        "destroy": 6,
+        "upload_image": 3,
+    }
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -88,15 +199,18 @@ class CrewViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAdminUser]
     )
     def upload_image(self, request, pk=None):
-        """Endpoint for uploading image to crew"""
+        """Endpoint for uploading image to crew, the image and its
+        thumbnail and WebP variants are ready when image_status is ready"""
         crew = self.get_object()
         serializer = self.get_serializer(crew, data=request.data)
         serializer.is_valid(raise_exception=True)
         serializer.save()
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
 
 class StationViewSet(
+    CachedResponseMixin,
+    DeferredTimetableChangeMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.UpdateModelMixin,
@@ -107,20 +221,130 @@ class StationViewSet(
     queryset = Station.objects.all()
     serializer_class = StationSerializer
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
+    query_budgets = {
+        "list": 2,
+        "retrieve": 2,
+        "create": 7,
+        "update": 10,
+        "partial_update": 10,
+        "autocomplete": 2,
+        "distance_matrix": 3,
+    }
 
     def get_serializer_class(self):
         if self.action == "list":
             return StationListSerializer
         return StationSerializer
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "q",
+                type={"type": "str"},
+                description="Beginning of the station name, "
+                            "case and accents are ignored "
+                            "(ex. ?q=ki"
+            ),
+            OpenApiParameter(
+                "limit",
+                type={"type": "number"},
+                description="Maximal number of suggestions, up to 50 "
+                            "(ex. ?limit=5"
+            ),
+        ]
+    )
+    @action(methods=["GET"], detail=False)
+    def autocomplete(self, request):
+        """Stations whose name starts with the typed text"""
+        prefix = request.query_params.get("q", "").strip()
+        try:
+            limit = min(int(request.query_params.get("limit", 10)), 50)
+        except ValueError:
+            raise ValidationError({"limit": "A valid integer is required."})
+
+        if not prefix:
+            return Response([], status=status.HTTP_200_OK)
+
+        stations = Station.objects.name_startswith(prefix).order_by(
+            "name_normalized"
+        )[:max(limit, 1)]
+        serializer = StationListSerializer(stations, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
-class RouteViewSet(viewsets.ModelViewSet):
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "stations",
+                type={"type": "list", "items": {"type": "number"}},
+                description="Limit the matrix to station ids "
+                            "(ex. ?stations=1,2,5"
+            ),
+            OpenApiParameter(
+                "train",
+                type={"type": "number"},
+                description="Add fares for the train with this id "
+                            "(ex. ?train=3"
+            ),
+        ]
+    )
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="distance-matrix",
+        permission_classes=[IsAdminUser]
+    )
+    def distance_matrix(self, request):
+        """Distances and fares between every pair of stations"""
+        stations = Station.objects.all()
+        station_ids = request.query_params.get("stations")
+        train_id = request.query_params.get("train")
+
+        if station_ids:
+            try:
+                ids = [int(str_id) for str_id in station_ids.split(",")]
+            except ValueError:
+                raise ValidationError(
+                    {"stations": "A comma separated list of ids is required."}
+                )
+            stations = stations.filter(id__in=ids)
+
+        train = None
+        if train_id:
+            if not train_id.isdigit():
+                raise ValidationError({"train": "A valid id is required."})
+            train = get_object_or_404(Train, pk=train_id)
+
+        matrices = station_matrices(stations, train)
+        return Response(
+            {
+                name: matrix if name == "stations" else matrix.tolist()
+                for name, matrix in matrices.items()
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class RouteViewSet(
+    CachedResponseMixin,
+    DeferredTimetableChangeMixin,
+    DeferredSeatReleaseMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Route.objects.select_related(
         "source",
         "destination",
     )
     serializer_class = RouteSerializer
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
+    query_budgets = {
+        "list": 2,
+        "retrieve": 2,
+        "create": 5,
+        "update": 5,
+        "partial_update": 5,
+        "destroy": 22,
+    }
+    cache_models = (Route, Station)
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -135,13 +359,19 @@ class RouteViewSet(viewsets.ModelViewSet):
         return super().list(request, *args, **kwargs)
 
 
-class JourneyPagination(PageNumberPagination):
+class JourneyPagination(KeysetSelectablePagination):
+    keyset_field = "departure_time"
     page_size = 2
     page_size_query_param = "page_size"
     max_page_size = 100
 
 
-class JourneyViewSet(viewsets.ModelViewSet):
+class JourneyViewSet(
+    DeferredTimetableChangeMixin,
+    DeferredSeatReleaseMixin,
+    viewsets.ModelViewSet,
+):
+    ordering_fields = ("price_trip", "departure_time")
     queryset = Journey.objects.prefetch_related(
         "train",
         "route__source",
@@ -150,6 +380,17 @@ class JourneyViewSet(viewsets.ModelViewSet):
     serializer_class = JourneySerializer
     pagination_class = JourneyPagination
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
+    query_budgets = {
+        "list": 4,
+        "retrieve": 3,
+        "create": 12,
+        "update": 19,
+        "partial_update": 17,
+        "destroy": 22,
+        "connections": 6,
+        "seats": 3,
+        "timetable_stats": 4,
+    }
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -165,27 +406,104 @@ class JourneyViewSet(viewsets.ModelViewSet):
         """Converts string to a list of string"""
         return [value for value in qs.split(",")]
 
+    @staticmethod
+    def _date_ranges(dates):
+        """Converts dates to half-open departure_time ranges,
+        so the filter can use the departure_time index"""
+        ranges = Q()
+        for value in dates:
+            try:
+                day = date.fromisoformat(value.strip())
+            except ValueError:
+                raise ValidationError(
+                    {"departure_date": "Dates must be in YYYY-MM-DD format."}
+                )
+            start = datetime.combine(day, time.min)
+            end = start + timedelta(days=1)
+            if settings.USE_TZ:
+                start = timezone.make_aware(start)
+                end = timezone.make_aware(end)
+            ranges |= Q(departure_time__gte=start, departure_time__lt=end)
+        return ranges
+
+    def _price_param(self, name):
+        """Converts price query parameter to a float"""
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            raise ValidationError({name: "A valid number is required."})
+
+    def _ordering_params(self):
+        """Keeps only the orderings allowed by ordering_fields"""
+        ordering = self.request.query_params.get("ordering")
+        if not ordering:
+            return []
+        return [
+            field for field in self._params_to_strs(ordering)
+            if field.lstrip("-") in self.ordering_fields
+        ]
+
     def get_queryset(self):
         queryset = self.queryset
+        if self.action in ("list", "retrieve"):
+            queryset = queryset.with_price_trip()
+
+        if self.action == "retrieve":
+            queryset = queryset.prefetch_related(None).select_related(
+                "train",
+                "route__source",
+                "route__destination",
+            ).prefetch_related("crew")
+
         if self.action == "list":
-            queryset = queryset.annotate(
-                tickets_available=(
-                    F("train__cargo_num")
-                    * F("train__places_in_cargo")
-                    - Count("tickets")
-                )
+            station_ids = self.source_station_ids()
+            if station_ids is not None:
+                station_ids = list(station_ids)
+            queryset = self.filter_list(queryset, station_ids)
+        return queryset
+
+    def source_station_ids(self):
+        """Ids of the stations matching source_station, None without it"""
+        station = self.request.query_params.get("source_station")
+        if not station:
+            return None
+        return Station.objects.filter(
+            name_normalized__contains=normalize_name(station)
+        ).values_list("id", flat=True)
+
+    def filter_list(self, queryset, station_ids):
+        """Filters and ordering of the list,
+        station_ids are the already read source_station_ids"""
+        queryset = queryset.with_tickets_available()
+        departure = self.request.query_params.get("departure_date")
+
+        if departure:
+            dates = self._params_to_strs(departure)
+            queryset = queryset.filter(self._date_ranges(dates))
+
+        if station_ids is not None:
+            queryset = queryset.filter(
+                route_id__in=Route.objects.filter(
+                    source_id__in=station_ids
+                ).values("id")
             )
-            departure = self.request.query_params.get("departure_date")
-            station = self.request.query_params.get("source_station")
 
-            if departure:
-                dates = self._params_to_strs(departure)
-                queryset = queryset.filter(departure_time__date__in=dates)
+        min_price = self._price_param("min_price")
+        max_price = self._price_param("max_price")
 
-            if station:
-                queryset = queryset.filter(
-                    route__source__name__icontains=station
-                )
+        if min_price is not None:
+            queryset = queryset.filter(price_trip__gte=min_price)
+
+        if max_price is not None:
+            queryset = queryset.filter(price_trip__lte=max_price)
+
+        ordering = self._ordering_params()
+
+        if ordering:
+            queryset = queryset.order_by(*ordering, "id")
         return queryset
 
     @extend_schema(
@@ -201,29 +519,182 @@ class JourneyViewSet(viewsets.ModelViewSet):
                 type={"type": "str"},
                 description="Filter by source station name "
                             "(ex. ?source_station=Ki"
-            )
+            ),
+            OpenApiParameter(
+                "min_price",
+                type={"type": "number"},
+                description="Filter by minimal trip price "
+                            "(ex. ?min_price=100"
+            ),
+            OpenApiParameter(
+                "max_price",
+                type={"type": "number"},
+                description="Filter by maximal trip price "
+                            "(ex. ?max_price=250.5"
+            ),
+            OpenApiParameter(
+                "ordering",
+                type={"type": "str"},
+                description="Sort by price_trip or departure_time, "
+                            "prefix with - for descending order "
+                            "(ex. ?ordering=-price_trip, not allowed "
+                            "with pagination=cursor"
+            ),
         ]
     )
     def list(self, request, *args, **kwargs):
         """Trip with train, route, crew and cost"""
-        return super().list(request, *args, **kwargs)
+        return values_list_response(
+            self, JourneyListValuesSerializer, self.get_queryset()
+        )
+
+    @extend_schema(
+        parameters=[ConnectionSearchSerializer],
+        responses=ConnectionSerializer(many=True),
+    )
+    @action(methods=["GET"], detail=False)
+    def connections(self, request):
+        """Best trips with transfers between two stations"""
+        search = ConnectionSearchSerializer(data=request.query_params)
+        search.is_valid(raise_exception=True)
+        params = search.validated_data
+
+        departure_time = params.get("departure_time") or timezone.now()
+        max_wait = timedelta(hours=24)
+        timetable = timetable_cache.get()
+        if not timetable_cache.covers(departure_time):
+            timetable = Timetable.from_db(
+                departure_from=departure_time,
+                departure_to=(
+                    departure_time + max_wait * (params["max_transfers"] + 1)
+                ),
+            )
+        planner = ConnectionPlanner(
+            timetable,
+            min_transfer=timedelta(minutes=params["min_transfer"]),
+            max_wait=max_wait,
+            max_transfers=params["max_transfers"],
+        )
+        itineraries = planner.search(
+            params["source"].id,
+            params["destination"].id,
+            departure_time,
+            optimize=params["optimize"],
+            limit=params["limit"],
+        )
+        serializer = ConnectionSerializer(itineraries, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="timetable-stats",
+        permission_classes=[IsAdminUser],
+    )
+    def timetable_stats(self, request):
+        """Size and rebuild metrics of the cached timetable"""
+        timetable_cache.get()
+        return Response(timetable_cache.stats(), status=status.HTTP_200_OK)
+
+    @action(methods=["GET"], detail=True)
+    def seats(self, request, pk=None):
+        """Free places in every cargo of the trip"""
+        release_expired_holds(journey_id=pk)
+        journey = get_object_or_404(
+            Journey.objects.select_related("train").only(
+                "id",
+                "seat_map",
+                "tickets_sold",
+                "tickets_held",
+                "train__cargo_num",
+                "train__places_in_cargo",
+            ),
+            pk=pk
+        )
+        seat_map = SeatMap.for_journey(journey)
+        return Response(
+            {
+                "id": journey.id,
+                "cargo_num": seat_map.cargo_num,
+                "places_in_cargo": seat_map.places_in_cargo,
+                "tickets_available": (
+                    seat_map.cargo_num * seat_map.places_in_cargo
+                    - journey.tickets_sold
+                    - journey.tickets_held
+                ),
+                "cargos": seat_map.cargos(),
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class TimetableTemplateViewSet(viewsets.ModelViewSet):
+    """Recurring service expanded into journeys by generate"""
+    queryset = TimetableTemplate.objects.prefetch_related("crew")
+    serializer_class = TimetableTemplateSerializer
+    permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
+    query_budgets = {
+        "list": 3,
+        "retrieve": 3,
+        "create": 8,
+        "update": 12,
+        "partial_update": 12,
+        "destroy": 8,
+        "generate": 15,
+    }
+
+    @extend_schema(
+        request=TimetableGenerateSerializer,
+        responses=TimetableGenerateResultSerializer,
+    )
+    @action(methods=["POST"], detail=True, permission_classes=[IsAdminUser])
+    def generate(self, request, pk=None):
+        """Make the journeys of the template departing between date_from,
+        today by default, and date_to, the end of its validity by default,
+        match the template"""
+        template = self.get_object()
+        serializer = TimetableGenerateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            counts = generate_journeys(
+                TimetableTemplate.objects.filter(pk=template.pk),
+                serializer.validated_data.get(
+                    "date_from", timezone.now().date()
+                ),
+                serializer.validated_data.get("date_to"),
+            )
+        except ScheduleConflict as error:
+            raise ValidationError({"non_field_errors": [str(error)]})
+        return Response(
+            TimetableGenerateResultSerializer(counts).data,
+            status=status.HTTP_200_OK,
+        )
 
 
-class OrderPagination(PageNumberPagination):
+class OrderPagination(KeysetSelectablePagination):
+    keyset_field = "created_at"
     page_size = 3
     page_size_query_param = "page_size"
     max_page_size = 20
 
 
-class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.prefetch_related(
-        "tickets__journey__train__train_type",
-        "tickets__journey__route__source",
-        "tickets__journey__route__destination",
-    )
+class OrderViewSet(DeferredSeatReleaseMixin, viewsets.ModelViewSet):
+    queryset = Order.objects.prefetch_related(ORDER_TICKETS)
     serializer_class = OrderSerializer
     pagination_class = OrderPagination
     permission_classes = (IsAuthenticated,)
+    query_budgets = {
+        "list": 4,
+        "retrieve": 3,
+        "create": 12,
+        "update": 4,
+        "partial_update": 4,
+        "destroy": 12,
+        # No budget for export: its rows are read while the response
+        # streams, one query for the orders and one per chunk of them,
+        # so the count grows with the number of orders
+    }
+    throttle_scopes = {"create": "order_create", "export": "order_export"}
 
     def get_queryset(self):
         queryset = self.queryset.filter(user=self.request.user)
@@ -247,4 +718,88 @@ class OrderViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         """An order created by a registered user
         with simultaneous purchase of tickets"""
-        return super().list(request, *args, **kwargs)
+        return values_list_response(
+            self, OrderListValuesSerializer, self.get_queryset()
+        )
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "data_format",
+                enum=tuple(EXPORT_FORMATS),
+                description="ndjson, one order with its tickets per line, "
+                            "or csv, one ticket per line (ex. ?data_format=csv"
+            ),
+        ],
+        responses={(200, "application/x-ndjson"): str, (200, "text/csv"): str},
+    )
+    @action(methods=["GET"], detail=False, permission_classes=[IsAdminUser])
+    def export(self, request):
+        """Orders of all users with their tickets, streamed
+        in chunks while they are read from the database"""
+        data_format = request.query_params.get("data_format", "ndjson")
+        if data_format not in EXPORT_FORMATS:
+            raise ValidationError(
+                {"data_format": f"Choose one of {', '.join(EXPORT_FORMATS)}."}
+            )
+        content_type, export = EXPORT_FORMATS[data_format]
+        content = export(order_chunks())
+        filename = f"orders.{data_format}"
+        if isinstance(request._request, ASGIRequest):
+            # Django 4.1 iterates streamed content on the event loop,
+            # where the database can not be queried. The rows are read
+            # here, in the thread of the view, into a temporary file
+            # and the file is streamed
+            return FileResponse(
+                spooled_file(content),
+                as_attachment=True,
+                filename=filename,
+                content_type=content_type,
+            )
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+class SeatHoldViewSet(
+    mixins.CreateModelMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """Seats reserved for a short time before the order is created"""
+    queryset = SeatHold.objects.prefetch_related("seats")
+    serializer_class = SeatHoldSerializer
+    permission_classes = (IsAuthenticated,)
+    query_budgets = {
+        "list": 3,
+        "retrieve": 3,
+        "create": 12,
+        "destroy": 14,
+        "confirm": 18,
+    }
+
+    def get_queryset(self):
+        return self.queryset.filter(
+            user=self.request.user,
+            expires_at__gt=timezone.now(),
+        )
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        release_hold(instance)
+
+    @action(methods=["POST"], detail=True)
+    def confirm(self, request, pk=None):
+        """Create an order with tickets for the held seats"""
+        hold = self.get_object()
+        try:
+            order = confirm_hold(hold)
+        except HoldExpired:
+            raise NotFound("The hold has expired.")
+        order = Order.objects.prefetch_related(ORDER_TICKETS).get(pk=order.pk)
+        serializer = OrderDetailSerializer(order)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -58,7 +58,6 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -67,6 +66,16 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Warn about requests running more queries than the query_budgets
+# of their view, QUERY_BUDGET_RAISE turns the warnings into errors
+QUERY_BUDGET_RAISE = False
+
+# Both are sync only, under ASGI they make every request wait
+# for the others, so they are left out unless debugging
+if DEBUG:
+    MIDDLEWARE.insert(1, "debug_toolbar.middleware.DebugToolbarMiddleware")
+    MIDDLEWARE.append("task.query_budget.QueryBudgetMiddleware")
+
 ROOT_URLCONF = "taskmanagement.urls"
 
 TEMPLATES = [
@@ -95,9 +104,13 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
+# Runs the tests with their own rate limit store
+TEST_RUNNER = "taskmanagement.test_runner.TestRunner"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -148,15 +161,19 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle"
+        "task.throttling.AnonBucketThrottle",
+        "task.throttling.UserBucketThrottle",
+        "task.throttling.ScopedBucketThrottle",
     ],
     "DEFAULT_THROTTLE_RATES": {
         "anon": "10/minutes",
-        "user": "100/minutes"
+        "user": "100/minutes",
+        "register": "5/minutes",
+        "order_create": "20/minutes",
+        "order_export": "10/minutes",
     },
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
@@ -167,6 +184,50 @@ SIMPLE_JWT = {
     "ROTATE_REFRESH_TOKENS": True,
 }
 
+# Cached responses are kept per worker, keyed by the data versions
+# of the shared DataVersion table, so any backend is safe
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# Rate limits are counted in one store for all workers: a SQLite file
+# for the workers of one host, redis when they run on several hosts
+if os.getenv("THROTTLE_REDIS_URL"):
+    THROTTLE_STORE = {
+        "BACKEND": "task.throttling.RedisBucketStore",
+        "LOCATION": os.getenv("THROTTLE_REDIS_URL"),
+    }
+else:
+    THROTTLE_STORE = {
+        "BACKEND": "task.throttling.SQLiteBucketStore",
+        "LOCATION": BASE_DIR / "throttle.sqlite3",
+    }
+
+# Seconds a worker keeps the user of a token without reading it again,
+# changes made through other workers are seen after it
+AUTH_USER_CACHE_TIMEOUT = 30
+
+# Seconds to keep cached reference data responses,
+# they are also dropped on every change of the data
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+
+SEAT_HOLD_MINUTES = 10
+SEAT_HOLD_MAX_MINUTES = 30
+
+# Uploaded crew photos are resized by a thread pool after the request,
+# with 0 workers right after the upload is committed
+CREW_IMAGE_WORKERS = 2
+CREW_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+CREW_IMAGE_MAX_PIXELS = 40_000_000
+# Longest side in pixels of the image and of the thumbnail
+CREW_IMAGE_SIZE = 1024
+CREW_THUMBNAIL_SIZE = 160
+# Minutes after which process_crew_images takes over an upload
+# still processing, its worker stopped before finishing it
+CREW_IMAGE_STALE_MINUTES = 30
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Train Station With Price Trip",
     "DESCRIPTION": "Ordering tickets for rail travel",
@@ -0,0 +1,28 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+from task.throttling import reset_throttle_store
+
+
+class TestRunner(DiscoverRunner):
+    """Counts rate limits of the test run in a fresh store,
+    as the test database replaces the database"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.throttle_dir = tempfile.mkdtemp(prefix="throttle")
+        self.throttle_store = settings.THROTTLE_STORE
+        settings.THROTTLE_STORE = {
+            "BACKEND": "task.throttling.SQLiteBucketStore",
+            "LOCATION": f"{self.throttle_dir}/throttle.sqlite3",
+        }
+        reset_throttle_store(setting="THROTTLE_STORE")
+
+    def teardown_test_environment(self, **kwargs):
+        settings.THROTTLE_STORE = self.throttle_store
+        reset_throttle_store(setting="THROTTLE_STORE")
+        shutil.rmtree(self.throttle_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,88 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+
+class UserCache:
+    """Users of recent requests by id, kept for AUTH_USER_CACHE_TIMEOUT
+    seconds in the process. Saving or deleting a user drops it at once
+    in this process, other workers see the change within the timeout.
+    Queryset updates bypass the signals and wait for the timeout too"""
+    max_size = 10_000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = {}
+        # Users loaded before a change are not cached after it
+        self.generation = 0
+
+    def get(self, user_id):
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= time.monotonic():
+            return None
+        # Requests may change their user, the cached one stays as loaded
+        return copy.copy(user)
+
+    def set(self, user_id, user, generation) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if generation != self.generation:
+                return
+            if len(self._users) >= self.max_size:
+                self._users = {
+                    key: entry
+                    for key, entry in self._users.items()
+                    if entry[0] > now
+                }
+            while len(self._users) >= self.max_size:
+                del self._users[next(iter(self._users))]
+            self._users[user_id] = (
+                now + settings.AUTH_USER_CACHE_TIMEOUT,
+                copy.copy(user),
+            )
+
+    def invalidate(self, user_id) -> None:
+        with self._lock:
+            self._users.pop(user_id, None)
+            self.generation += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users = {}
+            self.generation += 1
+
+
+user_cache = UserCache()
+
+
+def token_user_id(validated_token):
+    try:
+        return validated_token[jwt_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(
+            _("Token contained no recognizable user identification")
+        )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication reading the user of the token claims from
+    the user cache, the database is only queried on a miss"""
+
+    def get_user(self, validated_token):
+        user_id = token_user_id(validated_token)
+        user = user_cache.get(user_id)
+        if user is None:
+            generation = user_cache.generation
+            # Raises for missing and inactive users, they are not cached
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, user, generation)
+        return user
@@ -5,12 +5,15 @@ from user.serializers import UserSerializer
 
 class CreateUserView(generics.CreateAPIView):
     serializer_class = UserSerializer
+    query_budgets = {"post": 3}
+    throttle_scopes = {"post": "register"}
 
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """The user who is currently authenticated"""
     serializer_class = UserSerializer
     permission_classes = (IsAuthenticated,)
+    query_budgets = {"get": 1, "put": 2, "patch": 2}
 
     def get_object(self):
         return self.request.user